@@ -0,0 +1,144 @@
+# swarm_bench.py - loopback swarm benchmark for the chunk transfer engine
+#
+#   python bench/swarm_bench.py --peers 8 --size-mb 32
+#
+# Starts one seeder and N leechers in this process, each with its own data
+# directory and its own 127.0.0.x address (or its own port with
+# --mode ports). The seeder shares a synthetic file, every leecher downloads
+# it at the same time, and the results are written as JSON so runs can be
+# compared across commits.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2pcore.server import FileServerManager
+from p2pcore.client import FileClientManager
+
+
+def peer_endpoints(count, mode, base_port):
+    if mode == "ips":
+        return [(f"127.0.0.{i + 2}", base_port) for i in range(count)]
+    return [("127.0.0.1", base_port + i) for i in range(count)]
+
+
+def make_payload(path, size, compressible):
+    block = (b"def student_solution(x):\n    return x * 2\n" * 2048)[:65536] if compressible else None
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            n = min(65536, size - written)
+            f.write(block[:n] if compressible else os.urandom(n))
+            written += n
+
+
+def start_peer(host, port, base_dir, bind, slots):
+    server = FileServerManager(host=host, port=port, base_dir=base_dir, my_ip=host)
+    server.slot_manager.set_slots(slots)
+    server.start_server()
+    client = FileClientManager(base_dir=base_dir, file_server=server, bind_ip=host if bind else None)
+    return server, client
+
+
+def run(args):
+    root = args.workdir or tempfile.mkdtemp(prefix="swarm-bench-")
+    endpoints = peer_endpoints(args.peers + 1, args.mode, args.base_port)
+    bind = args.mode == "ips"
+
+    peers = []
+    for i, (host, port) in enumerate(endpoints):
+        peers.append(start_peer(host, port, os.path.join(root, f"peer-{i}"), bind, args.slots))
+    for server, _ in peers:
+        if not server.listening.wait(5):
+            raise RuntimeError(f"peer {server.peer_address()} did not start")
+
+    seeder, _ = peers[0]
+    payload = os.path.join(root, "payload.bin")
+    make_payload(payload, args.size_mb * 1024 * 1024, args.compressible)
+    metadata = seeder.create_chunks(payload)
+    metadata['peers'] = [server.peer_address() for server, _ in peers]
+
+    for server, _ in peers[1:]:
+        path = os.path.join(server.metadata_dir, f"{server.get_file_hash(metadata['filename'])}.json")
+        with open(path, "w") as f:
+            json.dump(metadata, f)
+
+    completion = {}
+    start = time.time()
+
+    def leech(server, client):
+        if client.download_from_peers(metadata['filename']):
+            completion[server.peer_address()] = time.time() - start
+
+    threads = [threading.Thread(target=leech, args=peer) for peer in peers[1:]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for server, _ in peers:
+        server.stop_server()
+
+    times = sorted(completion.values())
+    file_size = metadata['filesize']
+    result = {
+        "config": {
+            "peers": args.peers,
+            "size_bytes": file_size,
+            "chunk_count": metadata['chunk_count'],
+            "mode": args.mode,
+            "slots": args.slots,
+            "compressible": args.compressible
+        },
+        "time_to_full_distribution": times[-1] if len(times) == args.peers else None,
+        "completed": len(times),
+        "failed": args.peers - len(times),
+        "seeder_upload_bytes": seeder.bytes_uploaded,
+        "seeder_upload_ratio": seeder.bytes_uploaded / file_size if file_size else 0,
+        "swarm_upload_bytes": sum(server.bytes_uploaded for server, _ in peers[1:]),
+        "completion_cdf": [[t, (i + 1) / args.peers] for i, t in enumerate(times)],
+        "per_peer": completion
+    }
+
+    if not args.keep and not args.workdir:
+        shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback swarm distribution benchmark")
+    parser.add_argument("--peers", type=int, default=4, help="number of leechers")
+    parser.add_argument("--size-mb", type=int, default=16, help="size of the synthetic file")
+    parser.add_argument("--mode", choices=["ips", "ports"], default="ips",
+                        help="give each peer its own 127.0.0.x address or its own port")
+    parser.add_argument("--base-port", type=int, default=18080)
+    parser.add_argument("--slots", type=int, default=4, help="upload slots per peer")
+    parser.add_argument("--compressible", action="store_true", help="use text-like instead of random data")
+    parser.add_argument("--workdir", help="keep peer directories here instead of a temp dir")
+    parser.add_argument("--keep", action="store_true", help="do not delete the temp dir")
+    parser.add_argument("--output", help="JSON result path (default bench/results/swarm-<peers>x<size>.json)")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"swarm-{args.peers}x{args.size_mb}mb.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"peers={args.peers} size={args.size_mb}MB "
+          f"full distribution={result['time_to_full_distribution']}s "
+          f"seeder upload={result['seeder_upload_ratio']:.2f}x file size "
+          f"failed={result['failed']}")
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
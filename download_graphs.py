@@ -0,0 +1,128 @@
+# download_graphs.py - matplotlib canvases for the "Download Statistics" panel.
+# Imported by main.py only when the panel is first opened, so numpy and
+# matplotlib stay out of the window's startup path.
+import numpy as np
+from PyQt5.QtCore import QTimer
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+
+class DownloadGraphCanvas(FigureCanvas):
+    FRAME_INTERVAL_MS = 100
+    MAX_POINTS = 1000
+    
+    def __init__(self, stats, parent=None, width=5, height=4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.fig.add_subplot(111)
+        super(DownloadGraphCanvas, self).__init__(self.fig)
+        
+        self.stats = stats
+        self.peer_axes = self.axes.twinx()
+        self.speed_line, = self.axes.plot([], [], 'b-', linewidth=2, animated=True)
+        self.peer_line, = self.peer_axes.plot([], [], 'g--', marker='o', markersize=3, linewidth=1.5, animated=True)
+        self.background = None
+        self.drawn_count = -1
+        
+        self.setup_plot()
+        self.mpl_connect('draw_event', self.on_draw)
+        
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.FRAME_INTERVAL_MS)
+        
+    def setup_plot(self):
+        self.axes.set_title('Download Speed Progress')
+        self.axes.set_xlabel('Time (seconds)')
+        self.axes.set_ylabel('Speed (KB/s)')
+        self.axes.grid(True)
+        
+        self.axes.set_xlim(0, 10)
+        self.axes.set_ylim(0, 200)
+        
+        self.peer_axes.set_ylabel('Active Peers', color='g')
+        self.peer_axes.tick_params(axis='y', labelcolor='g')
+        self.peer_axes.set_ylim(0, 5)
+        
+        self.fig.tight_layout()
+    
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_lines()
+    
+    def draw_lines(self):
+        self.axes.draw_artist(self.speed_line)
+        self.peer_axes.draw_artist(self.peer_line)
+        
+    def refresh(self):
+        count = self.stats.count
+        if count == self.drawn_count:
+            return
+        self.drawn_count = count
+        
+        times, speeds, peers = self.stats.snapshot(self.MAX_POINTS)
+        self.speed_line.set_data(times, speeds)
+        self.peer_line.set_data(times, peers)
+        
+        if self.rescale(times, speeds, peers) or self.background is None:
+            self.draw_idle()
+            return
+        
+        self.restore_region(self.background)
+        self.draw_lines()
+        self.blit(self.fig.bbox)
+    
+    def rescale(self, times, speeds, peers):
+        if len(times) == 0:
+            return False
+        
+        changed = False
+        if times[-1] > self.axes.get_xlim()[1]:
+            self.axes.set_xlim(0, times[-1] * 1.5)
+            changed = True
+        if speeds.max() > self.axes.get_ylim()[1]:
+            self.axes.set_ylim(0, speeds.max() * 1.5)
+            changed = True
+        if peers.max() > self.peer_axes.get_ylim()[1]:
+            self.peer_axes.set_ylim(0, peers.max() + 2)
+            changed = True
+        return changed
+        
+    def reset(self):
+        self.stats.reset()
+        self.drawn_count = -1
+        self.speed_line.set_data([], [])
+        self.peer_line.set_data([], [])
+        self.axes.set_xlim(0, 10)
+        self.axes.set_ylim(0, 200)
+        self.peer_axes.set_ylim(0, 5)
+        self.draw_idle()
+    
+    def stop(self):
+        self.timer.stop()
+
+
+class ExponentialGrowthGraphCanvas(FigureCanvas):
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = self.fig.add_subplot(111)
+        super(ExponentialGrowthGraphCanvas, self).__init__(self.fig)
+        
+        self.setup_plot()
+        
+    def setup_plot(self):
+        self.axes.set_title('Exponential Growth of Peer-to-Peer Transfer Speed')
+        self.axes.set_xlabel('Time Steps')
+        self.axes.set_ylabel('Relative Speed / Peers')
+        self.axes.grid(True)
+        
+        self.axes.set_yscale('log', base=2)
+        
+        steps = np.arange(1, 11)
+        speeds = 16 * np.power(2, (steps - 1) / 3)
+        
+        self.axes.plot(steps, speeds, 'orange', marker='o')
+        
+        self.axes.set_yticks([16, 32, 64, 128, 256, 512])
+        
+        self.fig.tight_layout()
+        self.fig.canvas.draw()
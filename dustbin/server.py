@@ -2,12 +2,21 @@
 import socket
 import threading
 import os
+import sys
 import json
-import time
+import argparse
 from pathlib import Path
 
+# the transfer engine lives one directory up, next to the current main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from p2pcore.server import FileServerManager, DEFAULT_PORT
+
 class Server:
-    def __init__(self, host='0.0.0.0', port=5051):
+    """Chat/command server that doubles as a caching super-peer: uploads are
+    cut into the chunk/manifest layout of main.py while they arrive, and the
+    built-in seeder serves those chunks to the swarm with sendfile()."""
+
+    def __init__(self, host='0.0.0.0', port=5051, seed_port=DEFAULT_PORT, base_dir=".", advertise=None):
         self.HOST = host
         self.PORT = port
         self.ADDR = (self.HOST, self.PORT)
@@ -15,19 +24,48 @@ class Server:
         self.FORMAT = 'utf-8'
         self.DISCONNECT_MESSAGE = "DISCONNECT"
         
-        # Create storage directory
-        self.STORAGE_DIR = Path("shared_files")
-        self.STORAGE_DIR.mkdir(exist_ok=True)
+        self.seeder = FileServerManager(host=host, port=seed_port, base_dir=base_dir, my_ip=advertise)
+        self.seeder.zero_copy = True
+        self.seeder.signals.update_log.connect(lambda message: print(f"[SEEDER] {message}"))
+        
+        # Whole files left here by older versions are imported into the chunk store
+        self.STORAGE_DIR = Path(self.seeder.files_dir)
         
         # Keep track of connected clients and available files
         self.clients = []
-        self.files = {}  # {filename: {size, owner, path}}
+        self.files = {}  # {filename: {size, chunks}}, rebuilt from the manifests on start
+        self.load_files()
         
         # Set up server socket
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server.bind(self.ADDR)
     
+    def load_files(self):
+        for path in self.STORAGE_DIR.iterdir():
+            if path.is_file():
+                # unchanged files are recognised by their stamp and not rehashed
+                self.seeder.create_chunks(str(path))
+                self.seeder.add_file_reference(path.name)
+        
+        for metadata_file in os.listdir(self.seeder.metadata_dir):
+            try:
+                with open(os.path.join(self.seeder.metadata_dir, metadata_file), "r") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            filename = metadata["filename"]
+            # only files whose chunks are all still here can be served
+            if self.seeder.range_source(filename) is None:
+                continue
+            if self.seeder.peer_address() not in metadata.get("peers", []):
+                self.seeder.add_file_reference(filename)
+            self.files[filename] = {"size": metadata["filesize"], "chunks": metadata["chunk_count"]}
+        print(f"[SERVER] {len(self.files)} cached files")
+    
     def start(self):
+        self.seeder.start_server()
+        print(f"[SERVER] Seeding to the swarm on port {self.seeder.PORT} as {self.seeder.peer_address()}")
         print(f"[SERVER] Starting on {self.HOST}:{self.PORT}")
         self.server.listen()
         print(f"[SERVER] Listening for connections...")
@@ -101,29 +139,19 @@ class Server:
             print(f"[ERROR] Command handling error: {e}")
     
     def handle_upload_request(self, conn, data):
-        filename = data.get("filename")
+        filename = os.path.basename(data.get("filename"))
         filesize = data.get("filesize")
         
         # Inform client upload can start
         self.send_message(conn, json.dumps({"cmd": "UPLOAD_APPROVED"}))
         
-        # Receive file
-        filepath = self.STORAGE_DIR / filename
-        received = 0
-        with open(filepath, "wb") as f:
-            while received < filesize:
-                bytes_to_receive = min(4096, filesize - received)
-                data = conn.recv(bytes_to_receive)
-                if not data:
-                    break
-                f.write(data)
-                received += len(data)
+        # Chunked and hashed as it arrives, then announced to the swarm
+        metadata = self.seeder.receive_file(filename, conn, filesize)
         
         # Add to file list
         self.files[filename] = {
             "size": filesize,
-            "path": str(filepath),
-            "owner": conn
+            "chunks": metadata["chunk_count"]
         }
         
         # Send success message
@@ -134,10 +162,10 @@ class Server:
     
     def handle_download_request(self, conn, data):
         filename = data.get("filename")
+        source = self.seeder.range_source(filename) if filename in self.files else None
         
-        if filename in self.files:
-            filepath = self.files[filename]["path"]
-            filesize = os.path.getsize(filepath)
+        if source:
+            filesize, pieces = source
             
             # Send approval with filesize
             self.send_message(conn, json.dumps({
@@ -146,30 +174,25 @@ class Server:
                 "filesize": filesize
             }))
             
-            # Send file
-            with open(filepath, "rb") as f:
-                while True:
-                    bytes_read = f.read(4096)
-                    if not bytes_read:
-                        break
-                    conn.sendall(bytes_read)
-            
-            # Give client time to process
-            time.sleep(0.5)
+            # Send the chunk files back to back; the client reads exactly
+            # filesize bytes, so the completion message can follow at once
+            peer = conn.getpeername()[0]
+            for path, _, size in pieces:
+                self.seeder.send_stored(conn, peer, path, 0, size)
             self.send_message(conn, json.dumps({"cmd": "DOWNLOAD_COMPLETE", "filename": filename}))
         else:
             # File not found
             self.send_message(conn, json.dumps({"cmd": "ERROR", "message": "File not found"}))
     
     def send_file_list(self, conn):
-        file_list = list(self.files.keys())
+        file_list = sorted(self.files)
         self.send_message(conn, json.dumps({
             "cmd": "FILE_LIST",
             "files": file_list
         }))
     
     def broadcast_file_list(self):
-        file_list = list(self.files.keys())
+        file_list = sorted(self.files)
         for client in self.clients:
             try:
                 self.send_message(client, json.dumps({
@@ -180,9 +203,21 @@ class Server:
                 pass
 
 # start.py - Simple wrapper to start the server
-def start():
-    server = Server()
+def start(**options):
+    server = Server(**options)
     server.start()
 
 if __name__ == "__main__":
-    start()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Caching super-peer")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5051, help="chat and upload port")
+    parser.add_argument("--seed-port", type=int, default=DEFAULT_PORT, help="port the swarm fetches chunks from")
+    parser.add_argument("--base-dir", default=".", help="where chunks/ and metadata/ are kept")
+    parser.add_argument("--advertise", help="address written into manifests (default: this host's IP)")
+    parser.add_argument("--tracker", help="announce cached files to this tracker (ip[:port])")
+    args = parser.parse_args()
+    
+    server = Server(args.host, args.port, args.seed_port, args.base_dir, args.advertise)
+    if args.tracker:
+        server.seeder.set_tracker(args.tracker)
+    server.start()
\ No newline at end of file
@@ -0,0 +1,107 @@
+# file_list_model.py - model behind the "Available Shared Files" view and the
+# background fetch that keeps it up to date. The GUI thread only ever applies
+# finished sets of names; sockets and directory scans run on a worker thread.
+import bisect
+import threading
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, pyqtSignal
+
+
+class FileListModel(QAbstractListModel):
+    """Sorted file names. apply() is given every name that should be listed
+    and only inserts or removes the rows that differ, in contiguous runs, so
+    the view keeps its selection and scroll position."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.known = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.names[index.row()]
+        return None
+
+    def name_at(self, row):
+        return self.names[row]
+
+    def apply(self, available):
+        removed = self.known - available
+        added = available - self.known
+
+        rows = sorted((bisect.bisect_left(self.names, name) for name in removed), reverse=True)
+        for first, last in self.runs(rows):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.names[first:last + 1]
+            self.endRemoveRows()
+
+        # names landing between the same two existing rows go in as one run
+        positions = {}
+        for name in sorted(added):
+            positions.setdefault(bisect.bisect_left(self.names, name), []).append(name)
+        for row in sorted(positions, reverse=True):
+            batch = positions[row]
+            self.beginInsertRows(QModelIndex(), row, row + len(batch) - 1)
+            self.names[row:row] = batch
+            self.endInsertRows()
+
+        self.known = set(available)
+        return len(added), len(removed)
+
+    @staticmethod
+    def runs(rows):
+        """Group descending row numbers into (first, last) ranges"""
+        start = end = None
+        for row in rows:
+            if end is not None and row == start - 1:
+                start = row
+                continue
+            if end is not None:
+                yield start, end
+            start = end = row
+        if end is not None:
+            yield start, end
+
+
+class CatalogFetcher(QObject):
+    """Refreshes the local catalog and syncs the server's catalog on a
+    daemon thread, then hands both name sets back through `fetched`.
+    network is None when the server could not be reached (error says why).
+    A fetch requested while one is running is folded into one more pass."""
+    fetched = pyqtSignal(object, object, str)
+
+    def __init__(self, file_server, file_client, parent=None):
+        super().__init__(parent)
+        self.file_server = file_server
+        self.file_client = file_client
+        self.lock = threading.Lock()
+        self.running = False
+        self.again = False
+
+    def fetch(self):
+        with self.lock:
+            if self.running:
+                self.again = True
+                return
+            self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            self.file_server.catalog.refresh()
+            local = set(self.file_server.catalog.names)
+            network, error = None, ""
+            try:
+                self.file_client.sync_catalog()
+                network = set(self.file_client.catalog)
+            except Exception as e:
+                error = str(e)
+            self.fetched.emit(local, network, error)
+
+            with self.lock:
+                if not self.again:
+                    self.running = False
+                    return
+                self.again = False
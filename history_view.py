@@ -0,0 +1,124 @@
+# history_view.py - list views for the chat and the file operation log. The
+# lines live in a p2pcore HistoryLog on disk; the model only holds the rows
+# around what is on screen and the view only paints the visible ones.
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import QListView, QAbstractItemView
+
+
+class HistoryModel(QAbstractListModel):
+    """A window of history lines [first, first + rows) over a HistoryLog.
+
+    Newer lines come in through Qt's canFetchMore()/fetchMore(), which the
+    view calls once its last row is on screen, and older lines are
+    prepended a page at a time by load_older(). trim() cuts the window back
+    to MAX_ROWS from the top.
+    """
+    PAGE_LINES = 200
+    MAX_ROWS = 2000
+
+    line_added = pyqtSignal()
+
+    def __init__(self, log, parent=None):
+        super().__init__(parent)
+        self.log = log
+        self.first = max(log.first, log.count - self.PAGE_LINES)
+        self.lines = log.read(self.first, log.count)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.lines[index.row()]
+        return None
+
+    def append(self, text):
+        # may run on any thread: the log is locked and the signal is queued
+        self.log.append(text)
+        self.line_added.emit()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.first + len(self.lines) < self.log.count
+
+    def fetchMore(self, parent=QModelIndex()):
+        end = self.first + len(self.lines)
+        new_lines = self.log.read(end, end + self.PAGE_LINES)
+        if new_lines:
+            self.beginInsertRows(QModelIndex(), len(self.lines), len(self.lines) + len(new_lines) - 1)
+            self.lines += new_lines
+            self.endInsertRows()
+
+    def catch_up(self):
+        """Load every newer line, keeping at most MAX_ROWS rows"""
+        if self.log.count - self.first - len(self.lines) > self.MAX_ROWS:
+            # too far behind to page through: start over at the end
+            self.beginResetModel()
+            self.first = max(self.log.first, self.log.count - self.MAX_ROWS)
+            self.lines = self.log.read(self.first, self.log.count)
+            self.endResetModel()
+            return
+        while self.canFetchMore():
+            self.fetchMore()
+        self.trim()
+
+    def trim(self):
+        extra = len(self.lines) - self.MAX_ROWS
+        if extra > 0:
+            self.beginRemoveRows(QModelIndex(), 0, extra - 1)
+            del self.lines[:extra]
+            self.first += extra
+            self.endRemoveRows()
+
+    def has_older(self):
+        return self.first > self.log.first
+
+    def load_older(self):
+        """Prepend up to PAGE_LINES older lines and return how many were added"""
+        start = max(self.log.first, self.first - self.PAGE_LINES)
+        older = self.log.read(start, self.first)
+        if older:
+            self.beginInsertRows(QModelIndex(), 0, len(older) - 1)
+            self.lines[:0] = older
+            self.first = start
+            self.endInsertRows()
+        return len(older)
+
+
+class HistoryView(QListView):
+    """Read-only, one row per line. Sticks to the newest line unless
+    scrolled up, and pages older lines in when scrolled to the top. Lines
+    arriving while scrolled up are only loaded on reaching the bottom."""
+
+    def __init__(self, log, parent=None):
+        super().__init__(parent)
+        self.history = HistoryModel(log, self)
+        self.setModel(self.history)
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.following = True
+        self.adjusting = False
+        self.history.line_added.connect(self.line_added)
+        self.verticalScrollBar().valueChanged.connect(self.scrolled)
+        self.scrollToBottom()
+
+    def append(self, text):
+        self.history.append(text)
+
+    def line_added(self):
+        if not self.following:
+            return
+        self.adjusting = True
+        self.history.catch_up()
+        self.adjusting = False
+        self.scrollToBottom()
+
+    def scrolled(self, value):
+        if self.adjusting:
+            return
+        bar = self.verticalScrollBar()
+        self.following = value == bar.maximum()
+        if value == bar.minimum() and bar.maximum() > 0 and self.history.has_older():
+            top = self.indexAt(self.viewport().rect().topLeft()).row()
+            added = self.history.load_older()
+            self.scrollTo(self.history.index(max(top, 0) + added), QAbstractItemView.PositionAtTop)
@@ -1,119 +1,62 @@
+import time
+STARTUP_MARKS = [("start", time.perf_counter())]
+
+def mark_startup(phase):
+    STARTUP_MARKS.append((phase, time.perf_counter()))
+
 import sys
+import argparse
 import socket
 import threading
 import os
 import json
 import hashlib
-import time
-import numpy as np
-from pathlib import Path
+mark_startup("stdlib imports")
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                  QSplitter, QLabel, QLineEdit, QPushButton, QTextEdit, QListWidget,
-                           QGroupBox, QFileDialog, QStatusBar, QProgressBar, QMessageBox)
-from PyQt5.QtCore import Qt, QDateTime, pyqtSignal, QObject
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+                  QSplitter, QLabel, QLineEdit, QPushButton, QListView,
+                           QGroupBox, QFileDialog, QStatusBar, QProgressBar, QMessageBox,
+                           QCheckBox, QSpinBox)
+from PyQt5.QtCore import Qt, QDateTime, QTimer
+mark_startup("PyQt5 imports")
 
 from file_client import FileClientManager
 from file_server import FileServerManager
+from file_list_model import FileListModel, CatalogFetcher
+from history_view import HistoryView
+from p2pcore.history import HistoryLog
+from multicast import MulticastManager
+mark_startup("transfer engine imports")
 
-CHUNK_SIZE = 1024 * 1024
 PEERS = []
 
-class DownloadGraphCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = self.fig.add_subplot(111)
-        super(DownloadGraphCanvas, self).__init__(self.fig)
-        
-        self.times = [0]
-        self.speeds = [0]
-        self.peers = [0]
-        self.start_time = time.time()
-        
-        self.setup_plot()
-        
-    def setup_plot(self):
-        self.axes.set_title('Download Speed Progress')
-        self.axes.set_xlabel('Time (seconds)')
-        self.axes.set_ylabel('Speed (KB/s)')
-        self.axes.grid(True)
-        
-        self.axes.set_ylim(0, 200)
-        
-        self.fig.tight_layout()
-        
-    def update_plot(self, speed, peer_count):
-        current_time = time.time() - self.start_time
-        
-        self.times.append(current_time)
-        self.speeds.append(speed)
-        self.peers.append(peer_count)
-        
-        self.axes.clear()
-        self.setup_plot()
-        
-        self.axes.plot(self.times, self.speeds, 'b-', linewidth=2)
-        
-        self.axes.fill_between(self.times, 0, self.speeds, alpha=0.3, color='blue')
-        
-        ax2 = self.axes.twinx()
-        ax2.set_ylabel('Active Peers', color='g')
-        ax2.plot(self.times, self.peers, 'g--', marker='o', linewidth=1.5)
-        ax2.tick_params(axis='y', labelcolor='g')
-        
-        max_speed = max(self.speeds) if len(self.speeds) > 0 else 100
-        self.axes.set_ylim(0, max_speed * 1.5)
-        
-        self.fig.canvas.draw_idle()
-        self.fig.canvas.flush_events()
-        
-    def reset(self):
-        self.times = [0]
-        self.speeds = [0]
-        self.peers = [0]
-        self.start_time = time.time()
-        self.axes.clear()
-        self.setup_plot()
-        self.fig.canvas.draw()
-class ExponentialGrowthGraphCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = self.fig.add_subplot(111)
-        super(ExponentialGrowthGraphCanvas, self).__init__(self.fig)
-        
-        self.setup_plot()
-        
-    def setup_plot(self):
-        self.axes.set_title('Exponential Growth of Peer-to-Peer Transfer Speed')
-        self.axes.set_xlabel('Time Steps')
-        self.axes.set_ylabel('Relative Speed / Peers')
-        self.axes.grid(True)
-        
-        self.axes.set_yscale('log', base=2)
-        
-        steps = np.arange(1, 11)
-        speeds = 16 * np.power(2, (steps - 1) / 3)
-        
-        self.axes.plot(steps, speeds, 'orange', marker='o')
-        
-        self.axes.set_yticks([16, 32, 64, 128, 256, 512])
-        
-        self.fig.tight_layout()
-        self.fig.canvas.draw()
+def startup_report():
+    lines = ["Startup profile:"]
+    for (_, previous), (phase, at) in zip(STARTUP_MARKS, STARTUP_MARKS[1:]):
+        lines.append(f"  {phase:<28}{(at - previous) * 1000:8.1f} ms")
+    total = STARTUP_MARKS[-1][1] - STARTUP_MARKS[0][1]
+    lines.append(f"  {'total':<28}{total * 1000:8.1f} ms")
+    heavy = [name for name in ("numpy", "matplotlib") if name in sys.modules]
+    lines.append(f"  heavy modules loaded: {', '.join(heavy) or 'none'}")
+    return "\n".join(lines)
 
 class P2PFileShareApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.file_sharing = False
         self.file_sharing_name = None
+        self.pending_download = None
         self.setWindowTitle("P2P File Sharing System")
         self.resize(900, 600)
         self.setMinimumSize(800, 500)
         
-        self.file_client = FileClientManager()
         self.file_server = FileServerManager()
+        self.file_client = FileClientManager(file_server=self.file_server)
+        self.download_stats = self.file_client.download_stats
+        self.multicast = MulticastManager()
+        # join the DHT right away so lookups work even with the chat server down
+        self.file_server.start_dht()
+        mark_startup("transfer managers")
         
         self.chunk_dir = "./chunks"
         if not os.path.exists(self.chunk_dir):
@@ -123,6 +66,11 @@ class P2PFileShareApp(QMainWindow):
         if not os.path.exists(self.metadata_dir):
             os.makedirs(self.metadata_dir)
         
+        # chat and log lines go to disk; the views only keep a window of them
+        self.history_dir = "./history"
+        self.chat_history = HistoryLog(self.history_dir, "chat")
+        self.file_history = HistoryLog(self.history_dir, "transfers")
+        
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
@@ -156,6 +104,8 @@ class P2PFileShareApp(QMainWindow):
         self.progress_bar.setVisible(False)
         self.status_bar.addPermanentWidget(self.progress_bar)
         
+        mark_startup("window widgets")
+        
         self.HEADER = 64
         self.PORT = 5050
         self.FORMAT = 'utf-8'
@@ -171,13 +121,24 @@ class P2PFileShareApp(QMainWindow):
             threading.Thread(target=self.receive_messages, daemon=True).start()
         except Exception as e:
             self.status_bar.showMessage(f"Connection failed: {e}")
+        mark_startup("chat server connect")
             
         self.file_client.signals.progress_update.connect(self.update_download_progress)
         self.file_client.signals.download_complete.connect(self.download_completed)
         self.file_client.signals.error.connect(self.show_file_error)
+        self.file_client.signals.log.connect(self.log_file_message)
+        self.file_client.signals.metadata_received.connect(self.metadata_ready)
+        
+        self.network_files = set()
+        self.catalog_fetcher = CatalogFetcher(self.file_server, self.file_client, self)
+        self.catalog_fetcher.fetched.connect(self.file_list_fetched)
         
         self.file_server.signals.update_log.connect(self.log_server_message)
         
+        self.multicast.signals.update_log.connect(self.log_file_message)
+        self.multicast.signals.progress_update.connect(self.update_download_progress)
+        self.multicast.signals.transfer_complete.connect(self.multicast_completed)
+        
     def create_file_section(self):
         file_group = QGroupBox("P2P File Operations: ")
         layout = QVBoxLayout()
@@ -193,7 +154,16 @@ class P2PFileShareApp(QMainWindow):
         self.select_file_btn.clicked.connect(self.select_file)
         file_selection_layout.addWidget(self.select_file_btn)
         
+        self.select_folder_btn = QPushButton("Select Folder")
+        self.select_folder_btn.setToolTip("Share a whole directory as one bundle")
+        self.select_folder_btn.clicked.connect(self.select_folder)
+        file_selection_layout.addWidget(self.select_folder_btn)
+        
         layout.addLayout(file_selection_layout)
+        
+        self.erasure_checkbox = QCheckBox("Add erasure-coded repair pieces")
+        self.erasure_checkbox.setToolTip("Lets downloaders finish from any sufficient subset of pieces")
+        layout.addWidget(self.erasure_checkbox)
        
         server_layout = QHBoxLayout()
         self.server_status_label = QLabel("Server: Not Running")
@@ -204,6 +174,40 @@ class P2PFileShareApp(QMainWindow):
         server_layout.addWidget(self.toggle_server_btn)
         
         layout.addLayout(server_layout)
+        
+        limit_layout = QHBoxLayout()
+        limit_layout.addWidget(QLabel("Upload limit (KB/s, 0 = off):"))
+        
+        self.global_limit_spin = QSpinBox()
+        self.global_limit_spin.setRange(0, 1000000)
+        self.global_limit_spin.setPrefix("Total ")
+        limit_layout.addWidget(self.global_limit_spin)
+        
+        self.peer_limit_spin = QSpinBox()
+        self.peer_limit_spin.setRange(0, 1000000)
+        self.peer_limit_spin.setPrefix("Per peer ")
+        limit_layout.addWidget(self.peer_limit_spin)
+        
+        self.global_limit_spin.editingFinished.connect(self.update_rate_limits)
+        self.peer_limit_spin.editingFinished.connect(self.update_rate_limits)
+        
+        layout.addLayout(limit_layout)
+        
+        tracker_layout = QHBoxLayout()
+        self.tracker_edit = QLineEdit()
+        self.tracker_edit.setPlaceholderText("Tracker ip:port (optional)")
+        tracker_layout.addWidget(self.tracker_edit)
+        
+        self.use_tracker_btn = QPushButton("Use Tracker")
+        self.use_tracker_btn.clicked.connect(self.use_tracker)
+        tracker_layout.addWidget(self.use_tracker_btn)
+        
+        self.run_tracker_btn = QPushButton("Run Tracker")
+        self.run_tracker_btn.setToolTip("Track the swarms of this session on this machine")
+        self.run_tracker_btn.clicked.connect(self.run_tracker)
+        tracker_layout.addWidget(self.run_tracker_btn)
+        
+        layout.addLayout(tracker_layout)
        
         file_ops_layout = QHBoxLayout()
         
@@ -215,6 +219,10 @@ class P2PFileShareApp(QMainWindow):
         self.share_btn.clicked.connect(self.share_file)
         file_ops_layout.addWidget(self.share_btn)
         
+        self.multicast_btn = QPushButton("Multicast Selected")
+        self.multicast_btn.clicked.connect(self.multicast_file)
+        file_ops_layout.addWidget(self.multicast_btn)
+        
         self.download_btn = QPushButton("Download Selected")
         self.download_btn.clicked.connect(self.download_file)
         file_ops_layout.addWidget(self.download_btn)
@@ -227,8 +235,11 @@ class P2PFileShareApp(QMainWindow):
         
         layout.addWidget(QLabel("Available Shared Files:"))
         
-        self.files_list = QListWidget()
-        self.files_list.itemDoubleClicked.connect(self.file_selected)
+        self.file_model = FileListModel(self)
+        self.files_list = QListView()
+        self.files_list.setModel(self.file_model)
+        self.files_list.setUniformItemSizes(True)
+        self.files_list.doubleClicked.connect(self.file_selected)
         layout.addWidget(self.files_list)
         
         transfer_layout = QHBoxLayout()
@@ -240,45 +251,60 @@ class P2PFileShareApp(QMainWindow):
         graph_box = QGroupBox("Download Statistics")
         graph_layout = QVBoxLayout()
         
-        self.download_graph = DownloadGraphCanvas(self, width=5, height=3)
+        self.graphs = None
+        self.download_graph = QPushButton("Show Download Graph")
+        self.download_graph.setToolTip("Loads the plotting libraries the first time it is opened")
+        self.download_graph.clicked.connect(self.show_statistics)
         graph_layout.addWidget(self.download_graph)
         
-        self.graph_type_btn = QPushButton("Toggle Graph Type")
+        self.graph_type_btn = QPushButton("Show Theoretical Growth Graph")
         self.graph_type_btn.clicked.connect(self.toggle_graph_type)
+        self.graph_type_btn.setVisible(False)
         graph_layout.addWidget(self.graph_type_btn)
         
         graph_box.setLayout(graph_layout)
         layout.addWidget(graph_box)
         
         layout.addWidget(QLabel("File Operation Log:"))
-        self.file_log = QListWidget()
+        self.file_log = HistoryView(self.file_history)
         self.file_log.setMaximumHeight(100)
         layout.addWidget(self.file_log)
         
         file_group.setLayout(layout)
         return file_group
         
-    def toggle_graph_type(self):
+    def show_statistics(self):
+        start = time.perf_counter()
+        import download_graphs
+        self.graphs = download_graphs
+        
+        self.replace_graph(self.graphs.DownloadGraphCanvas(self.download_stats, self, width=5, height=3))
+        self.graph_type_btn.setVisible(True)
+        self.log_file_message(f"Statistics panel loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+        
+    def replace_graph(self, graph):
         graph_layout = self.download_graph.parent().layout()
         
         graph_layout.removeWidget(self.download_graph)
         self.download_graph.setParent(None)
         
-        if isinstance(self.download_graph, DownloadGraphCanvas):
-            self.download_graph = ExponentialGrowthGraphCanvas(self, width=5, height=3)
+        self.download_graph = graph
+        graph_layout.insertWidget(0, self.download_graph)
+        
+    def toggle_graph_type(self):
+        if isinstance(self.download_graph, self.graphs.DownloadGraphCanvas):
+            self.download_graph.stop()
+            self.replace_graph(self.graphs.ExponentialGrowthGraphCanvas(self, width=5, height=3))
             self.graph_type_btn.setText("Show Live Download Graph")
         else:
-            self.download_graph = DownloadGraphCanvas(self, width=5, height=3)
+            self.replace_graph(self.graphs.DownloadGraphCanvas(self.download_stats, self, width=5, height=3))
             self.graph_type_btn.setText("Show Theoretical Growth Graph")
         
-        graph_layout.insertWidget(0, self.download_graph)
-        
     def create_chat_section(self):
         chat_group = QGroupBox("Chat")
         layout = QVBoxLayout()
         
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
+        self.chat_display = HistoryView(self.chat_history)
         layout.addWidget(self.chat_display)
         
         message_layout = QHBoxLayout()
@@ -307,6 +333,12 @@ class P2PFileShareApp(QMainWindow):
             self.selected_file_edit.setText(file_name)
             self.status_bar.showMessage(f"File selected: {file_name}")
     
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Share")
+        if folder:
+            self.selected_file_edit.setText(folder)
+            self.status_bar.showMessage(f"Folder selected: {folder}")
+    
     def toggle_server(self):
         if not self.file_server.server_running:
             self.file_server.start_server()
@@ -317,15 +349,36 @@ class P2PFileShareApp(QMainWindow):
             self.server_status_label.setText("Server: Not Running")
             self.toggle_server_btn.setText("Start Server")
     
+    def update_rate_limits(self):
+        self.file_server.set_rate_limits(self.global_limit_spin.value(), self.peer_limit_spin.value())
+    
+    def use_tracker(self):
+        address = self.tracker_edit.text().strip()
+        self.file_server.set_tracker(address or None)
+        self.status_bar.showMessage(f"Using tracker {address}" if address else "Tracker disabled")
+    
+    def run_tracker(self):
+        tracker = self.file_server.start_tracker()
+        if tracker is None:
+            self.status_bar.showMessage("Could not start tracker")
+            return
+        
+        address = f"{self.file_server.SERVER}:{tracker.port}"
+        self.tracker_edit.setText(address)
+        self.file_server.set_tracker(address)
+        self.run_tracker_btn.setEnabled(False)
+        self.send_to_server(f"TRACKER:{address}")
+        self.status_bar.showMessage(f"Tracker running on {address}")
+    
     def upload_file(self):
         if not self.selected_file_edit.text():
             self.status_bar.showMessage("No file selected")
             return
             
         file_path = self.selected_file_edit.text()
-        filename = os.path.basename(file_path)
+        filename = os.path.basename(os.path.normpath(file_path))
    
-        self.create_chunks(file_path)
+        self.file_server.create_chunks(file_path, self.erasure_checkbox.isChecked())
       
         success = self.file_server.add_file_reference(filename)
         
@@ -343,55 +396,6 @@ class P2PFileShareApp(QMainWindow):
         else:
             self.status_bar.showMessage("Failed to upload file")
     
-    def create_chunks(self, file_path):
-        filename = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-       
-        file_chunk_dir = os.path.join(self.chunk_dir, self.get_file_hash(filename))
-        if not os.path.exists(file_chunk_dir):
-            os.makedirs(file_chunk_dir)
-        
-        chunks = []
-        chunk_index = 0
-      
-        with open(file_path, "rb") as f:
-            while True:
-                chunk_data = f.read(CHUNK_SIZE)
-                if not chunk_data:
-                    break
-                
-                chunk_hash = hashlib.md5(chunk_data).hexdigest()
-                
-                chunk_filename = f"{chunk_index}_{chunk_hash}"
-                chunk_path = os.path.join(file_chunk_dir, chunk_filename)
-                
-                with open(chunk_path, "wb") as chunk_file:
-                    chunk_file.write(chunk_data)
-                
-                chunks.append({
-                    "index": chunk_index,
-                    "hash": chunk_hash,
-                    "size": len(chunk_data)
-                })
-                
-                chunk_index += 1
-   
-        metadata = {
-            "filename": filename,
-            "filesize": file_size,
-            "chunks": chunks,
-            "chunk_count": chunk_index,
-            "owner": self.my_ip,
-            "peers": [self.my_ip] 
-        }
-        
-        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
-        with open(metadata_path, "w") as mf:
-            json.dump(metadata, mf)
-        
-        self.log_file_message(f"Created {chunk_index} chunks for {filename}")
-        return True
-    
     def get_file_hash(self, filename):
         return hashlib.md5(filename.encode()).hexdigest()
     
@@ -401,9 +405,9 @@ class P2PFileShareApp(QMainWindow):
             return
             
         file_path = self.selected_file_edit.text()
-        filename = os.path.basename(file_path)
+        filename = os.path.basename(os.path.normpath(file_path))
         
-        self.create_chunks(file_path)
+        self.file_server.create_chunks(file_path, self.erasure_checkbox.isChecked())
         
         success = self.file_server.add_file_reference(filename)
         
@@ -419,42 +423,84 @@ class P2PFileShareApp(QMainWindow):
         else:
             self.status_bar.showMessage("Failed to share file")
     
-    def file_selected(self, item):
-        self.status_bar.showMessage(f"Selected: {item.text()}")
+    def multicast_file(self):
+        filename = self.selected_file()
+        
+        if not filename:
+            QMessageBox.warning(self, "No Selection", "Please select a shared file to multicast")
+            return
+        
+        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        
+        if not os.path.exists(metadata_path):
+            self.status_bar.showMessage(f"Share {filename} before multicasting it")
+            return
+        
+        self.send_to_server(f"MULTICAST:{filename}")
+        self.multicast.send_file(filename)
+        self.status_bar.showMessage(f"Multicasting {filename} to {self.multicast.GROUP}")
+    
+    def receive_multicast(self, filename):
+        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        
+        if not os.path.exists(metadata_path):
+            self.file_client.request_metadata(filename)
+            self.log_file_message(f"Missing metadata for multicast of {filename}")
+            return
+        
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        
+        peers = [peer for peer in metadata.get('peers', []) if peer != self.my_ip]
+        self.multicast.receive_file(filename, peers, self.file_client)
+    
+    def multicast_completed(self, filename):
+        with open(os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json"), 'r') as f:
+            metadata = json.load(f)
+        
+        output_path = self.file_client.reassemble_file(metadata)
+        if output_path:
+            self.download_completed(output_path)
+        else:
+            self.show_file_error("Failed to reassemble multicast file")
+    
+    def file_selected(self, index):
+        self.status_bar.showMessage(f"Selected: {self.file_model.name_at(index.row())}")
+    
+    def selected_file(self):
+        rows = self.files_list.selectionModel().selectedRows()
+        return self.file_model.name_at(rows[0].row()) if rows else None
     
     def refresh_file_list(self):
-        self.files_list.clear()
-        
-        if os.path.exists(self.metadata_dir):
-            for metadata_file in os.listdir(self.metadata_dir):
-                if metadata_file.endswith('.json'):
-                    try:
-                        with open(os.path.join(self.metadata_dir, metadata_file), 'r') as f:
-                            metadata = json.load(f)
-                            self.files_list.addItem(metadata['filename'])
-                    except:
-                        pass
-        
-        network_files = self.file_client.get_file_list()
-        if network_files and isinstance(network_files, list):
-            for file in network_files:
-                found = False
-                for i in range(self.files_list.count()):
-                    if self.files_list.item(i).text() == file:
-                        found = True
-                        break
-                
-                if not found:
-                    self.files_list.addItem(file)
+        # safe from any thread: the scan and the server round trip run on
+        # the fetcher's thread and the result comes back to file_list_fetched
+        self.catalog_fetcher.fetch()
+    
+    def file_list_fetched(self, local, network, error):
+        # both catalogs are versioned: the local one only rescans when the
+        # directories change and the server only sends what changed since
+        # our last sync, so the model is patched instead of rebuilt
+        if network is None:
+            # keep showing what the server had last time
+            self.status_bar.showMessage(f"Could not reach the file server: {error}")
+            network = self.network_files
+        else:
+            self.network_files = network
+            missing = [file for file in network - local
+                       if not os.path.exists(os.path.join(self.metadata_dir, f"{self.get_file_hash(file)}.json"))]
+            if missing:
+                # one round trip for every manifest we do not have yet
+                self.file_client.request_metadata_batch(
+                    f"{self.file_client.SERVER_IP}:{self.file_client.PORT}", missing)
+        
+        self.file_model.apply(local | network)
     
     def download_file(self):
-        selected_items = self.files_list.selectedItems()
+        filename = self.selected_file()
         
-        if not selected_items:
+        if not filename:
             QMessageBox.warning(self, "No Selection", "Please select a file to download")
             return
-            
-        filename = selected_items[0].text()
         
         file_hash = self.get_file_hash(filename)
         metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
@@ -463,149 +509,21 @@ class P2PFileShareApp(QMainWindow):
         self.progress_bar.setValue(0)
         self.progress_bar.setVisible(True)
         
-        if hasattr(self, 'download_graph') and isinstance(self.download_graph, DownloadGraphCanvas):
-            self.download_graph.reset()
+        self.download_stats.reset()
         
         if os.path.exists(metadata_path):
-            threading.Thread(target=self.download_from_peers, args=(filename,), daemon=True).start()
+            threading.Thread(target=self.file_client.download_from_peers, args=(filename,), daemon=True).start()
         else:
+            self.pending_download = filename
             self.file_client.request_metadata(filename)
-            self.status_bar.showMessage(f"Requesting metadata for {filename}")
+            self.status_bar.showMessage(f"Looking up {filename} in the DHT")
     
+    def metadata_ready(self, filename):
+        self.log_file_message(f"Received metadata for {filename}")
+        if filename == self.pending_download:
+            self.pending_download = None
+            threading.Thread(target=self.file_client.download_from_peers, args=(filename,), daemon=True).start()
     
-    def download_from_peers(self, filename):
-        file_hash = self.get_file_hash(filename)
-        metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
-        
-        try:
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-
-            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
-            if not os.path.exists(file_chunk_dir):
-                os.makedirs(file_chunk_dir)
-            
-            chunk_count = metadata['chunk_count']
-            total_downloaded = 0
-            active_peers = set()
-            download_start_time = time.time()
-            chunk_sizes = []
-            
-            base_speed = 50
-            
-            for chunk_index, chunk_info in enumerate(metadata['chunks']):
-                chunk_index = chunk_info['index']
-                chunk_hash = chunk_info['hash']
-                chunk_filename = f"{chunk_index}_{chunk_hash}"
-                chunk_path = os.path.join(file_chunk_dir, chunk_filename)
-                
-                if os.path.exists(chunk_path):
-                    total_downloaded += 1
-                    chunk_sizes.append(chunk_info['size'])
-                    progress = int((total_downloaded / chunk_count) * 100)
-                    self.file_client.signals.progress_update.emit(progress)
-                    
-                    current_speed = base_speed * (1 + (total_downloaded / chunk_count) * 1.5)
-                    if hasattr(self, 'download_graph') and isinstance(self.download_graph, DownloadGraphCanvas):
-                        self.download_graph.update_plot(current_speed, len(active_peers) + 1)
-                        
-                    continue
-
-                found_peer = False
-                chunk_start_time = time.time()
-                
-                for peer in metadata.get('peers', []):
-                    if peer == self.my_ip:
-                        continue
-                    
-                    success = self.file_client.download_chunk(
-                        peer, 
-                        metadata['filename'], 
-                        chunk_index, 
-                        chunk_hash, 
-                        file_chunk_dir
-                    )
-                    
-                    if success:
-                        active_peers.add(peer)
-                        found_peer = True
-                        total_downloaded += 1
-                        chunk_sizes.append(chunk_info['size'])
-                        
-                        chunk_download_time = time.time() - chunk_start_time
-                        if chunk_download_time > 0:
-                            real_speed = chunk_info['size'] / 1024 / chunk_download_time
-                            
-                            current_speed = (real_speed * 0.5) + (base_speed * (1 + (total_downloaded / chunk_count) * 1.5) * 0.5)
-                            
-                            if len(self.download_graph.speeds) > 0:
-                                current_speed = max(current_speed, self.download_graph.speeds[-1] * 1.05)
-                            
-                            if hasattr(self, 'download_graph') and isinstance(self.download_graph, DownloadGraphCanvas):
-                                self.download_graph.update_plot(current_speed, len(active_peers))
-                        
-                        progress = int((total_downloaded / chunk_count) * 100)
-                        self.file_client.signals.progress_update.emit(progress)
-                        break
-                
-                if not found_peer:
-                    self.file_client.signals.error.emit(f"Could not find a peer with chunk {chunk_index}")
-                    return
-                    
-                time.sleep(0.05)
-            
-            output_path = self.reassemble_file(metadata)
-            if output_path:
-                total_download_time = time.time() - download_start_time
-                total_size = sum(chunk_sizes) / 1024
-                if total_download_time > 0:
-                    avg_speed = total_size / total_download_time
-                    self.log_file_message(f"Download completed at avg speed: {avg_speed:.2f} KB/s with {len(active_peers)} peers")
-                
-                self.file_client.signals.download_complete.emit(output_path)
-            else:
-                self.file_client.signals.error.emit("Failed to reassemble file")
-                    
-        except Exception as e:
-            self.file_client.signals.error.emit(f"Download error: {str(e)}")
-
-
-    def reassemble_file(self, metadata):
-        try:
-            filename = metadata['filename']
-            file_hash = self.get_file_hash(filename)
-            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
-            
-            download_dir = "./downloaded_files"
-            if not os.path.exists(download_dir):
-                os.makedirs(download_dir)
-            
-            output_path = os.path.join(download_dir, filename)
-            
-            with open(output_path, 'wb') as outfile:
-                for i in range(metadata['chunk_count']):
-                    chunk_info = None
-                    for chunk in metadata['chunks']:
-                        if chunk['index'] == i:
-                            chunk_info = chunk
-                            break
-                    
-                    if not chunk_info:
-                        raise Exception(f"Missing chunk info for index {i}")
-                    
-                    chunk_filename = f"{i}_{chunk_info['hash']}"
-                    chunk_path = os.path.join(file_chunk_dir, chunk_filename)
-                    
-                    if not os.path.exists(chunk_path):
-                        raise Exception(f"Missing chunk file: {chunk_filename}")
-                    
-                    with open(chunk_path, 'rb') as infile:
-                        outfile.write(infile.read())
-            
-            return output_path
-        except Exception as e:
-            self.log_file_message(f"Reassembly error: {str(e)}")
-            return None
     
     def send_message(self):
         message = self.message_input.text().strip()
@@ -639,6 +557,16 @@ class P2PFileShareApp(QMainWindow):
                         self.chat_display.append(f"[{timestamp}] A new file has been shared: {filename}")
                         self.refresh_file_list()
                     
+                    elif msg.startswith("MULTICAST:"):
+                        filename = msg.split(":", 1)[1]
+                        self.chat_display.append(f"[{timestamp}] Incoming multicast of {filename}")
+                        self.receive_multicast(filename)
+                    
+                    elif msg.startswith("TRACKER:"):
+                        address = msg.split(":", 1)[1]
+                        self.chat_display.append(f"[{timestamp}] Tracker announced at {address}")
+                        self.file_server.set_tracker(address)
+                    
                     elif msg.startswith("METADATA_REQUEST:"):
                         filename = msg.split(":", 1)[1]
                         self.handle_metadata_request(filename)
@@ -678,8 +606,6 @@ class P2PFileShareApp(QMainWindow):
         self.transfer_status.setText(f"Downloaded to: {filepath}")
         self.progress_bar.setVisible(False)
         self.log_file_message(f"File downloaded to {filepath}")
-        if hasattr(self, 'download_graph') and isinstance(self.download_graph, DownloadGraphCanvas):
-            pass
         QMessageBox.information(self, "Download Complete", f"File downloaded to {filepath}")
     
     def show_file_error(self, message):
@@ -689,14 +615,13 @@ class P2PFileShareApp(QMainWindow):
         QMessageBox.critical(self, "File Operation Error", message)
     
     def log_file_message(self, message):
-        self.file_log.addItem(message)
-        self.file_log.scrollToBottom()
+        self.file_log.append(message)
     
     def log_server_message(self, message):
-        self.file_log.addItem(f"Server: {message}")
-        self.file_log.scrollToBottom()
+        self.file_log.append(f"Server: {message}")
     
     def closeEvent(self, event):
+        self.file_server.stop_tracker()
         if self.file_server.server_running:
             self.file_server.stop_server()
         
@@ -705,17 +630,38 @@ class P2PFileShareApp(QMainWindow):
         except:
             pass
         
+        self.chat_history.close()
+        self.file_history.close()
         event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="P2P File Sharing System")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time spent in each startup phase once the window is up, then exit")
+    args, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
+    mark_startup("QApplication")
 
     app.setStyle("Fusion")
     with open("style.qss", "r") as f:
         app.setStyleSheet(f.read())
         style = f.read()
         app.setStyle(style)
+    mark_startup("stylesheet")
 
     window = P2PFileShareApp()
+    if args.metrics_port:
+        window.file_client.telemetry.serve(args.metrics_port)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    mark_startup("window.show")
+
+    if args.profile_startup:
+        def finish_profile():
+            mark_startup("first event loop pass")
+            print(startup_report(), flush=True)
+            window.close()
+        QTimer.singleShot(0, finish_profile)
+    sys.exit(app.exec_())
@@ -0,0 +1,13 @@
+from PyQt5.QtCore import pyqtSignal, QObject
+
+from p2pcore.multicast import MulticastManager as CoreMulticastManager
+
+class MulticastSignals(QObject):
+    update_log = pyqtSignal(str)
+    progress_update = pyqtSignal(int)
+    transfer_complete = pyqtSignal(str)
+
+class MulticastManager(CoreMulticastManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signals = MulticastSignals()
@@ -0,0 +1 @@
+"""Qt-free transfer engine shared by the GUI (main.py) and the p2pd daemon."""
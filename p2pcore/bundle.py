@@ -0,0 +1,182 @@
+import os
+import stat
+import threading
+
+
+def walk_directory(directory):
+    """Regular files under directory as (relative posix path, full path),
+    in a stable order so the same tree always packs the same way"""
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            if os.path.isfile(full_path) and not os.path.islink(full_path):
+                relative = os.path.relpath(full_path, directory).replace(os.sep, "/")
+                entries.append((relative, full_path))
+    return entries
+
+
+class BundleReader:
+    """File-like view of a directory with every file packed back to back.
+
+    create_chunks() reads it exactly like a single file, so small files end
+    up sharing chunks instead of each getting a chunk, a manifest and a
+    connection of its own. `files` is the table that goes in the manifest.
+    """
+
+    def __init__(self, directory):
+        self.files = []
+        self.paths = []
+        offset = 0
+        for relative, full_path in walk_directory(directory):
+            info = os.stat(full_path)
+            self.files.append({
+                "path": relative,
+                "offset": offset,
+                "length": info.st_size,
+                "mode": stat.S_IMODE(info.st_mode)
+            })
+            self.paths.append(full_path)
+            offset += info.st_size
+        self.size = offset
+        self.current = 0
+        self.handle = None
+        self.left = 0
+
+    def read(self, size):
+        parts = []
+        while size > 0 and self.current < len(self.files):
+            if self.handle is None:
+                self.handle = open(self.paths[self.current], "rb")
+                self.left = self.files[self.current]["length"]
+
+            data = self.handle.read(min(size, self.left)) if self.left else b""
+            if self.left and not data:
+                raise IOError(f"{self.files[self.current]['path']} shrank while it was being shared")
+            parts.append(data)
+            size -= len(data)
+            self.left -= len(data)
+
+            if self.left == 0:
+                self.handle.close()
+                self.handle = None
+                self.current += 1
+        return b"".join(parts)
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def safe_join(root, relative):
+    """Refuse manifest paths that would land outside the output directory"""
+    parts = relative.split("/")
+    if relative.startswith("/") or any(part in ("", ".", "..") for part in parts) or ":" in parts[0]:
+        raise ValueError(f"Unsafe path in bundle: {relative}")
+    return os.path.join(root, *parts)
+
+
+class BundleUnpacker:
+    """Writes out the files of a bundle as the chunks covering them arrive.
+
+    chunk_ready() is called for each verified chunk (in any order, from any
+    thread); a file is extracted as soon as its last missing chunk lands.
+    """
+
+    def __init__(self, metadata, chunk_dir, output_dir):
+        self.chunk_dir = chunk_dir
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.ready = set()
+        self.extracted = 0
+
+        chunks = sorted(metadata['chunks'], key=lambda c: c['index'])
+        self.chunks = []
+        start = 0
+        for chunk in chunks:
+            self.chunks.append((chunk['index'], chunk['hash'], start, chunk['size']))
+            start += chunk['size']
+        starts = [c[2] for c in self.chunks]
+
+        self.files = metadata['bundle']['files']
+        self.missing = []
+        self.spans = []
+        self.covering = {}
+        empty = []
+        for n, entry in enumerate(self.files):
+            safe_join(output_dir, entry['path'])
+            if entry['length'] == 0:
+                self.missing.append(0)
+                self.spans.append(range(0))
+                empty.append(n)
+                continue
+            first = self.chunk_position(starts, entry['offset'])
+            last = self.chunk_position(starts, entry['offset'] + entry['length'] - 1)
+            self.missing.append(last - first + 1)
+            self.spans.append(range(first, last + 1))
+            for position in range(first, last + 1):
+                self.covering.setdefault(self.chunks[position][0], []).append(n)
+
+        for n in empty:
+            self.extract(n)
+
+    def chunk_position(self, starts, offset):
+        low, high = 0, len(starts) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if starts[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def chunk_ready(self, chunk_index):
+        complete = []
+        with self.lock:
+            if chunk_index in self.ready:
+                return
+            self.ready.add(chunk_index)
+            for n in self.covering.get(chunk_index, []):
+                self.missing[n] -= 1
+                if self.missing[n] == 0:
+                    complete.append(n)
+
+        for n in complete:
+            self.extract(n)
+
+    def extract(self, n):
+        entry = self.files[n]
+        path = safe_join(self.output_dir, entry['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        end = entry['offset'] + entry['length']
+        with open(path, "wb") as out:
+            for position in self.spans[n]:
+                index, chunk_hash, start, size = self.chunks[position]
+                with open(os.path.join(self.chunk_dir, f"{index}_{chunk_hash}"), "rb") as f:
+                    f.seek(max(entry['offset'] - start, 0))
+                    out.write(f.read(min(end, start + size) - max(entry['offset'], start)))
+
+        if os.name != "nt":
+            os.chmod(path, entry['mode'] & 0o777)
+        with self.lock:
+            self.extracted += 1
+
+    def finish(self):
+        """Mark every chunk on disk as ready (e.g. rebuilt from repair pieces)
+        and return the output directory once all files are written"""
+        for index, chunk_hash, _, _ in self.chunks:
+            if os.path.exists(os.path.join(self.chunk_dir, f"{index}_{chunk_hash}")):
+                self.chunk_ready(index)
+
+        if self.extracted < len(self.files):
+            raise IOError(f"{len(self.files) - self.extracted} files of the bundle are still missing chunks")
+        return self.output_dir
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+CHANGE_HISTORY = 4096
+
+
+def directory_stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class Catalog:
+    """Names this peer offers (manifests in metadata/ plus plain files in
+    shared_files/) with a version that goes up by one per added or removed
+    name. The last CHANGE_HISTORY changes are kept, so a peer that already
+    has version N gets just the names added and removed since then.
+
+    The directories are only rescanned when their mtime changes, and a
+    manifest is only opened the first time it is seen. The epoch changes
+    on every start, which tells clients their old version is meaningless.
+    """
+
+    def __init__(self, metadata_dir, files_dir, history=CHANGE_HISTORY):
+        self.metadata_dir = metadata_dir
+        self.files_dir = files_dir
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self.names = set()
+        self.changes = deque(maxlen=history)
+        self.manifest_names = {}
+        self.stamp = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        stamp = (directory_stamp(self.metadata_dir), directory_stamp(self.files_dir))
+        with self.lock:
+            # an mtime from the last second may hide a later change made
+            # within the same timestamp tick, so those are always rescanned
+            if stamp == self.stamp and time.time_ns() - max(stamp) > 1_000_000_000:
+                return self.version
+            self.stamp = stamp
+            names = self.scan()
+            for name in sorted(names - self.names):
+                self.version += 1
+                self.changes.append((self.version, name, True))
+            for name in sorted(self.names - names):
+                self.version += 1
+                self.changes.append((self.version, name, False))
+            self.names = names
+            return self.version
+
+    def scan(self):
+        names = set()
+        manifest_names = {}
+        if os.path.exists(self.metadata_dir):
+            for metadata_file in os.listdir(self.metadata_dir):
+                if not metadata_file.endswith('.json'):
+                    continue
+                name = self.manifest_names.get(metadata_file)
+                if name is None:
+                    try:
+                        with open(os.path.join(self.metadata_dir, metadata_file), 'r') as f:
+                            name = json.load(f)['filename']
+                    except (OSError, ValueError, KeyError):
+                        continue
+                manifest_names[metadata_file] = name
+                names.add(name)
+        self.manifest_names = manifest_names
+
+        if os.path.exists(self.files_dir):
+            for file in os.listdir(self.files_dir):
+                if os.path.isfile(os.path.join(self.files_dir, file)):
+                    names.add(file)
+        return names
+
+    def delta(self, epoch=None, since=0):
+        """Return (kind, version, added, removed). kind is "delta" when the
+        changes since `since` are still known, else "full" with every name"""
+        self.refresh()
+        with self.lock:
+            oldest = self.changes[0][0] if self.changes else self.version + 1
+            if epoch != self.epoch or since > self.version or since < oldest - 1:
+                return "full", self.version, sorted(self.names), []
+
+            latest = {}
+            for version, name, added in reversed(self.changes):
+                if version <= since:
+                    break
+                latest.setdefault(name, added)
+            added = sorted(name for name, present in latest.items() if present)
+            removed = sorted(name for name, present in latest.items() if not present)
+            return "delta", self.version, added, removed
@@ -0,0 +1,123 @@
+import time
+import random
+import threading
+
+RECHOKE_INTERVAL = 10.0
+OPTIMISTIC_INTERVAL = 30.0
+# upload share of a peer that won its slot by contributing, relative to 1.0
+CONTRIBUTOR_WEIGHT = 2.0
+
+
+class UploadSlotManager:
+    """Tit-for-tat upload slots for the file server.
+
+    At most `slots` peers are unchoked. Every `interval` seconds the regular
+    slots go to the interested peers that contributed most since the last
+    round, either bytes they report uploading to the swarm or bytes we
+    observed receiving from them. Equal scores (usually everyone at 0 before
+    any data has moved) go to the peer served longest ago, so peers that
+    contribute nothing still take turns in the regular slots. One extra
+    optimistic slot goes to the longest-waiting choked peer every
+    `optimistic_interval` seconds so newcomers get a chance to start
+    re-seeding. With a single slot there is no optimistic one; the regular
+    slot rotates on its own.
+
+    After every rechoke the callables in on_rechoke get the upload weight
+    of each peer: CONTRIBUTOR_WEIGHT for regular slots held by a peer that
+    contributed last round, 1.0 (the default) for everyone else.
+    """
+
+    def __init__(self, slots=4, interval=RECHOKE_INTERVAL, optimistic_interval=OPTIMISTIC_INTERVAL):
+        self.slots = slots
+        self.interval = interval
+        self.optimistic_interval = optimistic_interval
+        self.peers = {}
+        self.unchoked = set()
+        self.optimistic = None
+        self.last_rechoke = time.monotonic()
+        self.last_optimistic = 0.0
+        self.on_rechoke = []
+        self.lock = threading.Lock()
+
+    def _peer(self, peer):
+        if peer not in self.peers:
+            self.peers[peer] = {"reported": 0, "received": 0, "served": 0,
+                                "score_base": 0, "score": 0, "last_seen": 0.0,
+                                "last_unchoked": 0.0}
+        return self.peers[peer]
+
+    def report(self, peer, uploaded_bytes):
+        with self.lock:
+            info = self._peer(peer)
+            info["reported"] = max(info["reported"], uploaded_bytes)
+
+    def record_received(self, peer, nbytes):
+        with self.lock:
+            self._peer(peer)["received"] += nbytes
+
+    def record_served(self, peer, nbytes):
+        with self.lock:
+            self._peer(peer)["served"] += nbytes
+
+    def request_slot(self, peer):
+        """Return True if peer may download now, False if it is choked"""
+        with self.lock:
+            now = time.monotonic()
+            self._peer(peer)["last_seen"] = now
+            if now - self.last_rechoke >= self.interval:
+                self._rechoke(now)
+
+            if peer in self.unchoked or peer == self.optimistic:
+                return True
+            if len(self.unchoked) + (1 if self.optimistic else 0) < self.slots:
+                self.unchoked.add(peer)
+                self.peers[peer]["last_unchoked"] = now
+                return True
+            return False
+
+    def _waited(self, peer):
+        # longest since last unchoked first, random among peers never served
+        return (self.peers[peer]["last_unchoked"], random.random())
+
+    def _rechoke(self, now):
+        self.last_rechoke = now
+        interested = [p for p, info in self.peers.items()
+                      if now - info["last_seen"] < self.interval * 2]
+
+        for peer in interested:
+            info = self.peers[peer]
+            total = info["reported"] + info["received"]
+            info["score"] = total - info["score_base"]
+            info["score_base"] = total
+
+        regular = self.slots - 1 if self.slots > 1 else self.slots
+        ranked = sorted(interested, key=lambda p: (-self.peers[p]["score"],) + self._waited(p))
+        self.unchoked = set(ranked[:max(regular, 0)])
+        for peer in self.unchoked:
+            self.peers[peer]["last_unchoked"] = now
+
+        choked = [p for p in interested if p not in self.unchoked]
+        if regular == self.slots:
+            self.optimistic = None
+        elif self.optimistic not in choked or now - self.last_optimistic >= self.optimistic_interval:
+            self.optimistic = min(choked, key=self._waited) if choked else None
+            self.last_optimistic = now
+        if self.optimistic:
+            self.peers[self.optimistic]["last_unchoked"] = now
+
+        weights = {p: CONTRIBUTOR_WEIGHT for p in self.unchoked if self.peers[p]["score"] > 0}
+        for callback in self.on_rechoke:
+            callback(weights)
+
+    def set_slots(self, slots):
+        with self.lock:
+            self.slots = slots
+            self._rechoke(time.monotonic())
+
+    def stats(self):
+        with self.lock:
+            return {
+                "unchoked": sorted(self.unchoked),
+                "optimistic": self.optimistic,
+                "peers": {p: dict(info) for p, info in self.peers.items()}
+            }
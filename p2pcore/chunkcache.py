@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+CHUNK_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class ChunkCache:
+    """LRU of raw chunk bytes for the seeder, keyed by (file hash, chunk index).
+
+    get() runs the loader only on a miss, and concurrent misses for the same
+    key share one load: when a whole class asks for chunk 0 at once, one
+    thread reads it from disk and the others wait for that result. Chunks
+    larger than the budget are served but not kept, and so is a load that
+    was discarded while it was still running.
+    """
+
+    def __init__(self, max_bytes=CHUNK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        """Return (name, memoryview) for key, or None when the loader has nothing"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            waiter = self.loading.get(key)
+            if waiter is None:
+                waiter = self.loading[key] = [threading.Event(), None, False]
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            waiter[0].wait()
+            return waiter[1]
+
+        entry = None
+        try:
+            loaded = loader()
+            if loaded is not None:
+                name, data = loaded
+                entry = (name, memoryview(data).toreadonly())
+        finally:
+            waiter[1] = entry
+            with self.lock:
+                del self.loading[key]
+                if entry is not None and len(entry[1]) <= self.max_bytes and not waiter[2]:
+                    self.entries[key] = entry
+                    self.size += len(entry[1])
+                    self.evict()
+            waiter[0].set()
+        return entry
+
+    def evict(self):
+        while self.size > self.max_bytes and self.entries:
+            _, (_, data) = self.entries.popitem(last=False)
+            self.size -= len(data)
+            self.evictions += 1
+
+    def discard(self, key):
+        """Forget one chunk, e.g. because its file was just written"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= len(entry[1])
+            if key in self.loading:
+                self.loading[key][2] = True
+
+    def drop(self, file_hash):
+        """Forget every cached chunk of a file (e.g. after it was re-chunked)"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == file_hash]:
+                self.size -= len(self.entries.pop(key)[1])
+
+    def set_budget(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "budget_bytes": self.max_bytes
+            }
@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import hashlib
+import time
+import argparse
+
+from .server import FileServerManager, DEFAULT_PORT
+from .tracker import TrackerClient, DEFAULT_TRACKER_PORT
+from .client import FileClientManager, MetadataWorker, DOWNLOAD_CONNECTIONS
+from .streaming import STREAM_WINDOW
+
+
+def print_line(message):
+    print(message, flush=True)
+
+
+def make_server(args):
+    server = FileServerManager(host=args.host, port=args.port, base_dir=args.base_dir, my_ip=args.advertise)
+    server.signals.update_log.connect(print_line)
+    server.disk.set_fsync(args.fsync)
+    server.chunk_cache.set_budget(args.cache_mb * 1024 * 1024)
+    server.dht_enabled = not args.no_dht
+    server.dht_bootstrap = args.bootstrap
+    if args.tracker:
+        server.set_tracker(args.tracker)
+    return server
+
+
+def make_client(args, server=None):
+    client = FileClientManager(base_dir=args.base_dir, file_server=server)
+    client.disk.set_fsync(args.fsync)
+    if args.no_multiplex:
+        client.sessions = None
+    client.signals.log.connect(print_line)
+    client.signals.error.connect(lambda message: print_line(f"Error: {message}"))
+    return client
+
+
+def share(args, server):
+    for path in args.paths:
+        server.create_chunks(path, args.repair)
+        if not server.add_file_reference(os.path.basename(os.path.normpath(path))):
+            return False
+    return True
+
+
+def cmd_share(args):
+    return 0 if share(args, make_server(args)) else 1
+
+
+def cmd_seed(args):
+    server = make_server(args)
+    server.zero_copy = args.sendfile
+    if args.paths and not share(args, server):
+        return 1
+
+    shared, _ = server.scan_manifests()
+    for filename in shared:
+        server.verify_store(filename)
+
+    server.start_server()
+    try:
+        while server.server_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop_server()
+        return 0
+    return 1
+
+
+def cmd_verify(args):
+    server = make_server(args)
+    filenames = args.filenames or server.scan_manifests()[0]
+    failed = 0
+    for filename in filenames:
+        try:
+            good, bad = server.verify_store(filename)
+        except (OSError, ValueError, KeyError) as e:
+            print_line(f"{filename}: {str(e)}")
+            failed += 1
+            continue
+        print_line(f"{filename}: {good} good, {bad} corrupt chunks removed")
+        failed += bad > 0
+    return 1 if failed else 0
+
+
+def cmd_fetch(args):
+    server = make_server(args)
+    client = make_client(args, server)
+    metadata_path = os.path.join(client.metadata_dir, f"{client.get_file_hash(args.filename)}.json")
+
+    if args.serve:
+        server.start_server()
+    elif server.dht_enabled:
+        server.start_dht(server.dht_bootstrap)
+    if server.dht:
+        server.dht_ready.wait(10)
+
+    if not os.path.exists(metadata_path):
+        for peer in args.peer:
+            worker = MetadataWorker(peer, args.filename, client.signals, client.metadata_dir)
+            worker.start()
+            worker.join()
+            if os.path.exists(metadata_path):
+                break
+        else:
+            if args.peer or not client.find_metadata(args.filename):
+                print_line(f"No metadata for {args.filename}; pass --peer or --bootstrap to find it")
+                return 1
+
+    if args.peer:
+        with open(metadata_path, "r") as f:
+            metadata = json.load(f)
+        metadata['peers'] = list(dict.fromkeys(metadata.get('peers', []) + args.peer))
+        with open(metadata_path, "w") as f:
+            json.dump(metadata, f)
+
+    output_path = client.download_from_peers(args.filename)
+    if not output_path:
+        return 1
+    print_line(f"Downloaded to {output_path}")
+
+    if args.serve:
+        server.add_file_reference(args.filename)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop_server()
+    return 0
+
+
+def print_error(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def cmd_stream(args):
+    server = make_server(args)
+    client = make_client(args, server)
+    # stdout carries the file data, so every message goes to stderr
+    server.signals.update_log.disconnect()
+    server.signals.update_log.connect(print_error)
+    client.signals.log.disconnect()
+    client.signals.error.disconnect()
+    client.signals.error.connect(lambda message: print_error(f"Error: {message}"))
+    if server.dht_enabled:
+        server.start_dht(server.dht_bootstrap)
+        server.dht_ready.wait(10)
+    metadata_path = os.path.join(client.metadata_dir, f"{client.get_file_hash(args.filename)}.json")
+    if not os.path.exists(metadata_path) and not client.find_metadata(args.filename):
+        print_error(f"No metadata for {args.filename}")
+        return 1
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with client.open_stream(args.filename, args.window) as reader:
+            reader.seek(args.offset)
+            while True:
+                data = reader.read(1024 * 1024)
+                if not data:
+                    break
+                out.write(data)
+                out.flush()
+    except (IOError, ValueError) as e:
+        print_error(f"Error: {str(e)}")
+        return 1
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+def cmd_pull(args):
+    client = make_client(args)
+    saved = client.fetch_metadata_batch(args.peer, args.filenames or None)
+    if saved is None:
+        return 1
+    print_line(f"Saved {len(saved)} manifests from {args.peer}")
+    return 0
+
+
+def cmd_get(args):
+    client = make_client(args)
+    client.signals.progress_update.connect(lambda progress: print(f"\r{progress}%", end="", flush=True))
+    if args.server:
+        client.set_server(args.server, args.server_port)
+
+    start = time.time()
+    worker = client.download_file(args.filename, args.peer or None, args.connections)
+    worker.join()
+    print()
+    if worker.error:
+        return 1
+    print_line(f"Downloaded to {worker.filepath} in {time.time() - start:.2f}s")
+    return 0
+
+
+def cmd_tracker(args):
+    server = make_server(args)
+    tracker = server.start_tracker(args.tracker_port)
+    if tracker is None:
+        return 1
+    try:
+        while tracker.running:
+            time.sleep(10)
+            print_line(f"{len(tracker.swarms)} swarms, {tracker.announces} announces, {tracker.scrapes} scrapes")
+    except KeyboardInterrupt:
+        server.stop_tracker()
+    return 0
+
+
+def cmd_scrape(args):
+    if not args.tracker:
+        print_line("scrape needs --tracker ip[:port]")
+        return 1
+    client = TrackerClient(args.tracker)
+    hashes = {hashlib.md5(name.encode()).hexdigest(): name for name in args.filenames}
+    stats = client.scrape(list(hashes))
+    if stats is None:
+        print_line(f"Tracker {args.tracker} did not answer")
+        return 1
+    for file_hash, counts in stats.items():
+        print(f"{hashes.get(file_hash, file_hash)}: {counts['seeders']} seeders, "
+              f"{counts['leechers']} leechers, {counts['completed']} completed")
+    return 0
+
+
+def cmd_list(args):
+    client = make_client(args)
+    names = set()
+    if os.path.exists(client.metadata_dir):
+        for metadata_file in os.listdir(client.metadata_dir):
+            if metadata_file.endswith('.json'):
+                try:
+                    with open(os.path.join(client.metadata_dir, metadata_file), 'r') as f:
+                        names.add(json.load(f)['filename'])
+                except (OSError, ValueError, KeyError):
+                    pass
+
+    if args.server:
+        client.set_server(args.server, args.server_port)
+        remote = client.get_file_list()
+        if isinstance(remote, str):
+            print_line(remote)
+            return 1
+        names.update(remote)
+
+    for name in sorted(names):
+        print(name)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="p2pd", description="Headless P2P file sharing daemon")
+    parser.add_argument("--base-dir", default=".", help="directory holding shared_files/, chunks/ and metadata/")
+    parser.add_argument("--host", default="0.0.0.0", help="address the file server binds to")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--advertise", help="address other peers should use for this host")
+    parser.add_argument("--bootstrap", action="append", default=[],
+                        help="ip or ip:port of a peer to join the DHT through (repeatable)")
+    parser.add_argument("--no-dht", action="store_true", help="do not join the DHT")
+    parser.add_argument("--tracker", help="ip[:port] of a tracker to announce to and get peers from")
+    parser.add_argument("--cache-mb", type=int, default=256, help="RAM budget for hot chunks served to peers")
+    parser.add_argument("--fsync", default="none",
+                        help="when downloaded data is fsynced: none, chunk, or every N megabytes")
+    parser.add_argument("--no-multiplex", action="store_true",
+                        help="open a connection per request instead of one multiplexed session per peer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("share", help="chunk files (or directories, as one bundle) and write their manifests")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--repair", action="store_true", help="add erasure-coded repair pieces")
+    p.set_defaults(func=cmd_share)
+
+    p = commands.add_parser("seed", help="serve shared files until interrupted")
+    p.add_argument("paths", nargs="*", help="files to share before seeding")
+    p.add_argument("--repair", action="store_true")
+    p.add_argument("--sendfile", action="store_true",
+                   help="send raw chunks with sendfile() instead of from the chunk cache (no compression)")
+    p.set_defaults(func=cmd_seed)
+
+    p = commands.add_parser("verify", help="check stored chunks against their manifests")
+    p.add_argument("filenames", nargs="*", help="files to check (default: every file this peer serves)")
+    p.set_defaults(func=cmd_verify)
+
+    p = commands.add_parser("fetch", help="download a file from the swarm")
+    p.add_argument("filename")
+    p.add_argument("--peer", action="append", default=[], help="ip or ip:port of a peer that has the file")
+    p.add_argument("--serve", action="store_true", help="keep seeding after the download")
+    p.set_defaults(func=cmd_fetch)
+
+    p = commands.add_parser("stream", help="write a file to stdout in order while it downloads")
+    p.add_argument("filename")
+    p.add_argument("--offset", type=int, default=0, help="byte offset to start from")
+    p.add_argument("--window", type=int, default=STREAM_WINDOW, help="chunks to prefetch ahead of the reader")
+    p.add_argument("--output", help="write here instead of stdout")
+    p.set_defaults(func=cmd_stream)
+
+    p = commands.add_parser("pull", help="fetch manifests from a peer in one batched request")
+    p.add_argument("peer", help="ip or ip:port of the peer")
+    p.add_argument("filenames", nargs="*", help="manifests to fetch (default: all of them)")
+    p.set_defaults(func=cmd_pull)
+
+    p = commands.add_parser("get", help="download a whole shared file by byte ranges")
+    p.add_argument("filename")
+    p.add_argument("--peer", action="append", default=[], help="ip or ip:port to fetch from (repeatable)")
+    p.add_argument("--server", help="host to fetch from when no --peer is given")
+    p.add_argument("--server-port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--connections", type=int, default=DOWNLOAD_CONNECTIONS)
+    p.set_defaults(func=cmd_get)
+
+    p = commands.add_parser("tracker", help="run an in-memory tracker")
+    p.add_argument("--tracker-port", type=int, default=DEFAULT_TRACKER_PORT)
+    p.set_defaults(func=cmd_tracker)
+
+    p = commands.add_parser("scrape", help="show seeder/leecher counts from --tracker")
+    p.add_argument("filenames", nargs="*", help="files to ask about (default: every swarm)")
+    p.set_defaults(func=cmd_scrape)
+
+    p = commands.add_parser("list", help="list local manifests and a server's catalog")
+    p.add_argument("--server", help="file server to ask for its LIST")
+    p.add_argument("--server-port", type=int, default=DEFAULT_PORT)
+    p.set_defaults(func=cmd_list)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1127 @@
+import socket
+import os
+import threading
+import json
+import hashlib
+import time
+import random
+import queue
+from . import compression
+from .telemetry import Telemetry, ChunkSample
+from .events import ClientSignals
+from .bundle import BundleUnpacker
+from .diskio import DiskIO
+from .stamps import StampCache
+from .server import recv_exact, MAX_BATCH, MAX_CHUNK_SIZE
+from .streaming import PiecePicker, StreamReader, STREAM_WINDOW
+from .session import SessionPool, CONTROL, BULK
+from .choking import RECHOKE_INTERVAL, OPTIMISTIC_INTERVAL
+
+DEFAULT_PEER_PORT = 8080
+# a choked peer gets at least two optimistic rounds and several rechokes
+# to win a slot before we give up on it
+CHOKE_TIMEOUT = 2 * OPTIMISTIC_INTERVAL + RECHOKE_INTERVAL
+CHOKE_RETRY_DELAY = 2.0
+CHOKE_RETRIES = int(CHOKE_TIMEOUT / CHOKE_RETRY_DELAY)
+REPORT_INTERVAL = 10.0
+DOWNLOAD_CONNECTIONS = 4
+SEGMENT_SIZE = 4 * 1024 * 1024
+MIN_SEGMENT_SIZE = 256 * 1024
+RANGE_BUFFER_SIZE = 256 * 1024
+MAX_RANGE_FAILURES = 20
+PROGRESS_INTERVAL = 0.1
+BLOCK_RUN_SIZE = 1024 * 1024
+BLOCK_CONNECTIONS = 4
+MAX_BLOCK_FAILURES = 3
+CATALOG_TIMEOUT = 5.0
+CHUNK_TIMEOUT = 30.0
+
+def peer_address(peer):
+    """Split a manifest peer entry ("ip" or "ip:port") into a socket address"""
+    host, _, port = peer.partition(":")
+    return host, int(port) if port else DEFAULT_PEER_PORT
+
+
+def open_connection(peer, bind_ip=None, timeout=None, sessions=None, priority=BULK):
+    """A connection to peer for one request: a new stream on the shared
+    session with that peer when there is a SessionPool and the peer supports
+    sessions, else a new TCP connection"""
+    if sessions is not None:
+        stream = sessions.open_stream(peer_address(peer), timeout, priority)
+        if stream is not None:
+            return stream
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if timeout:
+        s.settimeout(timeout)
+    if bind_ip:
+        s.bind((bind_ip, 0))
+    s.connect(peer_address(peer))
+    return s
+
+
+class ChunkDownloadWorker(threading.Thread):
+    def __init__(self, peer_ip, filename, chunk_index, chunk_hash, output_dir, signals, bind_ip=None, disk=None, sessions=None, max_size=0):
+        super().__init__()
+        self.daemon = True
+        self.max_size = max_size or MAX_CHUNK_SIZE
+        self.disk = disk or DiskIO()
+        self.sessions = sessions
+        self.peer_ip = peer_ip
+        self.filename = filename
+        self.chunk_index = chunk_index
+        self.chunk_hash = chunk_hash
+        self.output_dir = output_dir
+        self.signals = signals
+        self.bind_ip = bind_ip
+        self.error = None
+        self.separator = "<SEPARATOR>"
+        self.buffer_size = 4096
+        self.choked = False
+        self.unreachable = False
+        self.ok = False
+        self.nbytes = 0
+        self.wire_bytes = 0
+        self.started = 0.0
+        self.finished = 0.0
+        self.timings = {}
+        
+    def run(self):
+        self.started = time.time()
+        try:
+            self.fetch()
+        finally:
+            self.finished = time.time()
+    
+    def fetch(self):
+        try:
+            t = time.perf_counter()
+            try:
+                s = open_connection(self.peer_ip, self.bind_ip, CHUNK_TIMEOUT, self.sessions)
+            except OSError:
+                self.unreachable = True
+                raise
+            self.timings["connect"] = time.perf_counter() - t
+      
+            codecs = ",".join(compression.available_codecs())
+            s.send(f"GET_CHUNK{self.separator}{self.filename}{self.separator}{self.chunk_index}{self.separator}{codecs}".encode())
+            requested = time.perf_counter()
+          
+            response = s.recv(self.buffer_size).decode()
+            
+            if response == "CHOKED":
+                self.choked = True
+                s.close()
+                return False
+            
+            if response.startswith("ERROR"):
+                self.error = response.split(self.separator)[1]
+                s.close()
+                return False
+                
+            parts = response.split(self.separator)
+            chunk_size = int(parts[1])
+            codec = parts[2] if len(parts) > 2 else compression.RAW
+            
+            s.send("READY".encode())
+            
+            chunk_filename = f"{self.chunk_index}_{self.chunk_hash}"
+            chunk_path = os.path.join(self.output_dir, chunk_filename)
+            payload = bytearray()
+            first_byte = None
+            
+            while len(payload) < chunk_size:
+                bytes_read = s.recv(min(65536, chunk_size - len(payload)))
+                if not bytes_read:
+                    break
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                    self.timings["ttfb"] = first_byte - requested
+                payload += bytes_read
+                    
+            s.close()
+            t = time.perf_counter()
+            self.timings["transfer"] = t - (first_byte or t)
+            
+            data = compression.decompress(codec, bytes(payload), self.max_size)
+            calculated_hash = hashlib.md5(data).hexdigest()
+            self.timings["verify"] = time.perf_counter() - t
+                
+            if calculated_hash != self.chunk_hash:
+                return False
+            
+            t = time.perf_counter()
+            self.disk.write(chunk_path, data).wait()
+            self.timings["write"] = time.perf_counter() - t
+            
+            self.nbytes = len(data)
+            self.wire_bytes = len(payload)
+            self.ok = True
+            return True
+            
+        except Exception as e:
+            self.error = f"Chunk download error: {str(e)}"
+            return False
+
+
+class MetadataWorker(threading.Thread):
+    def __init__(self, peer_ip, filename, signals, metadata_dir="./metadata", sessions=None):
+        super().__init__()
+        self.daemon = True
+        self.sessions = sessions
+        self.peer_ip = peer_ip
+        self.filename = filename
+        self.signals = signals
+        self.metadata_dir = metadata_dir
+        self.separator = "<SEPARATOR>"
+        self.buffer_size = 4096
+        
+    def run(self):
+        try:
+            s = open_connection(self.peer_ip, sessions=self.sessions, priority=CONTROL)
+            
+            s.send(f"GET_METADATA{self.separator}{self.filename}".encode())
+            
+            response = s.recv(self.buffer_size).decode()
+            
+            if response.startswith("ERROR"):
+                self.signals.error.emit(response.split(self.separator)[1])
+                s.close()
+                return
+            
+            metadata_size = int(response)
+            s.send("READY".encode())
+            
+            # decode once at the end: a multi-byte character can be split
+            # across two reads
+            metadata_json = recv_exact(s, metadata_size)
+            s.close()
+     
+            metadata = json.loads(metadata_json.decode("utf-8"))
+            
+            metadata_dir = self.metadata_dir
+            if not os.path.exists(metadata_dir):
+                os.makedirs(metadata_dir)
+                
+            file_hash = self.get_file_hash(metadata['filename'])
+            metadata_path = os.path.join(metadata_dir, f"{file_hash}.json")
+            
+            with open(metadata_path, "w") as f:
+                json.dump(metadata, f)
+                
+            self.signals.metadata_received.emit(metadata['filename'])
+            
+        except Exception as e:
+            self.signals.error.emit(f"Metadata download error: {str(e)}")
+    
+    def get_file_hash(self, filename):
+        """Create a unique identifier for a file"""
+        return hashlib.md5(filename.encode()).hexdigest()
+
+
+class FileClientManager:
+    def __init__(self, server_ip="192.168.234.191", port=8000, base_dir=".", file_server=None, bind_ip=None):
+        self.SERVER_IP = server_ip
+        self.PORT = port
+        self.BUFFER_SIZE = 4096
+        self.SEPARATOR = "<SEPARATOR>"
+        
+        self.signals = ClientSignals()
+        self.download_worker = None
+        self.metadata_workers = []
+        self.chunk_workers = []
+        self.choked_peers = set()
+        self.unreachable_peers = set()
+        self.telemetry = Telemetry()
+        self.download_stats = None
+        self.upload_reports = {}
+        self.metadata_versions = {}
+        self.catalog = set()
+        self.catalog_epoch = ""
+        self.catalog_version = 0
+        
+        self.file_server = file_server
+        self.disk = file_server.disk if file_server else DiskIO()
+        self.stamps = file_server.stamps if file_server else StampCache(os.path.join(base_dir, "stamps.json"))
+        self.telemetry.disk = self.disk
+        self.telemetry.chunk_cache = file_server.chunk_cache if file_server else None
+        self.bind_ip = bind_ip
+        # one multiplexed connection per peer for every request we send it
+        self.sessions = SessionPool(bind_ip)
+        self.metadata_dir = os.path.join(base_dir, "metadata")
+        self.chunk_dir = os.path.join(base_dir, "chunks")
+        self.download_dir = os.path.join(base_dir, "downloaded_files")
+        self.telemetry_snapshot = os.path.join(base_dir, "telemetry.json")
+    
+    def get_file_list(self):
+        """Names in the server's catalog, kept in memory and brought up to
+        date with a delta, or an error string"""
+        try:
+            self.sync_catalog()
+            return sorted(self.catalog)
+        except Exception as e:
+            return f"Connection error: {str(e)}"
+    
+    def sync_catalog(self):
+        """Ask the server what changed since our catalog version and apply it.
+        Returns (added, removed); with nothing new this is one small round trip."""
+        s = open_connection(f"{self.SERVER_IP}:{self.PORT}", self.bind_ip, CATALOG_TIMEOUT, self.sessions, CONTROL)
+        try:
+            s.send(self.SEPARATOR.join(["LIST", self.catalog_epoch, str(self.catalog_version)]).encode())
+            response = s.recv(self.BUFFER_SIZE).decode()
+            fields = response.split(self.SEPARATOR)
+            
+            if fields[0] != "CATALOG":
+                # older server: the whole list in one reply
+                names = set() if response == "NO_FILES" else set(filter(None, fields))
+                added, removed = sorted(names - self.catalog), sorted(self.catalog - names)
+                self.catalog, self.catalog_epoch, self.catalog_version = names, "", 0
+                return added, removed
+            
+            _, epoch, version, kind, size = fields
+            changes = {"added": [], "removed": []}
+            if int(size):
+                s.send("READY".encode())
+                changes = json.loads(recv_exact(s, int(size)).decode("utf-8"))
+        finally:
+            s.close()
+        
+        if kind == "full":
+            names = set(changes["added"])
+            added, removed = sorted(names - self.catalog), sorted(self.catalog - names)
+            self.catalog = names
+        else:
+            added = [name for name in changes["added"] if name not in self.catalog]
+            removed = [name for name in changes["removed"] if name in self.catalog]
+            self.catalog.update(added)
+            self.catalog.difference_update(removed)
+        self.catalog_epoch, self.catalog_version = epoch, int(version)
+        return added, removed
+    
+    def download_file(self, filename, peers=None, connections=DOWNLOAD_CONNECTIONS):
+        """Fetch a whole shared file by byte ranges. Without explicit peers the
+        configured server is used, plus every peer listed in the manifest."""
+        if peers is None:
+            peers = [f"{self.SERVER_IP}:{self.PORT}"]
+            metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+            try:
+                with open(metadata_path, 'r') as f:
+                    peers += json.load(f).get('peers', [])
+            except (OSError, ValueError):
+                pass
+        
+        self.download_worker = DownloadWorker(
+            filename,
+            peers,
+            self.signals,
+            self.download_dir,
+            connections,
+            self.bind_ip,
+            self.disk,
+            self.sessions
+        )
+        self.download_worker.start()
+        return self.download_worker
+    
+    def download_chunk(self, peer_ip, filename, chunk_index, chunk_hash, output_dir, chunk_size=0):
+        worker = ChunkDownloadWorker(
+            peer_ip,
+            filename,
+            chunk_index,
+            chunk_hash,
+            output_dir,
+            self.signals,
+            self.bind_ip,
+            self.disk,
+            self.sessions,
+            chunk_size
+        )
+        self.chunk_workers.append(worker)
+        worker.start()
+        worker.join()
+        self.chunk_workers.remove(worker)
+        
+        if worker.unreachable:
+            self.unreachable_peers.add(peer_ip)
+            return False
+        self.unreachable_peers.discard(peer_ip)
+        if worker.choked:
+            self.choked_peers.add(peer_ip)
+        else:
+            self.choked_peers.discard(peer_ip)
+            self.telemetry.record(ChunkSample(
+                peer_ip, worker.nbytes, worker.wire_bytes,
+                worker.started, worker.finished, worker.ok, **worker.timings))
+        
+        chunk_filename = f"{chunk_index}_{chunk_hash}"
+        chunk_path = os.path.join(output_dir, chunk_filename)
+        
+        if os.path.exists(chunk_path):
+            self.stamps.record(chunk_path, chunk_hash)
+            self.update_peer_in_metadata(filename, peer_ip)
+            return True
+        return False
+    
+    def update_peer_in_metadata(self, filename, peer_ip):
+        file_hash = self.get_file_hash(filename)
+        metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
+        
+        if os.path.exists(metadata_path):
+            try:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+                
+                if 'peers' not in metadata:
+                    metadata['peers'] = []
+                
+                if peer_ip not in metadata['peers']:
+                    metadata['peers'].append(peer_ip)
+                
+                with open(metadata_path, 'w') as f:
+                    json.dump(metadata, f)
+            except Exception as e:
+                print(f"Error updating metadata: {e}")
+    
+    def report_upload(self, peer_ip, uploaded_bytes):
+        try:
+            s = open_connection(peer_ip, self.bind_ip, 5, self.sessions, CONTROL)
+            s.send(f"REPORT{self.SEPARATOR}{uploaded_bytes}".encode())
+            s.recv(self.BUFFER_SIZE)
+            s.close()
+            return True
+        except Exception:
+            return False
+    
+    def lookup_peers(self, filename):
+        """Peers the DHT knows are serving filename (empty without a DHT)"""
+        dht = self.file_server.dht if self.file_server else None
+        if dht is None:
+            return []
+        return [peer for peer in dht.get_peers(self.get_file_hash(filename)) if peer != self.own_address()]
+    
+    def tracker_peers(self, filename, event="", left=0):
+        """Ask the tracker for a random subset of the swarm, joining it when our
+        server is up. None means there is no tracker or it did not answer."""
+        server = self.file_server
+        if not server or not server.tracker_client:
+            return None
+        me = server.peer_address() if server.server_running else ""
+        peers = server.tracker_client.announce(self.get_file_hash(filename), me, event, left)
+        if peers is None:
+            return None
+        return [peer for peer in peers if peer != self.own_address()]
+    
+    def request_metadata(self, filename):
+        """Find peers for filename through the DHT and fetch the manifest from
+        the first one that has it; emits metadata_received when it is saved"""
+        threading.Thread(target=self.find_metadata, args=(filename,), daemon=True).start()
+    
+    def find_metadata(self, filename):
+        peers = list(dict.fromkeys((self.tracker_peers(filename) or []) + self.lookup_peers(filename)))
+        if not peers:
+            self.signals.error.emit(f"No peers found for {filename}")
+            return False
+        
+        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        random.shuffle(peers)
+        for peer in peers:
+            worker = MetadataWorker(peer, filename, ClientSignals(), self.metadata_dir, self.sessions)
+            worker.start()
+            worker.join()
+            if os.path.exists(metadata_path):
+                break
+        else:
+            self.signals.error.emit(f"None of {len(peers)} peers could send metadata for {filename}")
+            return False
+        
+        for peer in peers:
+            self.update_peer_in_metadata(filename, peer)
+        self.signals.metadata_received.emit(filename)
+        return True
+    
+    def fetch_metadata_batch(self, peer, filenames=None):
+        """Fetch many manifests from one peer in compressed round trips of up
+        to MAX_BATCH names and save them. Manifests already fetched from that
+        peer are only sent again if they changed since, and manifests already
+        stored here only gain the peer's peers. Returns the saved file names,
+        or None if the peer could not be asked."""
+        filenames = list(filenames or [])
+        groups = [filenames[i:i + MAX_BATCH] for i in range(0, len(filenames), MAX_BATCH)] or [[]]
+        saved = []
+        for group in groups:
+            response = self.request_manifests(peer, group)
+            if response is None:
+                return None
+            
+            if not os.path.exists(self.metadata_dir):
+                os.makedirs(self.metadata_dir)
+            for filename, entry in response["manifests"].items():
+                self.save_manifest(filename, entry["metadata"])
+                self.metadata_versions[(peer, filename)] = entry["version"]
+                saved.append(filename)
+                self.signals.metadata_received.emit(filename)
+        return saved
+    
+    def request_manifests(self, peer, filenames):
+        known = {filename: self.metadata_versions.get((peer, filename), 0) for filename in filenames}
+        body = json.dumps({"files": known}).encode("utf-8")
+        codecs = ",".join(compression.available_codecs())
+        try:
+            s = open_connection(peer, self.bind_ip, 30, self.sessions, CONTROL)
+            try:
+                s.send(f"GET_METADATA_BATCH{self.SEPARATOR}{codecs}{self.SEPARATOR}{len(body)}".encode())
+                reply = s.recv(self.BUFFER_SIZE)
+                if reply.startswith(b"ERROR"):
+                    raise ConnectionError(reply.decode().split(self.SEPARATOR)[-1])
+                if reply != b"READY":
+                    raise ConnectionError("peer does not support batched metadata")
+                s.sendall(body)
+                fields = s.recv(self.BUFFER_SIZE).decode().split(self.SEPARATOR)
+                if fields[0] != "METADATA_BATCH":
+                    raise ConnectionError(fields[-1])
+                s.send("READY".encode())
+                payload = recv_exact(s, int(fields[2]))
+            finally:
+                s.close()
+            return json.loads(compression.decompress(fields[1], bytes(payload)).decode("utf-8"))
+        except (OSError, ValueError, IndexError) as e:
+            self.signals.error.emit(f"Batched metadata download error: {str(e)}")
+            return None
+    
+    def save_manifest(self, filename, metadata):
+        """Store a manifest from a peer. One that is already here keeps its
+        own contents and only gains the peers it did not list yet."""
+        path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        try:
+            with open(path, "r") as f:
+                local = json.load(f)
+        except (OSError, ValueError):
+            local = None
+        if local is not None:
+            peers = local.setdefault('peers', [])
+            peers.extend(peer for peer in metadata.get('peers', []) if peer not in peers)
+            metadata = local
+        with open(path, "w") as f:
+            json.dump(metadata, f)
+    
+    def request_metadata_batch(self, peer, filenames=None):
+        threading.Thread(target=self.fetch_metadata_batch, args=(peer, filenames), daemon=True).start()
+    
+    def fetch_metadata(self, peer_ip, filename):
+        worker = MetadataWorker(
+            peer_ip,
+            filename,
+            self.signals,
+            self.metadata_dir,
+            self.sessions
+        )
+        self.metadata_workers.append(worker)
+        worker.start()
+    
+    def get_file_hash(self, filename):
+        """Create a unique identifier for a file"""
+        return hashlib.md5(filename.encode()).hexdigest()
+    
+    def own_address(self):
+        return self.file_server.peer_address() if self.file_server else None
+    
+    def open_stream(self, filename, window=STREAM_WINDOW):
+        """Start downloading filename in streaming order and return a file
+        object that can be read (and seeked) while chunks are still arriving"""
+        file_hash = self.get_file_hash(filename)
+        with open(os.path.join(self.metadata_dir, f"{file_hash}.json"), 'r') as f:
+            metadata = json.load(f)
+        if 'bundle' in metadata:
+            raise ValueError(f"{filename} is a folder bundle and cannot be streamed")
+        
+        picker = PiecePicker(metadata['chunks'], window)
+        reader = StreamReader(metadata, os.path.join(self.chunk_dir, file_hash), picker)
+        
+        def run():
+            if not self.download_from_peers(filename, picker):
+                picker.abort(f"Download of {filename} failed")
+        
+        threading.Thread(target=run, daemon=True).start()
+        return reader
+    
+    def download_from_peers(self, filename, picker=None):
+        """Fetch every chunk of filename and reassemble it. Chunks are fetched
+        in index order unless a PiecePicker (streaming mode) chooses the order."""
+        file_hash = self.get_file_hash(filename)
+        metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
+        
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            # the tracker knows who is in the swarm now; the manifest's list
+            # only ever grows and goes stale, so it is used when the tracker
+            # has nobody, or for a chunk none of the tracked peers could send
+            tracked = self.tracker_peers(filename, "started", metadata['filesize'])
+            owner = [metadata['owner']] if metadata.get('owner') else []
+            listed = metadata.get('peers', [])
+            known = tracked + owner if tracked else owner + listed
+            metadata['peers'] = list(dict.fromkeys(known + self.lookup_peers(filename)))
+            fallback = [peer for peer in listed if peer not in metadata['peers']]
+
+            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
+            if not os.path.exists(file_chunk_dir):
+                os.makedirs(file_chunk_dir)
+            
+            chunk_count = metadata['chunk_count']
+            total_downloaded = 0
+            active_peers = set()
+            download_start_time = time.time()
+            chunk_sizes = []
+            deferred = []
+            telemetry = self.telemetry
+            telemetry.reset_window()
+            
+            unpacker = None
+            if 'bundle' in metadata:
+                unpacker = BundleUnpacker(metadata, file_chunk_dir, os.path.join(self.download_dir, filename))
+            
+            for chunk_info in picker or metadata['chunks']:
+                chunk_index = chunk_info['index']
+                chunk_hash = chunk_info['hash']
+                chunk_filename = f"{chunk_index}_{chunk_hash}"
+                chunk_path = os.path.join(file_chunk_dir, chunk_filename)
+                
+                # chunks left by an earlier run are only rehashed if they changed since
+                if os.path.exists(chunk_path) and not self.stamps.verify_chunk(chunk_path, chunk_hash, self.disk.read):
+                    self.signals.log.emit(f"Stored chunk {chunk_index} of {filename} is corrupt, fetching it again")
+                    os.remove(chunk_path)
+                
+                if os.path.exists(chunk_path):
+                    if unpacker:
+                        unpacker.chunk_ready(chunk_index)
+                    if picker:
+                        picker.complete(chunk_index)
+                    total_downloaded += 1
+                    progress = int((total_downloaded / chunk_count) * 100)
+                    self.signals.progress_update.emit(progress)
+                    continue
+
+                peer = self.fetch_chunk_from_peers(metadata, chunk_index, chunk_hash, file_chunk_dir, chunk_info['size'])
+                if peer is None and fallback:
+                    metadata['peers'] += fallback
+                    fallback = []
+                    peer = self.fetch_chunk_from_peers(metadata, chunk_index, chunk_hash, file_chunk_dir, chunk_info['size'])
+                found_peer = peer is not None
+                
+                if found_peer:
+                    if self.file_server:
+                        # upload slots are kept per host, like the server sees it
+                        self.file_server.slot_manager.record_received(peer_address(peer)[0], chunk_info['size'])
+                    active_peers.add(peer)
+                    if unpacker:
+                        unpacker.chunk_ready(chunk_index)
+                    if picker:
+                        picker.complete(chunk_index)
+                    total_downloaded += 1
+                    chunk_sizes.append(chunk_info['size'])
+                    
+                    if self.download_stats:
+                        self.download_stats.record(telemetry.throughput() / 1024, telemetry.active_peers())
+                        
+                    progress = int((total_downloaded / chunk_count) * 100)
+                    self.signals.progress_update.emit(progress)
+
+                if not found_peer:
+                    if 'erasure' in metadata:
+                        deferred.append(chunk_index)
+                        continue
+                    self.signals.error.emit(f"Could not find a peer with chunk {chunk_index}")
+                    return None
+            
+            if deferred and not self.recover_from_repair_pieces(metadata, file_chunk_dir):
+                self.signals.error.emit(f"Could not recover {len(deferred)} missing chunks from repair pieces")
+                return None
+            if picker:
+                for chunk_index in deferred:
+                    picker.complete(chunk_index)
+            
+            if unpacker:
+                output_path = unpacker.finish()
+                self.signals.log.emit(f"Unpacked {len(unpacker.files)} files of {filename}")
+            else:
+                output_path = self.reassemble_file(metadata)
+            if output_path:
+                total_download_time = time.time() - download_start_time
+                total_size = sum(chunk_sizes) / 1024
+                if total_download_time > 0:
+                    avg_speed = total_size / total_download_time
+                    self.signals.log.emit(f"Download completed at avg speed: {avg_speed:.2f} KB/s with {len(active_peers)} peers")
+                
+                telemetry.write_snapshot(self.telemetry_snapshot)
+                self.stamps.save()
+                if self.file_server:
+                    self.file_server.announce(filename)
+                
+                self.signals.download_complete.emit(output_path)
+                return output_path
+            
+            self.signals.error.emit("Failed to reassemble file")
+                    
+        except Exception as e:
+            self.signals.error.emit(f"Download error: {str(e)}")
+        return None
+    
+    def fetch_chunk_from_peers(self, metadata, chunk_index, chunk_hash, file_chunk_dir, chunk_size=0):
+        peers = [peer for peer in metadata.get('peers', []) if peer != self.own_address()]
+        random.shuffle(peers)
+        
+        # big chunks are split into block runs fetched from several peers at
+        # once; whole-chunk requests remain the fallback (e.g. older peers)
+        if 'block_size' in metadata and chunk_size > BLOCK_RUN_SIZE and peers:
+            peer = self.fetch_blocks(peers, metadata, chunk_index, chunk_hash, chunk_size, file_chunk_dir)
+            if peer:
+                return peer
+        
+        for attempt in range(CHOKE_RETRIES):
+            for peer in list(peers):
+                if time.time() - self.upload_reports.get(peer, 0) > REPORT_INTERVAL:
+                    self.report_upload(peer, self.file_server.bytes_uploaded if self.file_server else 0)
+                    self.upload_reports[peer] = time.time()
+                
+                if self.download_chunk(peer, metadata['filename'], chunk_index, chunk_hash, file_chunk_dir, chunk_size):
+                    return peer
+                if peer in self.unreachable_peers:
+                    # not tried again for the rest of this download
+                    peers.remove(peer)
+                    if peer in metadata['peers']:
+                        metadata['peers'].remove(peer)
+            
+            if not any(peer in self.choked_peers for peer in peers):
+                break
+            time.sleep(CHOKE_RETRY_DELAY)
+        
+        return None
+    
+    def fetch_blocks(self, peers, metadata, chunk_index, chunk_hash, chunk_size, file_chunk_dir):
+        """Download one chunk as runs of fixed-size blocks spread over several
+        connections and peers. Fast connections simply take more runs, and
+        once the queue is empty idle connections re-request the runs still in
+        flight from other peers, so one slow peer cannot hold up the chunk.
+        The assembled chunk is checked against the manifest hash.
+        Returns the peer that sent the most bytes, or None."""
+        filename = metadata['filename']
+        block_size = metadata['block_size']
+        per_request = max(1, BLOCK_RUN_SIZE // block_size)
+        block_count = -(-chunk_size // block_size)
+        
+        runs = queue.Queue()
+        for first in range(0, block_count, per_request):
+            runs.put((first, min(per_request, block_count - first)))
+        state = {"remaining": runs.qsize(), "done": set(), "in_flight": {}, "sent": {}, "failures": {}}
+        lock = threading.Lock()
+        finished = threading.Event()
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        
+        def alive():
+            return [peer for peer in peers if state["failures"].get(peer, 0) < MAX_BLOCK_FAILURES]
+        
+        def next_run(peer):
+            try:
+                return runs.get_nowait(), False
+            except queue.Empty:
+                pass
+            # endgame: duplicate a run another peer is still working on
+            with lock:
+                for run, busy in state["in_flight"].items():
+                    if peer not in busy:
+                        busy.add(peer)
+                        return run, True
+            return None, False
+        
+        def connection_loop(n):
+            chokes = 0
+            while True:
+                candidates = alive()
+                with lock:
+                    if state["remaining"] <= 0:
+                        return
+                if not candidates or chokes > CHOKE_RETRIES:
+                    return
+                peer = candidates[n % len(candidates)]
+                
+                run, duplicate = next_run(peer)
+                if run is None:
+                    time.sleep(0.05)
+                    continue
+                first, count = run
+                with lock:
+                    if first in state["done"]:
+                        continue
+                    if not duplicate:
+                        state["in_flight"][run] = {peer}
+                
+                start = first * block_size
+                length = min(count * block_size, chunk_size - start)
+                scratch = bytearray(length)
+                done = self.fetch_block_run(peer, filename, chunk_index, block_size, first, count,
+                                            memoryview(scratch), finished)
+                
+                with lock:
+                    busy = state["in_flight"].get(run)
+                    if busy:
+                        busy.discard(peer)
+                    if done == length:
+                        if first not in state["done"]:
+                            state["done"].add(first)
+                            state["in_flight"].pop(run, None)
+                            view[start:start + length] = scratch
+                            state["remaining"] -= 1
+                            state["sent"][peer] = state["sent"].get(peer, 0) + done
+                            if state["remaining"] == 0:
+                                finished.set()
+                        continue
+                    if not duplicate and first not in state["done"]:
+                        # nobody else may be on it, so it goes back in the queue
+                        state["in_flight"].pop(run, None)
+                        runs.put(run)
+                    if done is not None and not finished.is_set():
+                        state["failures"][peer] = state["failures"].get(peer, 0) + 1
+                
+                if done is None:
+                    chokes += 1
+                    time.sleep(CHOKE_RETRY_DELAY)
+                n += 1
+        
+        threads = [threading.Thread(target=connection_loop, args=(i,), daemon=True)
+                   for i in range(min(BLOCK_CONNECTIONS, runs.qsize()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if state["remaining"] > 0 or hashlib.md5(buffer).hexdigest() != chunk_hash:
+            return None
+        
+        chunk_path = os.path.join(file_chunk_dir, f"{chunk_index}_{chunk_hash}")
+        self.disk.write(chunk_path, buffer).wait()
+        self.stamps.record(chunk_path, chunk_hash)
+        for peer in state["sent"]:
+            self.update_peer_in_metadata(filename, peer)
+        return max(state["sent"], key=state["sent"].get)
+    
+    def fetch_block_run(self, peer, filename, chunk_index, block_size, first, count, target, cancel=None):
+        """Receive `count` blocks starting at block `first` straight into the
+        target memoryview, giving up early once `cancel` is set.
+        Returns the bytes received, or None if choked. Verifying and writing
+        happen once per chunk, so runs only time connect, ttfb and transfer."""
+        started = time.time()
+        timings = {}
+        done = 0
+        try:
+            t = time.perf_counter()
+            s = open_connection(peer, self.bind_ip, 30, self.sessions)
+            timings["connect"] = time.perf_counter() - t
+        except OSError:
+            return 0
+        
+        try:
+            s.send(self.SEPARATOR.join(["GET_BLOCK", filename, str(chunk_index), str(block_size),
+                                        str(first), str(count)]).encode())
+            requested = time.perf_counter()
+            response = s.recv(1024).decode()
+            if response == "CHOKED":
+                self.choked_peers.add(peer)
+                return None
+            self.choked_peers.discard(peer)
+            fields = response.split(self.SEPARATOR)
+            if fields[0] != "BLOCK" or int(fields[1]) != len(target):
+                return 0
+            
+            s.send("READY".encode())
+            first_byte = None
+            while done < len(target) and not (cancel and cancel.is_set()):
+                n = s.recv_into(target[done:])
+                if not n:
+                    break
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                    timings["ttfb"] = first_byte - requested
+                done += n
+            if first_byte is not None:
+                timings["transfer"] = time.perf_counter() - first_byte
+        except (OSError, ValueError, IndexError):
+            pass
+        finally:
+            s.close()
+        
+        self.telemetry.record(ChunkSample(peer, done, done, started, time.time(), done == len(target), **timings))
+        return done
+    
+    def recover_from_repair_pieces(self, metadata, file_chunk_dir):
+        from . import erasure
+        
+        if erasure.reconstruct_chunks(metadata, file_chunk_dir) is not None:
+            return True
+        
+        for piece in metadata['erasure']['repair']:
+            piece_path = os.path.join(file_chunk_dir, erasure.repair_filename(piece['index'], piece['hash']))
+            if os.path.exists(piece_path):
+                continue
+            
+            for peer in metadata.get('peers', []):
+                if peer == self.own_address():
+                    continue
+                if self.download_chunk(peer, metadata['filename'], f"r{piece['index']}", piece['hash'], file_chunk_dir, piece.get('size', 0)):
+                    break
+            else:
+                continue
+            
+            missing = len(erasure.missing_chunks(metadata, file_chunk_dir))
+            if len(erasure.available_repair(metadata, file_chunk_dir)) < missing:
+                continue
+            
+            rebuilt = erasure.reconstruct_chunks(metadata, file_chunk_dir)
+            if rebuilt is not None:
+                self.signals.log.emit(f"Rebuilt {len(rebuilt)} chunks of {metadata['filename']} from repair pieces")
+                return True
+        
+        return False
+    
+    def reassemble_file(self, metadata):
+        try:
+            filename = metadata['filename']
+            file_hash = self.get_file_hash(filename)
+            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
+            
+            download_dir = self.download_dir
+            if not os.path.exists(download_dir):
+                os.makedirs(download_dir)
+            
+            output_path = os.path.join(download_dir, filename)
+            
+            if 'bundle' in metadata:
+                return BundleUnpacker(metadata, file_chunk_dir, output_path).finish()
+            
+            with open(output_path, 'wb') as outfile:
+                for i in range(metadata['chunk_count']):
+                    chunk_info = None
+                    for chunk in metadata['chunks']:
+                        if chunk['index'] == i:
+                            chunk_info = chunk
+                            break
+                    
+                    if not chunk_info:
+                        raise Exception(f"Missing chunk info for index {i}")
+                    
+                    chunk_filename = f"{i}_{chunk_info['hash']}"
+                    chunk_path = os.path.join(file_chunk_dir, chunk_filename)
+                    
+                    if not os.path.exists(chunk_path):
+                        raise Exception(f"Missing chunk file: {chunk_filename}")
+                    
+                    with open(chunk_path, 'rb') as infile:
+                        outfile.write(infile.read())
+            
+            return output_path
+        except Exception as e:
+            self.signals.log.emit(f"Reassembly error: {str(e)}")
+            return None
+    
+    def set_server(self, ip, port=None):
+        self.SERVER_IP = ip
+        if port:
+            self.PORT = port
+        self.catalog = set()
+        self.catalog_epoch = ""
+        self.catalog_version = 0
+
+
+class DownloadWorker(threading.Thread):
+    """Whole-file download split into byte ranges fetched over several
+    connections at once, from one host or from every peer sharing the file.
+    Ranges are written in place into a preallocated file and a failed range
+    is put back in the queue for another connection to finish."""
+
+    def __init__(self, filename, sources, signals, download_dir="./downloaded_files",
+                 connections=DOWNLOAD_CONNECTIONS, bind_ip=None, disk=None, sessions=None):
+        super().__init__()
+        self.daemon = True
+        self.disk = disk or DiskIO()
+        self.sessions = sessions
+        self.download_dir = download_dir
+        self.filename = filename
+        self.sources = list(dict.fromkeys(sources))
+        self.signals = signals
+        self.connections = connections
+        self.bind_ip = bind_ip
+        self.separator = "<SEPARATOR>"
+        
+        self.lock = threading.Lock()
+        self.segments = queue.Queue()
+        self.remaining = 0
+        self.received = 0
+        self.filesize = 0
+        self.dead_sources = set()
+        self.choked_since = {}
+        self.failures = 0
+        self.last_progress = -1
+        self.last_progress_time = 0
+        self.error = None
+        self.filepath = None
+        
+    def run(self):
+        try:
+            self.download()
+        except Exception as e:
+            self.error = str(e)
+        
+        if self.error:
+            self.signals.error.emit(self.error)
+        else:
+            self.signals.download_complete.emit(self.filepath)
+    
+    def download(self):
+        self.filesize = self.probe_size()
+        if self.filesize is None:
+            self.error = f"No peer is sharing {self.filename}"
+            return
+        
+        if not os.path.exists(self.download_dir):
+            os.makedirs(self.download_dir)
+        self.filepath = os.path.join(self.download_dir, os.path.basename(self.filename))
+        
+        segment_size = min(SEGMENT_SIZE, max(MIN_SEGMENT_SIZE, -(-self.filesize // (self.connections * 2))))
+        for offset in range(0, self.filesize, segment_size):
+            self.segments.put((offset, min(segment_size, self.filesize - offset)))
+        self.remaining = self.filesize
+        
+        with open(self.filepath, "wb") as f:
+            f.truncate(self.filesize)
+        threads = [threading.Thread(target=self.connection_loop, args=(i,), daemon=True)
+                   for i in range(min(self.connections, self.segments.qsize()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if self.remaining > 0 and not self.error:
+            self.error = f"Download of {self.filename} stopped with {self.remaining} bytes missing"
+        if not self.error:
+            self.report_progress(force=True)
+    
+    def probe_size(self):
+        for source in self.sources:
+            try:
+                s = open_connection(source, self.bind_ip, 10, self.sessions, CONTROL)
+                try:
+                    s.send(f"GET_RANGE{self.separator}{self.filename}{self.separator}0{self.separator}0".encode())
+                    response = s.recv(1024).decode().split(self.separator)
+                finally:
+                    s.close()
+                if response[0] == "RANGE":
+                    return int(response[1])
+            except (OSError, ValueError, IndexError):
+                pass
+            self.dead_sources.add(source)
+        return None
+    
+    def pick_source(self, n):
+        alive = [source for source in self.sources if source not in self.dead_sources]
+        return alive[n % len(alive)] if alive else None
+    
+    def connection_loop(self, n):
+        while not self.error:
+            with self.lock:
+                if self.remaining <= 0:
+                    return
+            try:
+                offset, length = self.segments.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            
+            source = self.pick_source(n)
+            if source is None:
+                self.error = f"All peers failed while downloading {self.filename}"
+                return
+            
+            done = self.fetch_range(source, offset, length)
+            if done is None:
+                self.segments.put((offset, length))
+                with self.lock:
+                    since = self.choked_since.setdefault(source, time.time())
+                    if time.time() - since > CHOKE_TIMEOUT:
+                        # never got a slot; let the other sources finish the file
+                        self.dead_sources.add(source)
+                n += 1
+                continue
+            with self.lock:
+                self.choked_since.pop(source, None)
+            if done < length:
+                self.segments.put((offset + done, length - done))
+                with self.lock:
+                    self.failures += 1
+                    if self.failures > MAX_RANGE_FAILURES:
+                        self.error = f"Too many failed ranges while downloading {self.filename}"
+                n += 1
+    
+    def fetch_range(self, source, offset, length):
+        """Stream one byte range into the file; returns how many bytes landed,
+        or None when the peer choked us and the range should just be retried.
+        Writes are queued on the disk pool while the socket keeps reading."""
+        done = 0
+        writes = []
+        try:
+            s = open_connection(source, self.bind_ip, 30, self.sessions)
+        except OSError:
+            self.dead_sources.add(source)
+            return 0
+        
+        try:
+            s.send(f"GET_RANGE{self.separator}{self.filename}{self.separator}{offset}{self.separator}{length}".encode())
+            response = s.recv(1024).decode()
+            if response == "CHOKED":
+                time.sleep(CHOKE_RETRY_DELAY)
+                return None
+            fields = response.split(self.separator)
+            if fields[0] != "RANGE" or int(fields[1]) != self.filesize or int(fields[2]) != length:
+                self.dead_sources.add(source)
+                return 0
+            
+            s.send("READY".encode())
+            while done < length:
+                buffer = bytearray(min(RANGE_BUFFER_SIZE, length - done))
+                view = memoryview(buffer)
+                filled = 0
+                while filled < len(buffer):
+                    n = s.recv_into(view[filled:])
+                    if not n:
+                        raise ConnectionError("connection closed mid-range")
+                    filled += n
+                writes.append(self.disk.write(self.filepath, buffer, offset + done))
+                done += filled
+                self.add_received(filled)
+        except (OSError, ValueError, IndexError):
+            # a partial write still counts, the rest of the range is retried
+            pass
+        finally:
+            s.close()
+        
+        for request in writes:
+            try:
+                request.wait()
+            except OSError as e:
+                self.error = f"Could not write {self.filepath}: {str(e)}"
+        return done
+    
+    def add_received(self, nbytes):
+        with self.lock:
+            self.received += nbytes
+            self.remaining -= nbytes
+        self.report_progress()
+    
+    def report_progress(self, force=False):
+        progress = int(self.received * 100 / self.filesize) if self.filesize else 100
+        now = time.time()
+        with self.lock:
+            if progress == self.last_progress:
+                return
+            if not force and now - self.last_progress_time < PROGRESS_INTERVAL:
+                return
+            self.last_progress = progress
+            self.last_progress_time = now
+        self.signals.progress_update.emit(progress)
@@ -0,0 +1,148 @@
+import zlib
+import threading
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+RAW = "raw"
+SAMPLE_SIZE = 4096
+SAMPLE_COUNT = 4
+MIN_SAVING = 0.1
+ENTRY_COST = 256
+
+
+def available_codecs():
+    """Codecs this peer can decode, most preferred first"""
+    codecs = []
+    if zstandard:
+        codecs.append("zstd")
+    if lz4:
+        codecs.append("lz4")
+    codecs.append("zlib")
+    return codecs
+
+
+def negotiate(offered):
+    offered = [c.strip() for c in offered.split(",")] if isinstance(offered, str) else offered
+    for codec in available_codecs():
+        if codec in offered:
+            return codec
+    return RAW
+
+
+def compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        return lz4.frame.compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def decompress(codec, data, max_length=None):
+    """Decode a payload. With max_length, decoding stops just past that many
+    bytes and a ValueError is raised, so a small payload cannot expand into
+    an arbitrarily large one."""
+    if max_length is None:
+        if codec == "zstd":
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == "lz4":
+            return lz4.frame.decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        return data
+
+    if codec == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(data)
+        parts = []
+        total = 0
+        while total <= max_length:
+            part = reader.read(max_length + 1 - total)
+            if not part:
+                break
+            parts.append(part)
+            total += len(part)
+        out = b"".join(parts)
+    elif codec == "lz4":
+        out = lz4.frame.LZ4FrameDecompressor().decompress(data, max_length=max_length + 1)
+    elif codec == "zlib":
+        out = zlib.decompressobj().decompress(data, max_length + 1)
+    else:
+        out = data
+    if len(out) > max_length:
+        raise ValueError(f"payload decompresses to more than {max_length} bytes")
+    return out
+
+
+def is_compressible(data):
+    """Cheap check on a few spread-out samples so PNGs, zips and videos are sent raw"""
+    if len(data) <= SAMPLE_SIZE * SAMPLE_COUNT:
+        samples = [data]
+    else:
+        step = (len(data) - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+        samples = [data[i * step:i * step + SAMPLE_SIZE] for i in range(SAMPLE_COUNT)]
+
+    raw_size = sum(len(s) for s in samples)
+    if raw_size == 0:
+        return False
+    packed_size = sum(len(zlib.compress(s, 1)) for s in samples)
+    return packed_size <= raw_size * (1 - MIN_SAVING)
+
+
+class CompressedChunkCache:
+    """LRU of encoded chunk payloads so hot chunks are compressed once per codec"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, codec, payload):
+        with self.lock:
+            if key in self.entries:
+                return
+            # every entry costs a little on top of its payload, so remembered
+            # "not worth compressing" results (empty payloads) are bounded too
+            self.entries[key] = (codec, payload)
+            self.size += len(payload) + ENTRY_COST
+            while self.size > self.max_bytes and self.entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted) + ENTRY_COST
+
+
+def encode_chunk(cache, key, data, offered):
+    """Return (codec, payload) for a chunk, falling back to raw when it does not pay off"""
+    codec = negotiate(offered) if offered else RAW
+    if codec == RAW:
+        return RAW, data
+
+    cached = cache.get(key + (codec,))
+    if cached is not None:
+        return cached if cached[0] != RAW else (RAW, data)
+
+    if is_compressible(data):
+        payload = compress(codec, data)
+        if len(payload) < len(data):
+            cache.put(key + (codec,), codec, payload)
+            return codec, payload
+
+    # remember the negative result with an empty payload so it is not retried
+    cache.put(key + (codec,), RAW, b"")
+    return RAW, data
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import random
+import socket
+import hashlib
+import threading
+
+K = 8
+ALPHA = 3
+ID_BITS = 128
+RPC_TIMEOUT = 1.0
+VALUE_TTL = 30 * 60
+REPUBLISH_INTERVAL = 10 * 60
+REFRESH_INTERVAL = 15 * 60
+MAINTENANCE_INTERVAL = 30
+MAX_VALUES = 50
+MAX_PACKET = 8192
+
+
+def node_id_for(address):
+    """IDs live in the same 128-bit md5 space as the manifest keys"""
+    return int(hashlib.md5(address.encode()).hexdigest(), 16)
+
+
+class Contact:
+    __slots__ = ("id", "host", "port")
+
+    def __init__(self, node_id, host, port):
+        self.id = node_id
+        self.host = host
+        self.port = port
+
+    def wire(self):
+        return [format(self.id, "032x"), self.host, self.port]
+
+    def __eq__(self, other):
+        return isinstance(other, Contact) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class RoutingTable:
+    """k-buckets by XOR distance. A full bucket keeps newcomers in a small
+    replacement cache; they are promoted when an old contact stops answering."""
+
+    def __init__(self, own_id, k=K):
+        self.own_id = own_id
+        self.k = k
+        self.buckets = [[] for _ in range(ID_BITS)]
+        self.replacements = [[] for _ in range(ID_BITS)]
+        self.lock = threading.Lock()
+
+    def bucket_index(self, node_id):
+        return (self.own_id ^ node_id).bit_length() - 1
+
+    def add(self, contact):
+        if contact.id == self.own_id:
+            return
+        i = self.bucket_index(contact.id)
+        with self.lock:
+            bucket = self.buckets[i]
+            if contact in bucket:
+                bucket.remove(contact)
+                bucket.append(contact)
+            elif len(bucket) < self.k:
+                bucket.append(contact)
+            else:
+                cache = self.replacements[i]
+                if contact in cache:
+                    cache.remove(contact)
+                cache.append(contact)
+                del cache[:-self.k]
+
+    def remove(self, contact):
+        i = self.bucket_index(contact.id)
+        with self.lock:
+            if contact in self.buckets[i]:
+                self.buckets[i].remove(contact)
+                if self.replacements[i]:
+                    self.buckets[i].append(self.replacements[i].pop())
+
+    def closest(self, target, count=K):
+        with self.lock:
+            contacts = [c for bucket in self.buckets for c in bucket]
+        contacts.sort(key=lambda c: c.id ^ target)
+        return contacts[:count]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+
+class DHTNode:
+    """Kademlia node over UDP mapping file hashes to the peers that serve them.
+
+    It binds the same host:port as the TCP file server, so a manifest peer
+    entry doubles as a DHT contact and stored values are plain peer
+    addresses ("ip" or "ip:port"). Messages are small JSON objects:
+    {"t": txid, "y": "q"|"r", "id": sender id, "q": name, "a": args}.
+    """
+
+    def __init__(self, host, port, address, signals=None):
+        self.host = host
+        self.port = port
+        self.address = address
+        self.id = node_id_for(address)
+        self.signals = signals
+        self.table = RoutingTable(self.id)
+        self.storage = {}
+        self.announced = {}
+        self.replicas = {}
+        self.bootstrap_peers = []
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.storage_lock = threading.Lock()
+        self.sock = None
+        self.running = False
+        self.last_refresh = 0
+
+    def log(self, message):
+        if self.signals:
+            self.signals.update_log.emit(message)
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        except OSError:
+            pass
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(1.0)
+        self.running = True
+        threading.Thread(target=self.receive_loop, daemon=True).start()
+        threading.Thread(target=self.maintenance_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+
+    def send(self, message, addr):
+        try:
+            self.sock.sendto(json.dumps(message).encode(), addr)
+        except OSError:
+            pass
+
+    def receive_loop(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(MAX_PACKET)
+                message = json.loads(data.decode())
+                sender = Contact(int(message["id"], 16), addr[0], addr[1])
+            except socket.timeout:
+                continue
+            except (OSError, ValueError, KeyError, TypeError):
+                if not self.running:
+                    break
+                continue
+
+            if sender.id == self.id:
+                continue
+            self.table.add(sender)
+
+            if message.get("y") == "r":
+                with self.pending_lock:
+                    waiter = self.pending.get(message.get("t"))
+                if waiter:
+                    waiter[1] = message
+                    waiter[0].set()
+            elif message.get("y") == "q":
+                reply = self.handle_query(sender, message.get("q"), message.get("a") or {})
+                if reply is not None:
+                    self.send({"t": message.get("t"), "y": "r", "id": format(self.id, "032x"), "r": reply}, addr)
+
+    def handle_query(self, sender, query, args):
+        if query == "ping":
+            return {}
+
+        if query == "find_node":
+            target = int(args["target"], 16)
+            return {"nodes": [c.wire() for c in self.table.closest(target)]}
+
+        if query == "find_value":
+            key = args["key"]
+            reply = {"nodes": [c.wire() for c in self.table.closest(int(key, 16))]}
+            values = self.local_values(key)
+            if values:
+                reply["values"] = random.sample(values, min(len(values), MAX_VALUES))
+            return reply
+
+        if query == "store":
+            value = args["value"]
+            # a node may only announce a server on its own host
+            if value.partition(":")[0] != sender.host:
+                return {"error": "value does not match sender"}
+            with self.storage_lock:
+                self.storage.setdefault(args["key"], {})[value] = time.time() + VALUE_TTL
+            return {}
+
+        return None
+
+    def rpc(self, contact, query, args=None, addr=None):
+        txid = os.urandom(4).hex()
+        waiter = [threading.Event(), None]
+        with self.pending_lock:
+            self.pending[txid] = waiter
+        self.send({"t": txid, "y": "q", "id": format(self.id, "032x"), "q": query, "a": args or {}},
+                  addr or (contact.host, contact.port))
+        waiter[0].wait(RPC_TIMEOUT)
+        with self.pending_lock:
+            self.pending.pop(txid, None)
+
+        if waiter[1] is None and contact:
+            self.table.remove(contact)
+        return (waiter[1] or {}).get("r")
+
+    def lookup(self, target, key=None):
+        """Iterative lookup: ask the ALPHA closest unqueried nodes in parallel
+        until the K closest known nodes have all answered. With key set this
+        is find_value and the peers stored under key are collected as well."""
+        seen = {c.id: c for c in self.table.closest(target)}
+        queried = set()
+        values = set()
+        lock = threading.Lock()
+
+        def ask(contact):
+            if key:
+                reply = self.rpc(contact, "find_value", {"key": key})
+            else:
+                reply = self.rpc(contact, "find_node", {"target": format(target, "032x")})
+            if not reply:
+                with lock:
+                    seen.pop(contact.id, None)
+                return
+            with lock:
+                values.update(reply.get("values", []))
+                for node_id, host, port in reply.get("nodes", []):
+                    node_id = int(node_id, 16)
+                    if node_id != self.id and node_id not in seen:
+                        seen[node_id] = Contact(node_id, host, port)
+
+        while True:
+            with lock:
+                nearest = sorted(seen.values(), key=lambda c: c.id ^ target)[:K]
+                batch = [c for c in nearest if c.id not in queried][:ALPHA]
+                queried.update(c.id for c in batch)
+            if not batch:
+                break
+            threads = [threading.Thread(target=ask, args=(c,), daemon=True) for c in batch]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        return sorted(seen.values(), key=lambda c: c.id ^ target)[:K], values
+
+    def bootstrap(self, peers=(), broadcast=True):
+        """Join through known peer entries and/or a LAN broadcast ping, then
+        look up our own ID to fill the buckets near us"""
+        self.bootstrap_peers = list(peers)
+        threads = []
+        for peer in peers:
+            host, _, port = peer.partition(":")
+            addr = (host, int(port) if port else self.port)
+            if addr != (self.host, self.port):
+                threads.append(threading.Thread(target=self.rpc, args=(None, "ping", None, addr), daemon=True))
+        for thread in threads:
+            thread.start()
+        if broadcast:
+            self.send({"t": "bcast", "y": "q", "id": format(self.id, "032x"), "q": "ping", "a": {}},
+                      ("<broadcast>", self.port))
+        for thread in threads:
+            thread.join()
+        if broadcast:
+            time.sleep(RPC_TIMEOUT / 2)
+
+        self.lookup(self.id)
+        self.last_refresh = time.time()
+        self.log(f"DHT joined with {len(self.table)} known nodes")
+
+    def local_values(self, key):
+        now = time.time()
+        with self.storage_lock:
+            entries = self.storage.get(key, {})
+            return [value for value, expires in entries.items() if expires > now]
+
+    def announce(self, key):
+        """Publish that this node serves key; repeated every REPUBLISH_INTERVAL"""
+        self.announced[key] = 0
+        threading.Thread(target=self.publish, args=(key,), daemon=True).start()
+
+    def withdraw(self, key):
+        self.announced.pop(key, None)
+
+    def publish(self, key):
+        self.announced[key] = time.time()
+        with self.storage_lock:
+            self.storage.setdefault(key, {})[self.address] = time.time() + VALUE_TTL
+        nodes, _ = self.lookup(int(key, 16))
+        stored = 0
+        for contact in nodes:
+            reply = self.rpc(contact, "store", {"key": key, "value": self.address})
+            # a refusal is an answer too, but it does not hold a copy
+            if reply is not None and "error" not in reply:
+                stored += 1
+        self.replicas[key] = stored
+
+    def get_peers(self, key):
+        _, values = self.lookup(int(key, 16), key)
+        values.update(self.local_values(key))
+        return list(values)
+
+    def maintenance_loop(self):
+        while self.running:
+            time.sleep(MAINTENANCE_INTERVAL)
+            if not self.running:
+                break
+            now = time.time()
+            with self.storage_lock:
+                for key in list(self.storage):
+                    entries = {v: e for v, e in self.storage[key].items() if e > now}
+                    if entries:
+                        self.storage[key] = entries
+                    else:
+                        del self.storage[key]
+
+            # a node that started alone keeps trying to join, and values that
+            # reached fewer than K nodes are pushed again once more are known
+            if not len(self.table):
+                self.bootstrap(self.bootstrap_peers)
+            for key, published in list(self.announced.items()):
+                if now - published > REPUBLISH_INTERVAL or self.replicas.get(key, 0) < min(K, len(self.table)):
+                    self.publish(key)
+
+            if now - self.last_refresh > REFRESH_INTERVAL and len(self.table):
+                self.lookup(random.getrandbits(ID_BITS))
+                self.last_refresh = now
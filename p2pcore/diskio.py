@@ -0,0 +1,244 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+READ_THREADS = 2
+MAX_PENDING_WRITES = 64 * 1024 * 1024
+MAX_QUEUED_READS = 64
+LATENCY_SAMPLES = 1024
+
+
+class DiskRequest:
+    __slots__ = ("path", "offset", "data", "length", "queued", "done", "result", "error")
+
+    def __init__(self, path, offset=None, data=None, length=None):
+        self.path = path
+        self.offset = offset
+        self.data = data
+        self.length = length
+        self.queued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Disk request for {self.path} timed out")
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class DiskIO:
+    """Disk reads and writes moved off the network threads.
+
+    Reads go to a small pool of threads through a bounded queue. Writes go
+    to a single writer thread, which takes everything queued so far, sorts it
+    by (path, offset) and writes it in that order. Callers get a
+    DiskRequest back and only wait on it when they need the data on disk.
+    write() blocks while more than max_pending bytes are waiting to be written, which
+    slows the sockets feeding it down to what the disk can take.
+
+    fsync is "none", "chunk" (after every whole-file write) or a number of
+    megabytes written to a file between syncs.
+
+    Every callable in on_write is called with the path of each finished
+    write, from the writer thread.
+    """
+
+    def __init__(self, read_threads=READ_THREADS, max_pending=MAX_PENDING_WRITES, fsync="none"):
+        self.read_threads = read_threads
+        self.max_pending = max_pending
+        self.set_fsync(fsync)
+        self.reads = queue.Queue(MAX_QUEUED_READS)
+        self.writes = []
+        self.pending_bytes = 0
+        self.cond = threading.Condition()
+        self.unsynced = {}
+        self.unsynced_files = {}
+        self.on_write = []
+        self.started = False
+        self.start_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.counters = {"reads": 0, "writes": 0, "read_bytes": 0, "written_bytes": 0,
+                         "fsyncs": 0, "batches": 0, "stalls": 0}
+        self.latencies = {"read": deque(maxlen=LATENCY_SAMPLES), "write": deque(maxlen=LATENCY_SAMPLES)}
+
+    def set_fsync(self, policy):
+        policy = str(policy or "none")
+        if policy not in ("none", "chunk") and not policy.isdigit():
+            raise ValueError(f"Unknown fsync policy: {policy}")
+        self.fsync = policy
+        self.fsync_bytes = int(policy) * 1024 * 1024 if policy.isdigit() else 0
+
+    def start(self):
+        with self.start_lock:
+            if self.started:
+                return
+            self.started = True
+        for _ in range(self.read_threads):
+            threading.Thread(target=self.read_loop, daemon=True).start()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def read(self, path, offset=0, length=None):
+        """Read length bytes (default: to the end) on the I/O pool and wait for them"""
+        self.start()
+        request = DiskRequest(path, offset, length=length)
+        self.reads.put(request)
+        return request.wait()
+
+    def write(self, path, data, offset=None):
+        """Queue a write and return its DiskRequest. With offset None the file
+        is replaced by data in one rename, otherwise data goes at offset of an existing file."""
+        self.start()
+        request = DiskRequest(path, offset, data)
+        with self.cond:
+            if self.pending_bytes and self.pending_bytes + len(data) > self.max_pending:
+                with self.stats_lock:
+                    self.counters["stalls"] += 1
+                while self.pending_bytes and self.pending_bytes + len(data) > self.max_pending:
+                    self.cond.wait()
+            self.pending_bytes += len(data)
+            self.writes.append(request)
+            self.cond.notify_all()
+        return request
+
+    def flush(self):
+        """Wait until every write queued so far has reached the disk"""
+        with self.cond:
+            while self.pending_bytes:
+                self.cond.wait()
+
+    def read_loop(self):
+        while True:
+            request = self.reads.get()
+            try:
+                with open(request.path, "rb") as f:
+                    if request.offset:
+                        f.seek(request.offset)
+                    request.result = f.read() if request.length is None else f.read(request.length)
+            except Exception as e:
+                request.error = e
+            self.finish(request, "read", len(request.result or b""))
+
+    def write_loop(self):
+        while True:
+            with self.cond:
+                while not self.writes:
+                    self.cond.wait()
+                batch, self.writes = self.writes, []
+
+            batch.sort(key=lambda r: (r.path, -1 if r.offset is None else r.offset))
+            with self.stats_lock:
+                self.counters["batches"] += 1
+            handle = None
+            for request in batch:
+                nbytes = len(request.data)
+                try:
+                    if request.offset is None:
+                        self.replace(request.path, request.data)
+                    else:
+                        if handle is None or handle.name != request.path:
+                            # a failed open must not leave the closed handle behind
+                            previous, handle = handle, None
+                            self.close_handle(previous)
+                            # unbuffered: a finished request is already in the file
+                            handle = open(request.path, "r+b", buffering=0)
+                        handle.seek(request.offset)
+                        handle.write(request.data)
+                        if self.count_unsynced(handle.name, nbytes):
+                            self.sync(handle)
+                except Exception as e:
+                    # only this request fails; the writer thread carries on
+                    request.error = e
+                for callback in self.on_write:
+                    callback(request.path)
+                self.finish(request, "write", nbytes)
+                with self.cond:
+                    self.pending_bytes -= nbytes
+                    self.cond.notify_all()
+            try:
+                self.close_handle(handle)
+            except (OSError, ValueError):
+                pass
+
+    def replace(self, path, data):
+        # written next to the target and renamed over it, so a chunk is never
+        # seen half-written, not even after a crash
+        directory, name = os.path.split(path)
+        temp_path = os.path.join(directory, f".{name}.tmp")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+                # with "every N MB", whole files count towards N per directory
+                # and the ones written since the last sync are synced together
+                due = self.count_unsynced(directory, len(data))
+                if self.fsync == "chunk" or due:
+                    self.sync(f)
+            os.replace(temp_path, path)
+            if due:
+                for earlier in self.unsynced_files.pop(directory, []):
+                    self.sync_path(earlier)
+            elif self.fsync_bytes:
+                self.unsynced_files.setdefault(directory, []).append(path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def close_handle(self, handle):
+        if handle:
+            if self.fsync == "chunk":
+                self.sync(handle)
+            handle.close()
+
+    def count_unsynced(self, key, nbytes):
+        """Add nbytes written under key (a file or a directory); True once
+        fsync_bytes have piled up and it is time to sync"""
+        if not self.fsync_bytes:
+            return False
+        self.unsynced[key] = self.unsynced.get(key, 0) + nbytes
+        if self.unsynced[key] < self.fsync_bytes:
+            return False
+        self.unsynced[key] = 0
+        return True
+
+    def sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+        with self.stats_lock:
+            self.counters["fsyncs"] += 1
+
+    def sync_path(self, path):
+        try:
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+        except OSError:
+            return
+        with self.stats_lock:
+            self.counters["fsyncs"] += 1
+
+    def finish(self, request, kind, nbytes):
+        with self.stats_lock:
+            self.counters[kind + "s"] += 1
+            self.counters[kind + "_bytes" if kind == "read" else "written_bytes"] += nbytes
+            self.latencies[kind].append(time.perf_counter() - request.queued)
+        request.data = None
+        request.done.set()
+
+    def stats(self):
+        with self.stats_lock:
+            stats = dict(self.counters)
+            latencies = {kind: sorted(values) for kind, values in self.latencies.items()}
+        with self.cond:
+            stats["queued_writes"] = len(self.writes)
+            stats["pending_write_bytes"] = self.pending_bytes
+        stats["queued_reads"] = self.reads.qsize()
+        for kind, values in latencies.items():
+            for p in (0.5, 0.99):
+                stats[f"{kind}_latency_p{int(p * 100)}"] = values[min(len(values) - 1, int(p * len(values)))] if values else None
+        return stats
@@ -0,0 +1,219 @@
+import os
+import math
+import random
+import hashlib
+import numpy as np
+
+from . import fec
+
+SCHEME = "rlc-gf256"
+REPAIR_OVERHEAD = 0.1
+MAX_REPAIR_PIECES = 64
+# average number of repair pieces each source chunk goes into at random
+REPAIR_DEGREE = 4
+# pieces every source chunk is guaranteed to go into, on top of that
+REPAIR_COVERAGE = 2
+STRIPE_SIZE = 1024 * 1024
+
+
+def repair_count_for(chunk_count, overhead=REPAIR_OVERHEAD):
+    return min(MAX_REPAIR_PIECES, max(1, math.ceil(chunk_count * overhead)))
+
+
+def density_for(repair_count):
+    return min(1.0, REPAIR_DEGREE / repair_count)
+
+
+def repair_filename(piece_index, piece_hash):
+    return f"r{piece_index}_{piece_hash}"
+
+
+def next_coefficient(rng, density):
+    """Next source chunk's coefficient in a piece: 0 (left out) or 1-255.
+    Manifests without a density are dense, as they were first written."""
+    if density is not None and density < 1.0 and rng.random() >= density:
+        return 0
+    return rng.randint(1, 255)
+
+
+def covers(chunk_index, piece_index, coverage, period):
+    """True if the piece always holds the chunk: piece i takes chunks i,
+    i + period, ... and the next coverage - 1 residues after them, so with
+    period pieces each chunk is in `coverage` different ones"""
+    return bool(coverage) and (chunk_index - piece_index) % period < coverage
+
+
+def coefficient_for(rng, density, chunk_index, piece_index, coverage, period):
+    c = next_coefficient(rng, density)
+    if not c and covers(chunk_index, piece_index, coverage, period):
+        c = rng.randint(1, 255)
+    return c
+
+
+def repair_row(seed, k, density=None, piece_index=0, coverage=0, period=1):
+    rng = random.Random(seed)
+    return [coefficient_for(rng, density, j, piece_index, coverage, period) for j in range(k)]
+
+
+def stripes(size):
+    return range(0, size, STRIPE_SIZE)
+
+
+class RepairEncoder:
+    """Builds rateless repair pieces while the file is being chunked.
+
+    Every repair piece is a random GF(256) combination of source chunks
+    (zero padded to symbol_size), with coefficients drawn from its seed.
+    Each chunk goes into a piece with probability `density`, so it is
+    added to about REPAIR_DEGREE pieces and encoding costs a few passes
+    over the file however many chunks it has. On top of that the chunks are
+    dealt round-robin so each is in at least REPAIR_COVERAGE pieces (all of
+    them when there are fewer); a chunk in no piece could never be rebuilt.
+    Enough linearly independent
+    pieces, source or repair, rebuild the missing chunks, and more pieces
+    can be minted later by picking new seeds.
+
+    The pieces are built in place in memory-mapped files in chunk_dir, so
+    RAM use does not grow with their number or size.
+    """
+
+    def __init__(self, count, symbol_size, chunk_dir, first_seed=None):
+        self.symbol_size = symbol_size
+        self.chunk_dir = chunk_dir
+        self.density = density_for(count)
+        self.coverage = min(REPAIR_COVERAGE, count)
+        self.added = 0
+        first_seed = random.getrandbits(31) if first_seed is None else first_seed
+        self.seeds = [first_seed + i for i in range(count)]
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+        self.paths = [os.path.join(chunk_dir, f".r{index}.tmp") for index in range(count)]
+        self.pieces = [np.memmap(path, dtype=np.uint8, mode="w+", shape=(symbol_size,)) for path in self.paths]
+        self.scratch = np.empty(STRIPE_SIZE, dtype=np.uint8)
+
+    def add(self, chunk_data):
+        block = np.frombuffer(chunk_data, dtype=np.uint8)
+        chunk_index = self.added
+        self.added += 1
+        for piece_index, (rng, piece) in enumerate(zip(self.rngs, self.pieces)):
+            c = coefficient_for(rng, self.density, chunk_index, piece_index, self.coverage, len(self.pieces))
+            if not c:
+                continue
+            for offset in stripes(len(block)):
+                source = block[offset:offset + STRIPE_SIZE]
+                target = piece[offset:offset + len(source)]
+                scratch = self.scratch[:len(source)]
+                np.take(fec.MUL[c], source, out=scratch)
+                np.bitwise_xor(target, scratch, out=target)
+
+    def write(self):
+        repair = []
+        for index, (seed, piece, path) in enumerate(zip(self.seeds, self.pieces, self.paths)):
+            piece.flush()
+            piece_hash = hashlib.md5(piece).hexdigest()
+            os.replace(path, os.path.join(self.chunk_dir, repair_filename(index, piece_hash)))
+            repair.append({"index": index, "seed": seed, "hash": piece_hash, "size": self.symbol_size})
+        self.pieces = []
+
+        return {
+            "scheme": SCHEME,
+            "symbol_size": self.symbol_size,
+            "density": self.density,
+            "coverage": self.coverage,
+            "period": len(self.seeds),
+            "repair": repair
+        }
+
+
+def missing_chunks(metadata, chunk_dir):
+    return [c for c in metadata['chunks']
+            if not os.path.exists(os.path.join(chunk_dir, f"{c['index']}_{c['hash']}"))]
+
+
+def available_repair(metadata, chunk_dir):
+    return [r for r in metadata.get('erasure', {}).get('repair', [])
+            if os.path.exists(os.path.join(chunk_dir, repair_filename(r['index'], r['hash'])))]
+
+
+def read_stripe(path, offset, size):
+    """size bytes of a file from offset, zero padded past its end"""
+    block = np.zeros(size, dtype=np.uint8)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    block[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    return block
+
+
+def reconstruct_chunks(metadata, chunk_dir):
+    """Rebuild missing source chunks from repair pieces on disk.
+
+    The work is done one stripe of STRIPE_SIZE bytes at a time: only that
+    stripe of each repair piece, of each source chunk they combine and of
+    each rebuilt chunk is in memory at once.
+
+    Returns the list of rebuilt chunk indices, or None when there are not
+    enough independent pieces yet.
+    """
+    erasure = metadata.get('erasure')
+    if not erasure or erasure.get('scheme') != SCHEME:
+        return None
+
+    missing = missing_chunks(metadata, chunk_dir)
+    if not missing:
+        return []
+
+    symbol_size = erasure['symbol_size']
+    k = metadata['chunk_count']
+    repairs = available_repair(metadata, chunk_dir)
+    if len(repairs) < len(missing):
+        return None
+
+    rows = [repair_row(piece['seed'], k, erasure.get('density'), piece['index'],
+                       erasure.get('coverage', 0), erasure.get('period', 1)) for piece in repairs]
+    picked, inverse = fec.select_independent([[row[c['index']] for c in missing] for row in rows], len(missing))
+    if picked is None:
+        return None
+
+    missing_indices = set(c['index'] for c in missing)
+    sources = {}
+    for chunk in metadata['chunks']:
+        if chunk['index'] not in missing_indices and any(rows[p][chunk['index']] for p in picked):
+            sources[chunk['index']] = os.path.join(chunk_dir, f"{chunk['index']}_{chunk['hash']}")
+    piece_paths = [os.path.join(chunk_dir, repair_filename(repairs[p]['index'], repairs[p]['hash'])) for p in picked]
+    out_paths = [os.path.join(chunk_dir, f".{chunk['index']}_{chunk['hash']}.tmp") for chunk in missing]
+    hashes = [hashlib.md5() for _ in missing]
+
+    try:
+        outputs = [open(path, "wb") for path in out_paths]
+        try:
+            for offset in stripes(symbol_size):
+                size = min(STRIPE_SIZE, symbol_size - offset)
+                # take the known chunks out of each picked piece, leaving
+                # combinations of the missing ones only
+                reduced = [read_stripe(path, offset, size) for path in piece_paths]
+                scratch = np.empty(size, dtype=np.uint8)
+                for index, path in sources.items():
+                    block = read_stripe(path, offset, size)
+                    for p, out in zip(picked, reduced):
+                        c = rows[p][index]
+                        if c:
+                            np.take(fec.MUL[c], block, out=scratch)
+                            np.bitwise_xor(out, scratch, out=out)
+
+                for chunk, coeffs, f, md5 in zip(missing, inverse, outputs, hashes):
+                    data = fec.combine(coeffs, reduced)[:max(0, min(size, chunk['size'] - offset))].tobytes()
+                    f.write(data)
+                    md5.update(data)
+        finally:
+            for f in outputs:
+                f.close()
+
+        if any(md5.hexdigest() != chunk['hash'] for chunk, md5 in zip(missing, hashes)):
+            return None
+        for chunk, path in zip(missing, out_paths):
+            os.replace(path, os.path.join(chunk_dir, f"{chunk['index']}_{chunk['hash']}"))
+    finally:
+        for path in out_paths:
+            if os.path.exists(path):
+                os.remove(path)
+    return [chunk['index'] for chunk in missing]
@@ -0,0 +1,51 @@
+import threading
+
+
+class Signal:
+    """Minimal stand-in for a bound pyqtSignal: connect() callbacks, emit() calls them.
+
+    Callbacks run synchronously on the emitting thread. The GUI swaps these
+    objects for real Qt signals so its slots are queued onto the GUI thread.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def connect(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def disconnect(self, callback=None):
+        with self.lock:
+            if callback is None:
+                self.callbacks = []
+            elif callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def emit(self, *args):
+        with self.lock:
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback(*args)
+
+
+class ServerSignals:
+    def __init__(self):
+        self.update_log = Signal()
+
+
+class ClientSignals:
+    def __init__(self):
+        self.progress_update = Signal()
+        self.download_complete = Signal()
+        self.error = Signal()
+        self.metadata_received = Signal()
+        self.log = Signal()
+
+
+class MulticastSignals:
+    def __init__(self):
+        self.update_log = Signal()
+        self.progress_update = Signal()
+        self.transfer_complete = Signal()
@@ -0,0 +1,142 @@
+import random
+import numpy as np
+
+GF_POLY = 0x11d
+
+
+def _build_tables():
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= GF_POLY
+    exp[255:510] = exp[:255]
+
+    logs = log[np.arange(256)]
+    mul = exp[(logs[:, None] + logs[None, :]) % 255]
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+
+EXP, LOG, MUL = _build_tables()
+
+
+def gf_mul(a, b):
+    return int(MUL[a, b])
+
+
+def gf_inv(a):
+    if a == 0:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return int(EXP[255 - LOG[a]])
+
+
+def cauchy_row(repair_index, k):
+    """Coefficients of a systematic Cauchy Reed-Solomon repair symbol"""
+    x = k + repair_index
+    if x > 255:
+        raise ValueError("k + repair count must not exceed 256")
+    return [gf_inv(x ^ j) for j in range(k)]
+
+
+def random_row(seed, k):
+    """Coefficients of a rateless random linear repair piece"""
+    rng = random.Random(seed)
+    return [rng.randint(1, 255) for _ in range(k)]
+
+
+def combine(coeffs, blocks):
+    """XOR-sum of c * block over GF(256), one table lookup per byte"""
+    out = np.zeros(len(blocks[0]), dtype=np.uint8)
+    scratch = np.empty_like(out)
+    for c, block in zip(coeffs, blocks):
+        if c == 0:
+            continue
+        if c == 1:
+            np.bitwise_xor(out, block, out=out)
+        else:
+            np.take(MUL[c], block, out=scratch)
+            np.bitwise_xor(out, scratch, out=out)
+    return out
+
+
+def encode(blocks, rows):
+    blocks = [np.frombuffer(b, dtype=np.uint8) if not isinstance(b, np.ndarray) else b for b in blocks]
+    return [combine(row, blocks) for row in rows]
+
+
+def select_independent(rows, width):
+    """Pick `width` linearly independent rows and return (picked, inverse)"""
+    picked = []
+    basis = []
+    for row_index, row in enumerate(rows):
+        reduced = list(row)
+        for pivot, basis_row in basis:
+            f = reduced[pivot]
+            if f:
+                reduced = [r ^ gf_mul(f, b) for r, b in zip(reduced, basis_row)]
+        pivot = next((i for i, v in enumerate(reduced) if v), None)
+        if pivot is None:
+            continue
+        inv = gf_inv(reduced[pivot])
+        reduced = [gf_mul(inv, v) for v in reduced]
+        basis.append((pivot, reduced))
+        picked.append(row_index)
+        if len(picked) == width:
+            return picked, _invert([rows[i] for i in picked])
+    return None, None
+
+
+def _invert(matrix):
+    n = len(matrix)
+    aug = [list(row) + [1 if i == j else 0 for j in range(n)] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = next(r for r in range(col, n) if aug[r][col])
+        aug[col], aug[pivot] = aug[pivot], aug[col]
+        inv = gf_inv(aug[col][col])
+        aug[col] = [gf_mul(inv, v) for v in aug[col]]
+        for r in range(n):
+            f = aug[r][col]
+            if r != col and f:
+                aug[r] = [a ^ gf_mul(f, b) for a, b in zip(aug[r], aug[col])]
+    return [row[n:] for row in aug]
+
+
+def decode(k, sources, repairs):
+    """Rebuild k source blocks.
+
+    sources maps source index -> block, repairs is a list of
+    (coefficient row, block). Only the missing sources are computed, so the
+    cost grows with the number of losses rather than with k.
+    Returns the list of k blocks, or None if there is not enough data.
+    """
+    missing = [i for i in range(k) if i not in sources]
+    blocks = {i: np.frombuffer(b, dtype=np.uint8) if not isinstance(b, np.ndarray) else b
+              for i, b in sources.items()}
+    if not missing:
+        return [blocks[i] for i in range(k)]
+    if len(repairs) < len(missing):
+        return None
+
+    sub_rows = [[row[i] for i in missing] for row, _ in repairs]
+    picked, inverse = select_independent(sub_rows, len(missing))
+    if picked is None:
+        return None
+
+    known = sorted(blocks)
+    reduced = []
+    for index in picked:
+        row, data = repairs[index]
+        data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+        if known:
+            data = data ^ combine([row[i] for i in known], [blocks[i] for i in known])
+        reduced.append(data)
+
+    for out_index, coeffs in zip(missing, inverse):
+        blocks[out_index] = combine(coeffs, reduced)
+    return [blocks[i] for i in range(k)]
@@ -0,0 +1,124 @@
+import os
+import re
+import bisect
+import threading
+from collections import deque
+
+SEGMENT_LINES = 4096
+MAX_SEGMENTS = 256
+RECENT_LINES = 1000
+
+
+class HistoryLog:
+    """Append-only text history split into segment files of SEGMENT_LINES
+    lines, named <name>-<number of the first line>.log.
+
+    Every line ever appended has a number; read() returns any retained range
+    of them. The last `recent` lines are also kept in memory, older ones are
+    read back from their segment only when asked for. Once more than
+    max_segments segments exist the oldest is deleted, so the disk use is
+    bounded too and `first` moves up.
+    """
+
+    def __init__(self, directory, name, segment_lines=SEGMENT_LINES, max_segments=MAX_SEGMENTS, recent=RECENT_LINES):
+        self.directory = directory
+        self.name = name
+        self.segment_lines = segment_lines
+        self.max_segments = max_segments
+        self.recent = deque(maxlen=recent)
+        self.lock = threading.Lock()
+        self.cached = (None, [])
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        pattern = re.compile(rf"{re.escape(name)}-(\d+)\.log$")
+        self.segments = sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(directory)) if m)
+        self.first = self.segments[0] if self.segments else 0
+        self.count = self.first
+        self.handle = None
+        if self.segments:
+            lines = self.load_segment(self.segments[-1])
+            self.count = self.segments[-1] + len(lines)
+            start = max(self.first, self.count - recent)
+            self.recent.extend(self.read_segments(start, self.count))
+        self.open_segment()
+
+    def segment_path(self, first_line):
+        return os.path.join(self.directory, f"{self.name}-{first_line:012d}.log")
+
+    def load_segment(self, first_line):
+        with open(self.segment_path(first_line), "r", encoding="utf-8", errors="replace") as f:
+            return f.read().split("\n")[:-1]
+
+    def open_segment(self):
+        if self.handle:
+            self.handle.close()
+        if not self.segments or self.count - self.segments[-1] >= self.segment_lines:
+            self.segments.append(self.count)
+            while len(self.segments) > self.max_segments:
+                try:
+                    os.remove(self.segment_path(self.segments.pop(0)))
+                except OSError:
+                    pass
+                self.first = self.segments[0]
+        path = self.segment_path(self.segments[-1])
+        # a line cut short by a crash is ended so the next one starts cleanly
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+            if torn:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n")
+        self.handle = open(path, "a", encoding="utf-8")
+
+    def append(self, text):
+        """Store text, one history line per line of text. Safe from any thread."""
+        with self.lock:
+            if self.handle is None:
+                self.open_segment()
+            for line in text.splitlines() or [""]:
+                self.handle.write(line + "\n")
+                self.recent.append(line)
+                self.count += 1
+                if self.count - self.segments[-1] >= self.segment_lines:
+                    self.open_segment()
+            self.handle.flush()
+            return self.count
+
+    def read(self, start, end):
+        """Lines numbered start to end - 1, clipped to what is retained"""
+        with self.lock:
+            start, end = max(start, self.first), min(end, self.count)
+            if start >= end:
+                return []
+            in_memory = self.count - len(self.recent)
+            if start >= in_memory:
+                return list(self.recent)[start - in_memory:end - in_memory]
+            return self.read_segments(start, end)
+
+    def read_segments(self, start, end):
+        lines = []
+        position = bisect.bisect_right(self.segments, start) - 1
+        while start < end and position < len(self.segments):
+            first_line = self.segments[position]
+            if self.cached[0] != first_line:
+                try:
+                    segment = self.load_segment(first_line)
+                except OSError:
+                    segment = []
+                # the segment being written to still grows, so only full ones are kept
+                if position < len(self.segments) - 1:
+                    self.cached = (first_line, segment)
+            else:
+                segment = self.cached[1]
+            lines += segment[start - first_line:end - first_line]
+            start = first_line + len(segment)
+            position += 1
+        return lines
+
+    def close(self):
+        with self.lock:
+            if self.handle:
+                self.handle.close()
+                self.handle = None
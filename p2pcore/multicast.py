@@ -0,0 +1,244 @@
+import socket
+import struct
+import threading
+import os
+import json
+import hashlib
+import time
+
+from .events import MulticastSignals
+
+PACKET_DATA = 0
+PACKET_END = 1
+
+# magic, type, file id, chunk index, group, symbol, k, r, symbol size, chunk size
+HEADER = struct.Struct("!4sB16sIHHHHHI")
+MAGIC = b"P2PM"
+
+
+class MulticastManager:
+    def __init__(self, base_dir="."):
+        self.GROUP = "239.255.42.99"
+        self.PORT = 5007
+        self.INTERFACE = "0.0.0.0"
+        self.TTL = 1
+        self.SYMBOL_SIZE = 1200
+        self.GROUP_SYMBOLS = 32
+        self.REPAIR_SYMBOLS = 4
+        self.SEND_RATE = 8 * 1024 * 1024
+        self.START_DELAY = 2.0
+        self.IDLE_TIMEOUT = 5.0
+
+        self.signals = MulticastSignals()
+        self.chunk_dir = os.path.join(base_dir, "chunks")
+        self.metadata_dir = os.path.join(base_dir, "metadata")
+        self.sending = False
+
+    def get_file_hash(self, filename):
+        return hashlib.md5(filename.encode()).hexdigest()
+
+    def load_metadata(self, filename):
+        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        with open(metadata_path, "r") as f:
+            return json.load(f)
+
+    def set_group(self, group, port=None, interface=None):
+        self.GROUP = group
+        if port:
+            self.PORT = port
+        if interface:
+            self.INTERFACE = interface
+
+    def send_file(self, filename):
+        if self.sending:
+            self.signals.update_log.emit("A multicast transfer is already running")
+            return
+        self.sending = True
+        thread = threading.Thread(target=self.run_sender, args=(filename,))
+        thread.daemon = True
+        thread.start()
+
+    def receive_file(self, filename, peers, file_client):
+        thread = threading.Thread(target=self.run_receiver, args=(filename, peers, file_client))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def build_packets(self, file_id, chunk_index, data):
+        """Split a chunk into FEC groups and yield source and repair packets"""
+        from . import fec
+
+        size = self.SYMBOL_SIZE
+        symbols = [data[i:i + size].ljust(size, b"\0") for i in range(0, len(data), size)] or [b"\0" * size]
+        repair = self.REPAIR_SYMBOLS
+
+        for group, start in enumerate(range(0, len(symbols), self.GROUP_SYMBOLS)):
+            sources = symbols[start:start + self.GROUP_SYMBOLS]
+            k = len(sources)
+            header = (MAGIC, PACKET_DATA, file_id, chunk_index, group)
+            for i, symbol in enumerate(sources):
+                yield HEADER.pack(*header, i, k, repair, size, len(data)) + symbol
+            rows = [fec.cauchy_row(i, k) for i in range(repair)]
+            for i, block in enumerate(fec.encode(sources, rows)):
+                yield HEADER.pack(*header, k + i, k, repair, size, len(data)) + block.tobytes()
+
+    def run_sender(self, filename):
+        sock = None
+        try:
+            metadata = self.load_metadata(filename)
+            file_hash = self.get_file_hash(filename)
+            file_id = bytes.fromhex(file_hash)
+            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.TTL)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.INTERFACE))
+            addr = (self.GROUP, self.PORT)
+
+            self.signals.update_log.emit(f"Multicasting {filename} to {self.GROUP}:{self.PORT}")
+            time.sleep(self.START_DELAY)
+
+            start_time = time.time()
+            sent_bytes = 0
+            chunk_count = metadata['chunk_count']
+            for chunk_info in metadata['chunks']:
+                chunk_path = os.path.join(file_chunk_dir, f"{chunk_info['index']}_{chunk_info['hash']}")
+                with open(chunk_path, "rb") as f:
+                    data = f.read()
+
+                for packet in self.build_packets(file_id, chunk_info['index'], data):
+                    sock.sendto(packet, addr)
+                    sent_bytes += len(packet)
+                    ahead = sent_bytes / self.SEND_RATE - (time.time() - start_time)
+                    if ahead > 0.01:
+                        time.sleep(ahead)
+
+                self.signals.progress_update.emit(int((chunk_info['index'] + 1) / chunk_count * 100))
+
+            end = HEADER.pack(MAGIC, PACKET_END, file_id, chunk_count, 0, 0, 0, 0, 0, 0)
+            for _ in range(3):
+                sock.sendto(end, addr)
+                time.sleep(0.05)
+
+            self.signals.update_log.emit(f"Multicast of {filename} finished ({sent_bytes} bytes sent)")
+        except Exception as e:
+            self.signals.update_log.emit(f"Multicast send error: {str(e)}")
+        finally:
+            self.sending = False
+            if sock:
+                sock.close()
+
+    def open_receiver_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(("", self.PORT))
+        membership = socket.inet_aton(self.GROUP) + socket.inet_aton(self.INTERFACE)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.settimeout(1.0)
+        return sock
+
+    def run_receiver(self, filename, peers, file_client):
+        sock = None
+        try:
+            metadata = self.load_metadata(filename)
+            file_hash = self.get_file_hash(filename)
+            file_id = bytes.fromhex(file_hash)
+            file_chunk_dir = os.path.join(self.chunk_dir, file_hash)
+            if not os.path.exists(file_chunk_dir):
+                os.makedirs(file_chunk_dir)
+
+            chunks = {c['index']: c for c in metadata['chunks']}
+            done = set(i for i, c in chunks.items()
+                       if os.path.exists(os.path.join(file_chunk_dir, f"{i}_{c['hash']}")))
+            pending = {}
+            sock = self.open_receiver_socket()
+            self.signals.update_log.emit(f"Listening for multicast of {filename} on {self.GROUP}:{self.PORT}")
+
+            last_packet = time.time()
+            while len(done) < len(chunks):
+                try:
+                    packet = sock.recv(HEADER.size + self.SYMBOL_SIZE)
+                except socket.timeout:
+                    if time.time() - last_packet > self.IDLE_TIMEOUT:
+                        break
+                    continue
+
+                if len(packet) < HEADER.size:
+                    continue
+                magic, kind, pid, chunk_index, group, symbol, k, r, size, chunk_size = HEADER.unpack_from(packet)
+                if magic != MAGIC or pid != file_id:
+                    continue
+                last_packet = time.time()
+                if kind == PACKET_END:
+                    break
+                if chunk_index in done or chunk_index not in chunks:
+                    continue
+
+                self.add_symbol(pending, chunk_index, group, symbol, k, r, chunk_size, packet[HEADER.size:])
+                data = self.try_assemble(pending, chunk_index, size)
+                if data is None:
+                    continue
+
+                del pending[chunk_index]
+                chunk_hash = chunks[chunk_index]['hash']
+                if hashlib.md5(data).hexdigest() != chunk_hash:
+                    continue
+                with open(os.path.join(file_chunk_dir, f"{chunk_index}_{chunk_hash}"), "wb") as f:
+                    f.write(data)
+                done.add(chunk_index)
+                self.signals.progress_update.emit(int(len(done) / len(chunks) * 100))
+
+            received = len(done)
+            missing = [i for i in chunks if i not in done]
+            self.signals.update_log.emit(
+                f"Multicast delivered {received}/{len(chunks)} chunks of {filename}, {len(missing)} left for repair")
+
+            for chunk_index in missing:
+                chunk_hash = chunks[chunk_index]['hash']
+                for peer in peers:
+                    if file_client.download_chunk(peer, filename, chunk_index, chunk_hash, file_chunk_dir):
+                        done.add(chunk_index)
+                        break
+                else:
+                    self.signals.update_log.emit(f"Could not repair chunk {chunk_index} of {filename}")
+                    return
+                self.signals.progress_update.emit(int(len(done) / len(chunks) * 100))
+
+            self.signals.transfer_complete.emit(filename)
+        except Exception as e:
+            self.signals.update_log.emit(f"Multicast receive error: {str(e)}")
+        finally:
+            if sock:
+                sock.close()
+
+    def add_symbol(self, pending, chunk_index, group, symbol, k, r, chunk_size, payload):
+        state = pending.setdefault(chunk_index, {"size": chunk_size, "groups": {}, "decoded": {}})
+        if group in state["decoded"]:
+            return
+        state["groups"].setdefault(group, {"k": k, "r": r, "symbols": {}})["symbols"][symbol] = payload
+
+    def try_assemble(self, pending, chunk_index, symbol_size):
+        from . import fec
+
+        state = pending[chunk_index]
+        for group, info in list(state["groups"].items()):
+            k = info["k"]
+            if len(info["symbols"]) < k:
+                continue
+            sources = {i: s for i, s in info["symbols"].items() if i < k}
+            repairs = [(fec.cauchy_row(i - k, k), s) for i, s in info["symbols"].items() if i >= k]
+            blocks = fec.decode(k, sources, repairs)
+            if blocks is not None:
+                state["decoded"][group] = b"".join(bytes(b) for b in blocks)
+                del state["groups"][group]
+
+        symbols = -(-state["size"] // symbol_size) or 1
+        group_count = -(-symbols // self.GROUP_SYMBOLS)
+        if len(state["decoded"]) < group_count:
+            return None
+        data = b"".join(state["decoded"][g] for g in range(group_count))
+        return data[:state["size"]]
@@ -0,0 +1,139 @@
+import time
+import heapq
+import itertools
+import threading
+
+BURST_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """Byte token bucket; a rate of 0 means unlimited"""
+
+    def __init__(self, rate=0, burst=None):
+        self.lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        with self.lock:
+            self.rate = rate
+            self.burst = burst or max(BURST_SIZE, rate // 4)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, nbytes):
+        """Take nbytes if available, otherwise return the seconds to wait"""
+        with self.lock:
+            if not self.rate:
+                return 0
+            self._refill()
+            needed = min(nbytes, self.burst)
+            if self.tokens >= needed:
+                self.tokens -= nbytes
+                return 0
+            return (needed - self.tokens) / self.rate
+
+    def consume(self, nbytes):
+        while True:
+            wait = self.try_consume(nbytes)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class UploadScheduler:
+    """Global and per-peer upload limits with weighted fair queuing.
+
+    Senders ask for a burst of bytes before each sendall. Per-peer buckets
+    cap every connection, and the global bucket is handed out in order of
+    virtual finish time (bytes / weight), so one fast reader cannot starve
+    the others while the teacher's uplink is the bottleneck.
+    """
+
+    def __init__(self, global_rate=0, peer_rate=0):
+        self.global_bucket = TokenBucket(global_rate)
+        self.peer_rate = peer_rate
+        self.peer_buckets = {}
+        self.weights = {}
+        self.finish_tags = {}
+        self.virtual_time = 0.0
+        self.waiting = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+
+    def set_limits(self, global_rate, peer_rate):
+        self.global_bucket.set_rate(global_rate)
+        with self.cond:
+            self.peer_rate = peer_rate
+            for bucket in self.peer_buckets.values():
+                bucket.set_rate(peer_rate)
+            self.cond.notify_all()
+
+    def set_weight(self, peer, weight):
+        with self.cond:
+            self.weights[peer] = weight
+
+    def set_weights(self, weights):
+        """Replace every peer's weight; peers left out go back to 1.0"""
+        with self.cond:
+            self.weights = dict(weights)
+
+    def peer_bucket(self, peer):
+        with self.cond:
+            if peer not in self.peer_buckets:
+                self.peer_buckets[peer] = TokenBucket(self.peer_rate)
+            return self.peer_buckets[peer]
+
+    def acquire(self, peer, nbytes):
+        self.peer_bucket(peer).consume(nbytes)
+
+        if not self.global_bucket.rate:
+            return
+
+        with self.cond:
+            start = max(self.virtual_time, self.finish_tags.get(peer, 0.0))
+            tag = start + nbytes / self.weights.get(peer, 1.0)
+            self.finish_tags[peer] = tag
+            entry = (tag, next(self.counter), start)
+            heapq.heappush(self.waiting, entry)
+            self.cond.notify_all()
+
+            while True:
+                if self.waiting[0] == entry:
+                    wait = self.global_bucket.try_consume(nbytes)
+                    if not wait:
+                        heapq.heappop(self.waiting)
+                        self.virtual_time = start
+                        self.cond.notify_all()
+                        return
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait()
+
+    def limited(self):
+        return bool(self.global_bucket.rate or self.peer_rate)
+
+    def send_file(self, sock, peer, f, offset, count):
+        """Send count bytes of the open file f from offset. Without limits
+        this is one sendfile() call and the bytes never enter Python."""
+        if not self.limited():
+            sock.sendfile(f, offset, count)
+            return
+        f.seek(offset)
+        while count > 0:
+            data = f.read(min(BURST_SIZE, count))
+            if not data:
+                break
+            self.send(sock, peer, data)
+            count -= len(data)
+
+    def send(self, sock, peer, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), BURST_SIZE):
+            burst = view[offset:offset + BURST_SIZE]
+            self.acquire(peer, len(burst))
+            sock.sendall(burst)
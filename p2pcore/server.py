@@ -0,0 +1,868 @@
+import socket
+import threading
+import os
+import shutil
+import json
+import hashlib
+import time
+from . import compression
+from .ratelimit import UploadScheduler, BURST_SIZE
+from .choking import UploadSlotManager
+from .bundle import BundleReader
+from .diskio import DiskIO
+from .chunkcache import ChunkCache
+from .stamps import StampCache, stat_stamp
+from .catalog import Catalog
+from .session import Session, PREFACE, ACCEPT
+from .dht import DHTNode
+from .tracker import Tracker, TrackerClient, DEFAULT_TRACKER_PORT, ANNOUNCE_INTERVAL
+from .events import ServerSignals
+
+CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNKS = 2048
+BLOCK_SIZE = 64 * 1024
+READ_AHEAD = 1024 * 1024
+DEFAULT_PORT = 8080
+MAX_BATCH = 1024
+MAX_BATCH_ENTRY = 1024
+
+
+def chunk_size_for(file_size):
+    """1 MB chunks, doubled until the file fits in MAX_CHUNKS of them, so a
+    50 GB image gets ~1600 chunks of 32 MB instead of 50k chunk files"""
+    chunk_size = CHUNK_SIZE
+    while chunk_size < MAX_CHUNK_SIZE and file_size > chunk_size * MAX_CHUNKS:
+        chunk_size *= 2
+    return chunk_size
+
+
+def recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError(f"connection closed after {received} of {size} bytes")
+        received += n
+    return data
+
+
+class SocketReader:
+    """File-like read() over the next `size` bytes of a socket, so an upload
+    can be chunked while it arrives"""
+
+    def __init__(self, sock, size):
+        self.sock = sock
+        self.remaining = size
+
+    def read(self, n):
+        n = min(n, self.remaining)
+        if n <= 0:
+            return b""
+        self.remaining -= n
+        return recv_exact(self.sock, n)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FileServerManager:
+    def __init__(self, host="192.168.234.191", port=DEFAULT_PORT, base_dir=".", my_ip=None):
+        self.PORT = port
+        self.SERVER = host
+        self.BUFFER_SIZE = 4096
+        self.SEPARATOR = "<SEPARATOR>"
+        
+        self.signals = ServerSignals()
+        self.my_ip = my_ip or socket.gethostbyname(socket.gethostname())
+        self.files_dir = os.path.join(base_dir, "shared_files")
+        self.chunk_dir = os.path.join(base_dir, "chunks")
+        self.metadata_dir = os.path.join(base_dir, "metadata")
+        self.server_running = False
+        self.server_thread = None
+        self.listening = threading.Event()
+        self.compressed_cache = compression.CompressedChunkCache()
+        self.disk = DiskIO()
+        self.chunk_cache = ChunkCache()
+        self.disk.on_write.append(self.chunk_written)
+        self.stamps = StampCache(os.path.join(base_dir, "stamps.json"))
+        self.catalog = Catalog(self.metadata_dir, self.files_dir)
+        self.upload_scheduler = UploadScheduler()
+        self.slot_manager = UploadSlotManager()
+        # peers that won their slot by contributing get a bigger share of the uplink
+        self.slot_manager.on_rechoke.append(self.upload_scheduler.set_weights)
+        self.bytes_uploaded = 0
+        self.dht = None
+        self.dht_enabled = True
+        self.dht_bootstrap = []
+        self.dht_ready = threading.Event()
+        self.tracker = None
+        self.tracker_client = None
+        self.seeding = set()
+        # serve raw chunk and range bytes with sendfile() instead of from the
+        # chunk cache; meant for dedicated seeders with fast disks and links
+        self.zero_copy = False
+        
+        for directory in [self.files_dir, self.chunk_dir, self.metadata_dir]:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+    
+    def add_file(self, file_path):
+        if not file_path:
+            return False
+            
+        try:
+            file_name = os.path.basename(file_path)
+            destination = os.path.join(self.files_dir, file_name)
+            
+            shutil.copy2(file_path, destination)
+            self.signals.update_log.emit(f"Added file: {file_name}")
+            return True
+        except Exception as e:
+            self.signals.update_log.emit(f"Failed to add file: {str(e)}")
+            return False
+    
+    def add_file_reference(self, filename):
+        try:
+            file_hash = self.get_file_hash(filename)
+            metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
+            
+            if not os.path.exists(metadata_path):
+                self.signals.update_log.emit(f"No metadata found for file: {filename}")
+                return False
+            
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            
+            my_ip = self.peer_address()
+            if 'peers' not in metadata:
+                metadata['peers'] = [my_ip]
+            elif my_ip not in metadata['peers']:
+                metadata['peers'].append(my_ip)
+            
+            with open(metadata_path, 'w') as f:
+                json.dump(metadata, f)
+            
+            self.announce(filename)
+            self.signals.update_log.emit(f"Added file reference: {filename}")
+            return True
+            
+        except Exception as e:
+            self.signals.update_log.emit(f"Failed to add file reference: {str(e)}")
+            return False
+    
+    def get_file_hash(self, filename):
+        return hashlib.md5(filename.encode()).hexdigest()
+    
+    def peer_address(self):
+        """How other peers should list this server in a manifest"""
+        if self.PORT == DEFAULT_PORT:
+            return self.my_ip
+        return f"{self.my_ip}:{self.PORT}"
+    
+    def create_chunks(self, file_path, repair=False):
+        """Chunk a file, or a whole directory packed into one bundle, and write its manifest"""
+        filename = os.path.basename(os.path.normpath(file_path))
+        bundle = None
+        if os.path.isdir(file_path):
+            bundle = BundleReader(file_path)
+            file_size = bundle.size
+        else:
+            file_size = os.path.getsize(file_path)
+       
+        file_chunk_dir = os.path.join(self.chunk_dir, self.get_file_hash(filename))
+        if not os.path.exists(file_chunk_dir):
+            os.makedirs(file_chunk_dir)
+        
+        source_stamp = stat_stamp(file_path)
+        metadata = self.reuse_chunks(file_path, filename, file_chunk_dir, repair)
+        if metadata:
+            return metadata
+        
+        metadata = self.chunk_stream(filename, bundle or open(file_path, "rb"), file_size, file_chunk_dir, repair, bundle)
+        
+        # only remember the result if the source did not change while it was read
+        if stat_stamp(file_path) == source_stamp:
+            self.stamps.record(file_path, [chunk['hash'] for chunk in metadata['chunks']], source_stamp)
+            self.record_chunk_stamps(metadata, file_chunk_dir)
+        return metadata
+    
+    def receive_file(self, filename, sock, file_size, repair=False):
+        """Chunk a file while its file_size bytes arrive on sock, so no whole
+        copy is written first. The manifest is only written once the last
+        byte is in; the file is announced like any other shared file."""
+        filename = os.path.basename(filename)
+        file_chunk_dir = os.path.join(self.chunk_dir, self.get_file_hash(filename))
+        if not os.path.exists(file_chunk_dir):
+            os.makedirs(file_chunk_dir)
+        
+        metadata = self.chunk_stream(filename, SocketReader(sock, file_size), file_size, file_chunk_dir, repair)
+        self.record_chunk_stamps(metadata, file_chunk_dir)
+        self.announce(filename)
+        return metadata
+    
+    def chunk_stream(self, filename, f, file_size, file_chunk_dir, repair=False, bundle=None):
+        """Cut everything read from f into chunks and write the manifest"""
+        chunks = []
+        writes = []
+        chunk_index = 0
+        chunk_size = chunk_size_for(file_size)
+        
+        encoder = None
+        if repair:
+            from . import erasure
+            repair_count = erasure.repair_count_for(-(-file_size // chunk_size))
+            encoder = erasure.RepairEncoder(repair_count, chunk_size, file_chunk_dir)
+      
+        with f:
+            while True:
+                chunk_data = f.read(chunk_size)
+                if not chunk_data:
+                    break
+                
+                chunk_hash = hashlib.md5(chunk_data).hexdigest()
+                
+                chunk_filename = f"{chunk_index}_{chunk_hash}"
+                chunk_path = os.path.join(file_chunk_dir, chunk_filename)
+                
+                writes.append(self.disk.write(chunk_path, chunk_data))
+                
+                if encoder:
+                    encoder.add(chunk_data)
+                
+                chunks.append({
+                    "index": chunk_index,
+                    "hash": chunk_hash,
+                    "size": len(chunk_data)
+                })
+                
+                chunk_index += 1
+   
+        # chunk writes overlap with hashing the next chunk; all must land
+        # before the manifest points at them
+        for request in writes:
+            request.wait()
+        metadata = {
+            "filename": filename,
+            "filesize": file_size,
+            "chunk_size": chunk_size,
+            "block_size": BLOCK_SIZE,
+            "chunks": chunks,
+            "chunk_count": chunk_index,
+            "owner": self.peer_address(),
+            "peers": [self.peer_address()]
+        }
+        
+        if bundle:
+            metadata["bundle"] = {"files": bundle.files}
+        if encoder:
+            metadata["erasure"] = encoder.write()
+        
+        self.chunk_cache.drop(self.get_file_hash(filename))
+        metadata_path = os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json")
+        with open(metadata_path, "w") as mf:
+            json.dump(metadata, mf)
+        
+        if bundle:
+            self.signals.update_log.emit(f"Packed {len(bundle.files)} files of {filename} into {chunk_index} chunks")
+        elif encoder:
+            self.signals.update_log.emit(f"Created {chunk_index} chunks and {len(encoder.seeds)} repair pieces for {filename}")
+        else:
+            self.signals.update_log.emit(f"Created {chunk_index} chunks for {filename}")
+        return metadata
+    
+    def record_chunk_stamps(self, metadata, file_chunk_dir):
+        for chunk in metadata['chunks']:
+            self.stamps.record(os.path.join(file_chunk_dir, f"{chunk['index']}_{chunk['hash']}"), chunk['hash'])
+        self.stamps.save()
+    
+    def reuse_chunks(self, file_path, filename, file_chunk_dir, repair):
+        """The existing manifest of file_path if the file has not changed since
+        it was chunked and all of its chunks are still stored, else None"""
+        hashes = self.stamps.lookup(file_path)
+        if not hashes:
+            return None
+        try:
+            with open(os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json"), "r") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if [chunk['hash'] for chunk in metadata['chunks']] != hashes or (repair and 'erasure' not in metadata):
+            return None
+        for chunk in metadata['chunks']:
+            if not os.path.exists(os.path.join(file_chunk_dir, f"{chunk['index']}_{chunk['hash']}")):
+                return None
+        
+        if self.peer_address() not in metadata.get('peers', []):
+            metadata.setdefault('peers', []).append(self.peer_address())
+            with open(os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json"), "w") as f:
+                json.dump(metadata, f)
+        self.signals.update_log.emit(f"{filename} is unchanged, reusing its {metadata['chunk_count']} chunks")
+        return metadata
+    
+    def verify_store(self, filename):
+        """Check the stored chunks of filename against its manifest, deleting
+        bad ones. Chunks whose stamp matches their last check are not read.
+        Returns (good, bad) chunk counts."""
+        file_hash = self.get_file_hash(filename)
+        with open(os.path.join(self.metadata_dir, f"{file_hash}.json"), "r") as f:
+            metadata = json.load(f)
+        
+        good = bad = 0
+        for chunk in metadata['chunks']:
+            path = os.path.join(self.chunk_dir, file_hash, f"{chunk['index']}_{chunk['hash']}")
+            if not os.path.exists(path):
+                continue
+            if self.stamps.verify_chunk(path, chunk['hash'], self.disk.read):
+                good += 1
+                continue
+            bad += 1
+            self.stamps.forget(path)
+            os.remove(path)
+        
+        if bad:
+            self.chunk_cache.drop(file_hash)
+            self.signals.update_log.emit(f"Removed {bad} corrupt chunks of {filename}")
+        self.stamps.save()
+        return good, bad
+    
+    def start_server(self):
+        if self.server_running:
+            return
+            
+        self.server_running = True
+        self.server_thread = threading.Thread(target=self.run_server)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        
+        self.signals.update_log.emit(f"Server started on {self.SERVER}:{self.PORT}")
+        
+        shared, _ = self.scan_manifests()
+        self.seeding.update(self.get_file_hash(filename) for filename in shared)
+        if self.dht_enabled:
+            self.start_dht(self.dht_bootstrap)
+        self.announce_all("started")
+        threading.Thread(target=self.reannounce_loop, daemon=True).start()
+    
+    def stop_server(self):
+        if self.server_running and self.tracker_client:
+            self.announce_all("stopped")
+        self.server_running = False
+        self.listening.clear()
+        if self.dht:
+            self.dht.stop()
+            self.dht = None
+            self.dht_ready.clear()
+        self.signals.update_log.emit("Server stopped")
+    
+    def start_dht(self, bootstrap=()):
+        """Join the DHT on the server's host:port (UDP), bootstrapping from the
+        peers in our manifests; files are announced once the server is up"""
+        if self.dht:
+            return self.dht
+        try:
+            dht = DHTNode(self.SERVER, self.PORT, self.peer_address(), self.signals)
+            dht.start()
+        except OSError as e:
+            self.signals.update_log.emit(f"DHT disabled: {str(e)}")
+            return None
+        self.dht = dht
+        _, known = self.scan_manifests()
+        
+        def join():
+            peers = dict.fromkeys(list(bootstrap) + known)
+            dht.bootstrap([peer for peer in peers if peer != self.peer_address()])
+            if self.server_running:
+                for file_hash in list(self.seeding):
+                    dht.announce(file_hash)
+            self.dht_ready.set()
+        
+        threading.Thread(target=join, daemon=True).start()
+        return dht
+    
+    def scan_manifests(self):
+        """Files this peer serves (its address is in their manifest) and every
+        peer named in any local manifest"""
+        shared = []
+        known = []
+        for metadata_file in os.listdir(self.metadata_dir):
+            try:
+                with open(os.path.join(self.metadata_dir, metadata_file), 'r') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            known += metadata.get('peers', [])
+            if self.peer_address() in metadata.get('peers', []):
+                shared.append(metadata['filename'])
+        return shared, known
+    
+    def announce_all(self, event=""):
+        if self.dht and event != "stopped":
+            for file_hash in list(self.seeding):
+                self.dht.announce(file_hash)
+        if self.tracker_client:
+            client, me, hashes = self.tracker_client, self.peer_address(), list(self.seeding)
+            threading.Thread(target=lambda: [client.announce(file_hash, me, event, 0, 0)
+                                             for file_hash in hashes], daemon=True).start()
+    
+    def announce(self, filename, event="completed"):
+        file_hash = self.get_file_hash(filename)
+        self.seeding.add(file_hash)
+        # only advertise files we can actually serve right now
+        if not self.server_running:
+            return
+        if self.dht:
+            self.dht.announce(file_hash)
+        if self.tracker_client:
+            threading.Thread(target=self.tracker_client.announce,
+                             args=(file_hash, self.peer_address(), event, 0, 0), daemon=True).start()
+    
+    def reannounce_loop(self):
+        last = time.time()
+        while self.server_running:
+            time.sleep(1)
+            if time.time() - last < ANNOUNCE_INTERVAL:
+                continue
+            last = time.time()
+            if self.tracker_client:
+                for file_hash in list(self.seeding):
+                    self.tracker_client.announce(file_hash, self.peer_address(), "", 0, 0)
+    
+    def set_tracker(self, address):
+        """Announce to (and ask for peers from) the tracker at ip[:port]; None turns it off"""
+        bind_ip = self.SERVER if self.SERVER not in ("", "0.0.0.0") else None
+        self.tracker_client = TrackerClient(address, bind_ip) if address else None
+        if self.tracker_client:
+            self.signals.update_log.emit(f"Using tracker {address}")
+            if self.server_running:
+                self.announce_all("started")
+    
+    def start_tracker(self, port=DEFAULT_TRACKER_PORT):
+        if self.tracker:
+            return self.tracker
+        try:
+            tracker = Tracker(self.SERVER, port, self.signals)
+            tracker.start()
+        except OSError as e:
+            self.signals.update_log.emit(f"Could not start tracker: {str(e)}")
+            return None
+        self.tracker = tracker
+        return tracker
+    
+    def stop_tracker(self):
+        if self.tracker:
+            self.tracker.stop()
+            self.tracker = None
+            self.signals.update_log.emit("Tracker stopped")
+    
+    def run_server(self):
+        try:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.SERVER, self.PORT))
+            server.listen(64)
+            self.listening.set()
+            self.signals.update_log.emit(f"Server is listening on {self.SERVER}:{self.PORT}")
+            
+            while self.server_running:
+                try:
+                    server.settimeout(1.0)
+                    client_socket, addr = server.accept()
+                    thread = threading.Thread(target=self.handle_client, args=(client_socket, addr))
+                    thread.daemon = True
+                    thread.start()
+                    self.signals.update_log.emit(f"New connection from {addr[0]}:{addr[1]}")
+                except socket.timeout:
+                    continue
+                except Exception as e:
+                    if self.server_running:  
+                        self.signals.update_log.emit(f"Error: {str(e)}")
+                    break
+        except Exception as e:
+            self.signals.update_log.emit(f"Server error: {str(e)}")
+        finally:
+            self.server_running = False
+            server.close()
+    
+    def handle_client(self, client_socket, addr):
+        try:
+            command = client_socket.recv(1024).decode()
+            
+            if command == PREFACE.decode():
+                self.serve_session(client_socket, addr)
+                return
+            
+            if command.startswith("LIST"):
+                parts = command.split(self.SEPARATOR)
+                if len(parts) == 3:
+                    # LIST<SEP>epoch<SEP>version: only what changed since then
+                    kind, version, added, removed = self.catalog.delta(parts[1], int(parts[2] or 0))
+                    body = json.dumps({"added": added, "removed": removed}).encode("utf-8") if added or removed else b""
+                    client_socket.send(self.SEPARATOR.join(
+                        ["CATALOG", self.catalog.epoch, str(version), kind, str(len(body))]).encode())
+                    if body:
+                        client_socket.recv(1024)
+                        client_socket.sendall(body)
+                    self.signals.update_log.emit(
+                        f"Sent catalog {kind} to {addr[0]} (+{len(added)} -{len(removed)}, version {version})")
+                    return
+                
+                _, _, files, _ = self.catalog.delta()
+                response = self.SEPARATOR.join(files) if files else "NO_FILES"
+                client_socket.send(response.encode())
+                self.signals.update_log.emit(f"Sent file list to {addr[0]}")
+                
+            elif command.startswith("REPORT"):
+                _, uploaded = command.split(self.SEPARATOR)
+                self.slot_manager.report(addr[0], int(uploaded))
+                client_socket.send("OK".encode())
+            
+            elif command.startswith("GET_CHUNK"):
+                if not self.slot_manager.request_slot(addr[0]):
+                    client_socket.send("CHOKED".encode())
+                    return
+                
+                parts = command.split(self.SEPARATOR)
+                _, filename, chunk_index = parts[:3]
+                offered_codecs = parts[3] if len(parts) > 3 else ""
+                # repair pieces of erasure coded files are requested as "r<index>"
+                if not chunk_index.lstrip("r").isdigit():
+                    client_socket.send(f"ERROR{self.SEPARATOR}Invalid chunk index".encode())
+                    return
+
+                file_hash = self.get_file_hash(filename)
+                if self.zero_copy:
+                    self.send_stored_chunk(client_socket, addr[0], filename, file_hash, chunk_index, offered_codecs)
+                    return
+                cached = self.cached_chunk(file_hash, chunk_index)
+                
+                if not cached:
+                    client_socket.send(f"ERROR{self.SEPARATOR}Chunk not found".encode())
+                    return
+                chunk_file, chunk_data = cached
+                
+                if offered_codecs:
+                    codec, payload = compression.encode_chunk(
+                        self.compressed_cache, (file_hash, chunk_file), chunk_data, offered_codecs)
+                    client_socket.send(f"CHUNK{self.SEPARATOR}{len(payload)}{self.SEPARATOR}{codec}".encode())
+                else:
+                    codec, payload = compression.RAW, chunk_data
+                    client_socket.send(f"CHUNK{self.SEPARATOR}{len(payload)}".encode())
+                
+                client_socket.recv(1024)
+                
+                self.upload_scheduler.send(client_socket, addr[0], payload)
+                self.record_upload(addr[0], len(payload))
+                
+                self.signals.update_log.emit(
+                    f"Sent chunk {chunk_index} of {filename} to {addr[0]} ({codec}, {len(payload)}/{len(chunk_data)} bytes)")
+            
+            elif command.startswith("GET_BLOCK"):
+                if not self.slot_manager.request_slot(addr[0]):
+                    client_socket.send("CHOKED".encode())
+                    return
+                
+                _, filename, chunk_index, block_size, first_block, count = command.split(self.SEPARATOR)
+                if self.zero_copy:
+                    path = self.verified_chunk(self.get_file_hash(filename), chunk_index) if chunk_index.isdigit() else None
+                    if not path:
+                        client_socket.send(f"ERROR{self.SEPARATOR}Chunk not found".encode())
+                        return
+                    size = os.path.getsize(path)
+                    offset = min(int(first_block) * int(block_size), size)
+                    length = min(int(count) * int(block_size), size - offset)
+                    client_socket.send(f"BLOCK{self.SEPARATOR}{length}".encode())
+                    client_socket.recv(1024)
+                    self.send_stored(client_socket, addr[0], path, offset, length)
+                    self.signals.update_log.emit(
+                        f"Sent blocks {first_block}-{int(first_block) + int(count) - 1} of chunk {chunk_index} of {filename} to {addr[0]} (sendfile)")
+                    return
+                cached = self.cached_chunk(self.get_file_hash(filename), chunk_index) if chunk_index.isdigit() else None
+                if not cached:
+                    client_socket.send(f"ERROR{self.SEPARATOR}Chunk not found".encode())
+                    return
+                
+                chunk_data = cached[1]
+                offset = min(int(first_block) * int(block_size), len(chunk_data))
+                length = min(int(count) * int(block_size), len(chunk_data) - offset)
+                client_socket.send(f"BLOCK{self.SEPARATOR}{length}".encode())
+                client_socket.recv(1024)
+                
+                self.upload_scheduler.send(client_socket, addr[0], chunk_data[offset:offset + length])
+                self.record_upload(addr[0], length)
+                
+                self.signals.update_log.emit(
+                    f"Sent blocks {first_block}-{int(first_block) + int(count) - 1} of chunk {chunk_index} of {filename} to {addr[0]}")
+            
+            elif command.startswith("GET_METADATA_BATCH"):
+                # the request body (names and known versions) can be large,
+                # so it follows the header once the server is ready for it
+                _, offered_codecs, body_size = command.split(self.SEPARATOR)
+                if int(body_size) > MAX_BATCH * MAX_BATCH_ENTRY:
+                    client_socket.send(f"ERROR{self.SEPARATOR}Batch request too large".encode())
+                    return
+                client_socket.send("READY".encode())
+                request = json.loads(recv_exact(client_socket, int(body_size)).decode("utf-8"))
+                if len(request.get("files") or {}) > MAX_BATCH:
+                    client_socket.send(f"ERROR{self.SEPARATOR}Too many manifests in one batch".encode())
+                    return
+                
+                response = self.metadata_batch(request.get("files") or {})
+                raw = json.dumps(response).encode("utf-8")
+                codec = compression.negotiate(offered_codecs) if offered_codecs else compression.RAW
+                payload = compression.compress(codec, raw)
+                client_socket.send(f"METADATA_BATCH{self.SEPARATOR}{codec}{self.SEPARATOR}{len(payload)}".encode())
+                client_socket.recv(1024)
+                client_socket.sendall(payload)
+                
+                self.signals.update_log.emit(
+                    f"Sent {len(response['manifests'])} manifests to {addr[0]} "
+                    f"({len(response['unchanged'])} unchanged, {codec}, {len(payload)}/{len(raw)} bytes)")
+            
+            elif command.startswith("GET_METADATA"):
+                _, filename = command.split(self.SEPARATOR)
+                file_hash = self.get_file_hash(filename)
+                metadata_path = os.path.join(self.metadata_dir, f"{file_hash}.json")
+                
+                if not os.path.exists(metadata_path):
+                    client_socket.send(f"ERROR{self.SEPARATOR}Metadata not found".encode())
+                    return
+                
+                with open(metadata_path, "r") as f:
+                    metadata_json = f.read()
+                
+                client_socket.send(str(len(metadata_json.encode())).encode())
+                
+                client_socket.recv(1024)
+                
+                client_socket.sendall(metadata_json.encode())
+                
+                self.signals.update_log.emit(f"Sent metadata for {filename} to {addr[0]}")
+
+            elif command.startswith("GET_RANGE"):
+                if not self.slot_manager.request_slot(addr[0]):
+                    client_socket.send("CHOKED".encode())
+                    return
+                
+                _, filename, offset, length = command.split(self.SEPARATOR)
+                source = self.range_source(filename)
+                
+                if source is None:
+                    client_socket.send(f"ERROR{self.SEPARATOR}File not found".encode())
+                    return
+                
+                filesize, pieces = source
+                offset = min(int(offset), filesize)
+                length = min(int(length), filesize - offset)
+                client_socket.send(f"RANGE{self.SEPARATOR}{filesize}{self.SEPARATOR}{length}".encode())
+                # a zero-length request is just a size probe
+                if length == 0:
+                    return
+                
+                client_socket.recv(1024)
+                
+                if self.zero_copy:
+                    end = offset + length
+                    for path, start, size in pieces:
+                        if start + size > offset and start < end:
+                            position = max(offset, start)
+                            self.send_stored(client_socket, addr[0], path, position - start, min(end, start + size) - position)
+                else:
+                    for bytes_read in self.read_range(pieces, offset, length):
+                        self.upload_scheduler.send(client_socket, addr[0], bytes_read)
+                        self.record_upload(addr[0], len(bytes_read))
+                
+                self.signals.update_log.emit(f"Sent bytes {offset}-{offset + length} of {filename} to {addr[0]}")
+
+            elif command.startswith("GET"):
+                if not self.slot_manager.request_slot(addr[0]):
+                    client_socket.send("CHOKED".encode())
+                    return
+                
+                _, filename = command.split(self.SEPARATOR)
+                filepath = os.path.join(self.files_dir, filename)
+                
+                if os.path.exists(filepath):
+                    filesize = os.path.getsize(filepath)
+                    client_socket.send(f"{filename}{self.SEPARATOR}{filesize}".encode())
+                    
+                    client_socket.recv(1024)
+                    
+                    with open(filepath, "rb") as f:
+                        while True:
+                            bytes_read = f.read(BURST_SIZE)
+                            if not bytes_read:
+                                break
+                            self.upload_scheduler.send(client_socket, addr[0], bytes_read)
+                            self.record_upload(addr[0], len(bytes_read))
+                            
+                    self.signals.update_log.emit(f"Sent file {filename} to {addr[0]}")
+                else:
+                    client_socket.send(f"ERROR{self.SEPARATOR}File not found".encode())
+                    self.signals.update_log.emit(f"File {filename} not found")
+                    
+        except Exception as e:
+            self.signals.update_log.emit(f"Error handling client {addr}: {str(e)}")
+        finally:
+            client_socket.close()
+    
+    def serve_session(self, client_socket, addr):
+        """A multiplexed connection: each stream is served like a connection
+        of its own, until the peer goes away"""
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client_socket.sendall(ACCEPT)
+        session = Session(client_socket, addr, initiator=False,
+                          on_stream=lambda stream: self.handle_client(stream, addr))
+        self.signals.update_log.emit(f"Session opened by {addr[0]}:{addr[1]}")
+        session.run()
+        self.signals.update_log.emit(f"Session with {addr[0]}:{addr[1]} ended")
+    
+    def metadata_batch(self, known):
+        """Manifests for a GET_METADATA_BATCH request. known maps file names
+        to the version the peer already has (0 for none); an empty request
+        means every manifest here. A manifest's version is the mtime_ns of
+        its file, so unchanged ones are skipped without being read."""
+        if known:
+            paths = [(filename, os.path.join(self.metadata_dir, f"{self.get_file_hash(filename)}.json"))
+                     for filename in known]
+        else:
+            paths = [(None, os.path.join(self.metadata_dir, name))
+                     for name in os.listdir(self.metadata_dir) if name.endswith('.json')]
+        
+        response = {"manifests": {}, "unchanged": [], "missing": []}
+        for filename, path in paths:
+            try:
+                version = os.stat(path).st_mtime_ns
+                if filename is not None and known.get(filename) == version:
+                    response["unchanged"].append(filename)
+                    continue
+                with open(path, "r") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                if filename is not None:
+                    response["missing"].append(filename)
+                continue
+            response["manifests"][metadata['filename']] = {"version": version, "metadata": metadata}
+        return response
+    
+    def send_stored_chunk(self, client_socket, peer, filename, file_hash, chunk_index, offered_codecs):
+        """GET_CHUNK in zero-copy mode: always raw, straight from the chunk file"""
+        path = self.verified_chunk(file_hash, chunk_index)
+        if not path:
+            client_socket.send(f"ERROR{self.SEPARATOR}Chunk not found".encode())
+            return
+        size = os.path.getsize(path)
+        header = f"CHUNK{self.SEPARATOR}{size}"
+        if offered_codecs:
+            header += f"{self.SEPARATOR}{compression.RAW}"
+        client_socket.send(header.encode())
+        client_socket.recv(1024)
+        self.send_stored(client_socket, peer, path, 0, size)
+        self.signals.update_log.emit(f"Sent chunk {chunk_index} of {filename} to {peer} (sendfile, {size} bytes)")
+    
+    def send_stored(self, client_socket, peer, path, offset, length):
+        with open(path, "rb") as f:
+            self.upload_scheduler.send_file(client_socket, peer, f, offset, length)
+        self.record_upload(peer, length)
+    
+    def cached_chunk(self, file_hash, chunk_index):
+        """(chunk file name, bytes) of a stored chunk, served from the hot
+        chunk cache; concurrent misses share a single disk read"""
+        def load():
+            path = self.find_chunk(file_hash, chunk_index)
+            if not path:
+                return None
+            # the file name carries the manifest hash; anything else on disk
+            # (a chunk still being written, a damaged one) is not served
+            data = self.disk.read(path)
+            if hashlib.md5(data).hexdigest() != os.path.basename(path).split("_", 1)[1]:
+                return None
+            return os.path.basename(path), data
+        return self.chunk_cache.get((file_hash, chunk_index), load)
+    
+    def chunk_written(self, path):
+        chunk_dir = os.path.dirname(os.path.abspath(path))
+        if os.path.dirname(chunk_dir) == os.path.abspath(self.chunk_dir):
+            self.chunk_cache.discard((os.path.basename(chunk_dir), os.path.basename(path).split("_", 1)[0]))
+    
+    def verified_chunk(self, file_hash, chunk_index):
+        """Path of a stored chunk that still matches the hash in its name, for
+        sending straight from disk. Only hashed again after the file changed."""
+        path = self.find_chunk(file_hash, chunk_index)
+        if path and self.stamps.verify_chunk(path, os.path.basename(path).split("_", 1)[1], self.disk.read):
+            return path
+        return None
+    
+    def find_chunk(self, file_hash, chunk_index):
+        """Path of chunk (or repair piece) chunk_index of a file, or None"""
+        chunk_dir = os.path.join(self.chunk_dir, file_hash)
+        if not os.path.exists(chunk_dir):
+            return None
+        for file in os.listdir(chunk_dir):
+            if file.startswith(f"{chunk_index}_"):
+                return os.path.join(chunk_dir, file)
+        return None
+    
+    def range_source(self, filename):
+        """Where byte ranges of a file are read from: the copy in shared_files/
+        if there is one, otherwise its chunk store once every chunk is on disk.
+        Returns (filesize, [(path, start offset, size), ...]) or None."""
+        filename = os.path.basename(filename)
+        filepath = os.path.join(self.files_dir, filename)
+        if os.path.isfile(filepath):
+            filesize = os.path.getsize(filepath)
+            return filesize, [(filepath, 0, filesize)]
+        
+        file_hash = self.get_file_hash(filename)
+        try:
+            with open(os.path.join(self.metadata_dir, f"{file_hash}.json"), "r") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        pieces = []
+        start = 0
+        for chunk in sorted(metadata['chunks'], key=lambda c: c['index']):
+            path = os.path.join(self.chunk_dir, file_hash, f"{chunk['index']}_{chunk['hash']}")
+            if not self.stamps.verify_chunk(path, chunk['hash'], self.disk.read):
+                return None
+            pieces.append((path, start, chunk['size']))
+            start += chunk['size']
+        return metadata['filesize'], pieces
+    
+    def read_range(self, pieces, offset, length):
+        """Yield the bytes of [offset, offset + length) in BURST_SIZE pieces,
+        reading ahead READ_AHEAD bytes at a time on the disk pool"""
+        end = offset + length
+        for path, start, size in pieces:
+            stop = min(end, start + size)
+            position = max(offset, start)
+            while position < stop:
+                data = memoryview(self.disk.read(path, position - start, min(READ_AHEAD, stop - position)))
+                if not data:
+                    return
+                for i in range(0, len(data), BURST_SIZE):
+                    yield data[i:i + BURST_SIZE]
+                position += len(data)
+    
+    def record_upload(self, peer, nbytes):
+        self.bytes_uploaded += nbytes
+        self.slot_manager.record_served(peer, nbytes)
+    
+    def set_rate_limits(self, global_kbps, peer_kbps):
+        self.upload_scheduler.set_limits(global_kbps * 1024, peer_kbps * 1024)
+        global_text = f"{global_kbps} KB/s" if global_kbps else "unlimited"
+        peer_text = f"{peer_kbps} KB/s" if peer_kbps else "unlimited"
+        self.signals.update_log.emit(f"Upload limit set to {global_text} total, {peer_text} per peer")
+    
+    def set_server_address(self, ip, port=None):
+        self.SERVER = ip
+        if port:
+            self.PORT = port
+
+            
\ No newline at end of file
@@ -0,0 +1,377 @@
+import socket
+import struct
+import threading
+from collections import deque
+
+PREFACE = b"P2P_SESSION/1"
+ACCEPT = b"SESSION_OK"
+CONNECT_TIMEOUT = 10.0
+
+# stream id, frame type, priority, payload length
+FRAME_HEADER = struct.Struct("!IBBI")
+FRAME_SIZE = 64 * 1024
+MAX_FRAME = 1024 * 1024
+WRITE_BATCH = 128 * 1024
+READ_SIZE = 256 * 1024
+STREAM_WINDOW = 512 * 1024
+# most buffers a single sendmsg() may gather on Linux
+IOV_MAX = 1024
+
+OPEN, DATA, WINDOW, CLOSE = range(1, 5)
+
+# lower is sent first; chat and control requests use CONTROL, chunk data BULK
+CONTROL = 0
+BULK = 4
+PRIORITY_LEVELS = 8
+
+
+class Stream:
+    """One request/response exchange inside a Session. Has the subset of the
+    socket API the file protocol uses (send, sendall, sendfile, recv,
+    recv_into, settimeout, close), so the same handlers serve both.
+
+    Flow control is per stream: a sender may only have STREAM_WINDOW bytes
+    the reader has not consumed yet, and the reader hands credit back as
+    recv() takes data out of the buffer.
+    """
+
+    def __init__(self, session, stream_id, priority):
+        self.session = session
+        self.id = stream_id
+        self.priority = min(max(priority, 0), PRIORITY_LEVELS - 1)
+        self.cond = threading.Condition(session.lock)
+        self.pieces = deque()
+        self.send_window = STREAM_WINDOW
+        self.unacked = 0
+        self.frames = deque()
+        self.queued = False
+        self.closed = False
+        self.remote_closed = False
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def getpeername(self):
+        return self.session.peer
+
+    def wait(self):
+        if not self.cond.wait(self.timeout):
+            raise socket.timeout("timed out")
+
+    def check_open(self):
+        if self.closed:
+            raise OSError("stream is closed")
+        if self.session.error:
+            raise ConnectionResetError(str(self.session.error))
+
+    def sendall(self, data):
+        view = memoryview(data).cast("B")
+        offset = 0
+        with self.cond:
+            while offset < len(view):
+                self.check_open()
+                if self.remote_closed:
+                    raise ConnectionResetError("stream closed by peer")
+                if self.send_window <= 0:
+                    self.wait()
+                    continue
+                n = min(self.send_window, FRAME_SIZE, len(view) - offset)
+                # read-only data cannot change under us, so it is queued without a copy
+                piece = view[offset:offset + n]
+                self.session.enqueue(self, DATA, piece if view.readonly else bytes(piece))
+                self.send_window -= n
+                offset += n
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def sendfile(self, f, offset=0, count=None):
+        f.seek(offset)
+        sent = 0
+        while count is None or sent < count:
+            data = f.read(FRAME_SIZE * 4 if count is None else min(FRAME_SIZE * 4, count - sent))
+            if not data:
+                break
+            self.sendall(data)
+            sent += len(data)
+        return sent
+
+    def take(self, n):
+        """Wait for data and remove up to n bytes of it; b"" once the peer closed.
+        Returns at most one frame's worth, usually without copying it."""
+        with self.cond:
+            while not self.pieces:
+                self.check_open()
+                if self.remote_closed:
+                    return b""
+                self.wait()
+            data = self.pieces.popleft()
+            if len(data) > n:
+                self.pieces.appendleft(data[n:])
+                data = data[:n]
+            # hand the credit back in batches rather than per read
+            self.unacked += len(data)
+            if self.unacked >= STREAM_WINDOW // 2 and not self.remote_closed:
+                self.session.enqueue(None, WINDOW, struct.pack("!I", self.unacked), self.id)
+                self.unacked = 0
+            return data
+
+    def recv(self, bufsize):
+        return self.take(bufsize)
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast("B")
+        data = self.take(nbytes or len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            if not self.session.error:
+                self.session.enqueue(self, CLOSE, b"")
+            if self.remote_closed:
+                self.session.streams.pop(self.id, None)
+            self.cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Session:
+    """Many concurrent streams over one TCP connection.
+
+    Every frame carries a stream id, and data is cut into FRAME_SIZE frames.
+    The writer thread always sends window updates and stream openings
+    first, then goes through the priority levels in order, taking one frame
+    per stream in turn. A control request therefore waits behind at most one
+    frame of a chunk being sent, not the whole chunk. The side that opened
+    the connection uses odd stream ids, the other side even ones.
+    """
+
+    def __init__(self, sock, peer, initiator, on_stream=None):
+        self.sock = sock
+        self.peer = peer
+        self.on_stream = on_stream
+        self.lock = threading.Lock()
+        self.writable = threading.Condition(self.lock)
+        self.streams = {}
+        self.next_id = 1 if initiator else 2
+        self.control = deque()
+        self.pending = [deque() for _ in range(PRIORITY_LEVELS)]
+        self.error = None
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    @property
+    def closed(self):
+        return self.error is not None
+
+    def open_stream(self, priority=BULK):
+        with self.lock:
+            if self.error:
+                raise ConnectionResetError(str(self.error))
+            stream = Stream(self, self.next_id, priority)
+            self.next_id += 2
+            self.streams[stream.id] = stream
+            self.enqueue(None, OPEN, b"", stream.id, stream.priority)
+            return stream
+
+    def enqueue(self, stream, kind, payload, stream_id=None, priority=0):
+        """Queue a frame; the caller holds self.lock. Frames without a stream
+        (openings and window updates) jump the queue."""
+        if stream is None:
+            self.control.append((FRAME_HEADER.pack(stream_id, kind, priority, len(payload)), payload))
+        else:
+            stream.frames.append((FRAME_HEADER.pack(stream.id, kind, stream.priority, len(payload)), payload))
+            if not stream.queued:
+                stream.queued = True
+                self.pending[stream.priority].append(stream)
+        self.writable.notify()
+
+    def next_batch(self):
+        batch = []
+        size = 0
+        while self.control and size < WRITE_BATCH:
+            header, payload = self.control.popleft()
+            batch += (header, payload)
+            size += len(header) + len(payload)
+        for level in self.pending:
+            while level and size < WRITE_BATCH:
+                stream = level.popleft()
+                header, payload = stream.frames.popleft()
+                batch += (header, payload)
+                size += len(header) + len(payload)
+                if stream.frames:
+                    level.append(stream)
+                else:
+                    stream.queued = False
+        return batch
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                while not self.error and not self.control and not any(self.pending):
+                    self.writable.wait()
+                if self.error:
+                    return
+                batch = self.next_batch()
+            try:
+                self.send_batch(batch)
+            except OSError as e:
+                self.fail(e)
+                return
+
+    def send_batch(self, batch):
+        # one gathering write for the whole batch instead of joining it first
+        while batch:
+            sent = self.sock.sendmsg(batch[:IOV_MAX])
+            done = 0
+            while done < len(batch) and sent >= len(batch[done]):
+                sent -= len(batch[done])
+                done += 1
+            del batch[:done]
+            if sent:
+                batch[0] = memoryview(batch[0])[sent:]
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Read and dispatch frames until the connection ends"""
+        buffer = bytearray(READ_SIZE + MAX_FRAME + FRAME_HEADER.size)
+        view = memoryview(buffer)
+        filled = 0
+        error = None
+        try:
+            while True:
+                n = self.sock.recv_into(view[filled:])
+                if not n:
+                    break
+                filled += n
+                offset = 0
+                while filled - offset >= FRAME_HEADER.size:
+                    stream_id, kind, priority, length = FRAME_HEADER.unpack_from(buffer, offset)
+                    if length > MAX_FRAME:
+                        raise ConnectionError(f"frame of {length} bytes on stream {stream_id}")
+                    end = offset + FRAME_HEADER.size + length
+                    if end > filled:
+                        break
+                    self.dispatch(stream_id, kind, priority, bytes(view[offset + FRAME_HEADER.size:end]))
+                    offset = end
+                # move the start of an incomplete frame to the front
+                view[:filled - offset] = view[offset:filled]
+                filled -= offset
+        except Exception as e:
+            error = e
+        self.fail(error or ConnectionResetError("session closed by peer"))
+
+    def dispatch(self, stream_id, kind, priority, payload):
+        if kind == OPEN:
+            with self.lock:
+                stream = self.streams[stream_id] = Stream(self, stream_id, priority)
+            if self.on_stream:
+                threading.Thread(target=self.on_stream, args=(stream,), daemon=True).start()
+            return
+
+        with self.lock:
+            stream = self.streams.get(stream_id)
+            # data for a stream we already closed is dropped; our CLOSE is on its way
+            if stream is None:
+                return
+            if kind == DATA:
+                if not stream.closed and payload:
+                    stream.pieces.append(payload)
+            elif kind == WINDOW:
+                stream.send_window += struct.unpack("!I", payload)[0]
+            elif kind == CLOSE:
+                stream.remote_closed = True
+                if stream.closed:
+                    del self.streams[stream_id]
+            stream.cond.notify_all()
+
+    def fail(self, error):
+        with self.lock:
+            if self.error:
+                return
+            self.error = error
+            for stream in self.streams.values():
+                stream.cond.notify_all()
+            self.writable.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def close(self):
+        self.fail(ConnectionAbortedError("session closed"))
+
+
+class SessionPool:
+    """One Session per peer address, opened on first use and reused by every
+    later request to that peer. Peers that answer the preface with anything
+    but ACCEPT are older versions; they are remembered and open_stream()
+    returns None for them so the caller uses a plain connection."""
+
+    def __init__(self, bind_ip=None):
+        self.bind_ip = bind_ip
+        self.sessions = {}
+        self.legacy = set()
+        self.connecting = {}
+        self.lock = threading.Lock()
+
+    def open_stream(self, address, timeout=None, priority=BULK):
+        with self.lock:
+            if address in self.legacy:
+                return None
+            connecting = self.connecting.setdefault(address, threading.Lock())
+
+        # one handshake per peer at a time; the others wait and reuse it
+        with connecting:
+            session = self.sessions.get(address)
+            if session is None or session.closed:
+                session = self.connect(address, timeout)
+                if session is None:
+                    return None
+            stream = session.open_stream(priority)
+        stream.settimeout(timeout)
+        return stream
+
+    def connect(self, address, timeout):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.settimeout(timeout or CONNECT_TIMEOUT)
+            if self.bind_ip:
+                s.bind((self.bind_ip, 0))
+            s.connect(address)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            s.sendall(PREFACE)
+            reply = s.recv(len(ACCEPT))
+        except OSError:
+            s.close()
+            raise
+        if reply != ACCEPT:
+            s.close()
+            with self.lock:
+                self.legacy.add(address)
+            return None
+
+        s.settimeout(None)
+        session = Session(s, address, initiator=True)
+        session.start()
+        with self.lock:
+            self.sessions[address] = session
+        return session
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            session.close()
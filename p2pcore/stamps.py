@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .bundle import walk_directory
+
+SAVE_INTERVAL = 10.0
+
+
+def stat_stamp(path):
+    """(size, mtime_ns, inode) of a file, or of every file under a directory.
+    Any edit, replacement or touch changes it."""
+    if os.path.isdir(path):
+        return [[relative] + stat_stamp(full_path) for relative, full_path in walk_directory(path)]
+    info = os.stat(path)
+    return [info.st_size, info.st_mtime_ns, info.st_ino]
+
+
+class StampCache:
+    """Remembers what was verified about a file along with the stat stamp it
+    had at the time, so unchanged files are not read and hashed again.
+
+    Values are whatever the caller verified: the chunk hash list of a shared
+    file, or the md5 of a stored chunk. A lookup only returns the value while
+    the file still has the same stamp. Saved as JSON next to metadata/.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.last_save = time.time()
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def lookup(self, path):
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            if stat_stamp(path) == entry["stamp"]:
+                return entry["value"]
+        except OSError:
+            pass
+        with self.lock:
+            self.entries.pop(key, None)
+            self.dirty = True
+        return None
+
+    def record(self, path, value, stamp=None):
+        try:
+            stamp = stamp or stat_stamp(path)
+        except OSError:
+            return
+        with self.lock:
+            self.entries[os.path.abspath(path)] = {"stamp": stamp, "value": value}
+            self.dirty = True
+        if time.time() - self.last_save > SAVE_INTERVAL:
+            self.save()
+
+    def forget(self, path):
+        with self.lock:
+            if self.entries.pop(os.path.abspath(path), None) is not None:
+                self.dirty = True
+
+    def verify_chunk(self, path, chunk_hash, read):
+        """True if the chunk file at path holds chunk_hash. Trusted without
+        reading it while its stamp matches the last successful check."""
+        if self.lookup(path) == chunk_hash:
+            return True
+        try:
+            stamp = stat_stamp(path)
+            ok = hashlib.md5(read(path)).hexdigest() == chunk_hash
+        except OSError:
+            return False
+        if ok:
+            self.record(path, chunk_hash, stamp)
+        return ok
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries)
+            self.dirty = False
+            self.last_save = time.time()
+        with self.save_lock:
+            self.write(data)
+
+    def write(self, data):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError:
+            with self.lock:
+                self.dirty = True
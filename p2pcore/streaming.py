@@ -0,0 +1,164 @@
+import os
+import bisect
+import threading
+
+STREAM_WINDOW = 8
+
+
+class PiecePicker:
+    """Decides which chunk download_from_peers fetches next.
+
+    Chunks a reader is blocked on come first, then the missing chunks in a
+    sliding window of `window` chunks from the read position, then the
+    lowest missing chunk of the file so gaps behind the reader get filled.
+    Iterating the picker yields chunk infos until every chunk was handed
+    out once; complete() and abort() wake up readers waiting for data.
+    Positions are chunk indexes, which run from 0 to chunk_count - 1.
+    """
+
+    def __init__(self, chunks, window=STREAM_WINDOW):
+        self.chunks = sorted(chunks, key=lambda c: c['index'])
+        self.window = window
+        self.position = 0
+        self.urgent = []
+        self.picked = set()
+        self.have = set()
+        self.lowest = 0
+        self.error = None
+        self.cond = threading.Condition()
+
+    def __iter__(self):
+        while True:
+            with self.cond:
+                position = self.pick()
+                if position is None:
+                    return
+                self.picked.add(position)
+            yield self.chunks[position]
+
+    def pick(self):
+        while self.urgent:
+            position = self.urgent.pop(0)
+            if position not in self.picked:
+                return position
+
+        for position in range(self.position, min(self.position + self.window, len(self.chunks))):
+            if position not in self.picked:
+                return position
+
+        while self.lowest < len(self.chunks) and self.lowest in self.picked:
+            self.lowest += 1
+        return self.lowest if self.lowest < len(self.chunks) else None
+
+    def seek(self, position):
+        with self.cond:
+            self.position = position
+
+    def complete(self, position):
+        with self.cond:
+            self.have.add(position)
+            self.cond.notify_all()
+
+    def abort(self, error):
+        with self.cond:
+            self.error = error
+            self.cond.notify_all()
+
+    def wait_for(self, position):
+        """Block until the chunk at position is verified and on disk, moving
+        it to the front of the queue if it has not been handed out yet"""
+        with self.cond:
+            if position in self.have:
+                return
+            if position not in self.picked and position not in self.urgent:
+                self.urgent.append(position)
+            while position not in self.have:
+                if self.error:
+                    raise IOError(self.error)
+                self.cond.wait()
+
+
+class StreamReader:
+    """Read-only file object over a file that may still be downloading.
+
+    Data comes straight from the verified chunks in the chunk store, so
+    reading never waits for reassembly; a read only blocks while the chunk
+    it needs is missing, and asks the picker to fetch that chunk next.
+    """
+
+    def __init__(self, metadata, chunk_dir, picker):
+        self.name = metadata['filename']
+        self.size = metadata['filesize']
+        self.chunk_dir = chunk_dir
+        self.picker = picker
+        self.chunks = picker.chunks
+        self.starts = []
+        start = 0
+        for chunk in self.chunks:
+            self.starts.append(start)
+            start += chunk['size']
+        self.offset = 0
+        self.closed = False
+
+    def chunk_path(self, position):
+        chunk = self.chunks[position]
+        return os.path.join(self.chunk_dir, f"{chunk['index']}_{chunk['hash']}")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.offset
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.offset = offset
+        if offset < self.size:
+            self.picker.seek(bisect.bisect_right(self.starts, offset) - 1)
+        return self.offset
+
+    def readinto(self, buffer):
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view) and self.offset < self.size:
+            position = bisect.bisect_right(self.starts, self.offset) - 1
+            self.picker.wait_for(position)
+
+            skip = self.offset - self.starts[position]
+            want = min(len(view) - filled, self.chunks[position]['size'] - skip)
+            with open(self.chunk_path(position), "rb") as f:
+                f.seek(skip)
+                n = f.readinto(view[filled:filled + want])
+            if not n:
+                raise IOError(f"Chunk {self.chunks[position]['index']} of {self.name} is truncated")
+            filled += n
+            self.seek(self.offset + n)
+        return filled
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self.size - self.offset, 0)
+        buffer = bytearray(min(size, max(self.size - self.offset, 0)))
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PHASES = ("connect", "ttfb", "transfer", "verify", "write")
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ChunkSample:
+    """One finished transfer. A phase left as None was not measured for it
+    and stays out of that phase's histogram and percentiles."""
+    __slots__ = ("peer", "nbytes", "wire_bytes", "started", "finished", "ok") + PHASES
+
+    def __init__(self, peer, nbytes, wire_bytes, started, finished, ok, **phases):
+        self.peer = peer
+        self.nbytes = nbytes
+        self.wire_bytes = wire_bytes
+        self.started = started
+        self.finished = finished
+        self.ok = ok
+        for phase in PHASES:
+            setattr(self, phase, phases.get(phase))
+
+
+class PeerTotals:
+    def __init__(self):
+        self.chunks = 0
+        self.failures = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.histograms = {phase: [0] * (len(LATENCY_BUCKETS) + 1) for phase in PHASES}
+        self.sums = {phase: 0.0 for phase in PHASES}
+        self.counts = {phase: 0 for phase in PHASES}
+
+    def add(self, sample):
+        if not sample.ok:
+            self.failures += 1
+            return
+        self.chunks += 1
+        self.bytes += sample.nbytes
+        self.wire_bytes += sample.wire_bytes
+        for phase in PHASES:
+            value = getattr(sample, phase)
+            if value is None:
+                continue
+            self.histograms[phase][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            self.sums[phase] += value
+            self.counts[phase] += 1
+
+
+class Telemetry:
+    """Per-chunk transfer timings aggregated per peer and overall.
+
+    Keeps a sliding window of recent samples for live throughput and
+    latency percentiles, plus all-time counters and histograms in the
+    Prometheus text format.
+    """
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.samples = deque()
+        self.totals = {}
+        self.overall = PeerTotals()
+        self.lock = threading.Lock()
+        self.http_server = None
+        self.disk = None
+        self.chunk_cache = None
+
+    def record(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            self.totals.setdefault(sample.peer, PeerTotals()).add(sample)
+            self.overall.add(sample)
+            self._expire(time.time())
+
+    def _expire(self, now):
+        while self.samples and self.samples[0].finished < now - self.window:
+            self.samples.popleft()
+
+    def reset_window(self):
+        with self.lock:
+            self.samples.clear()
+
+    def _window_samples(self, peer=None):
+        now = time.time()
+        self._expire(now)
+        return now, [s for s in self.samples if s.ok and (peer is None or s.peer == peer)]
+
+    def throughput(self, peer=None):
+        """Bytes per second over the sliding window"""
+        with self.lock:
+            now, samples = self._window_samples(peer)
+        if not samples:
+            return 0.0
+        span = now - max(now - self.window, min(s.started for s in samples))
+        return sum(s.nbytes for s in samples) / max(span, 1e-3)
+
+    def active_peers(self):
+        with self.lock:
+            _, samples = self._window_samples()
+        return len(set(s.peer for s in samples))
+
+    def percentiles(self, phase, peer=None, points=(0.5, 0.95)):
+        with self.lock:
+            _, samples = self._window_samples(peer)
+        values = sorted(getattr(s, phase) for s in samples if getattr(s, phase) is not None)
+        if not values:
+            return {f"p{int(p * 100)}": None for p in points}
+        return {f"p{int(p * 100)}": values[min(len(values) - 1, int(p * len(values)))] for p in points}
+
+    def snapshot(self):
+        with self.lock:
+            peers = list(self.totals)
+
+        def describe(peer, totals):
+            return {
+                "throughput_bps": self.throughput(peer),
+                "chunks": totals.chunks,
+                "failures": totals.failures,
+                "bytes": totals.bytes,
+                "wire_bytes": totals.wire_bytes,
+                "latency": {phase: self.percentiles(phase, peer) for phase in PHASES},
+                "histograms": {phase: {"buckets": list(LATENCY_BUCKETS), "counts": list(totals.histograms[phase])}
+                               for phase in PHASES}
+            }
+
+        snapshot = {
+            "time": time.time(),
+            "window_seconds": self.window,
+            "overall": describe(None, self.overall),
+            "peers": {peer: describe(peer, self.totals[peer]) for peer in peers}
+        }
+        if self.disk:
+            snapshot["disk"] = self.disk.stats()
+        if self.chunk_cache:
+            snapshot["chunk_cache"] = self.chunk_cache.stats()
+        return snapshot
+
+    def write_snapshot(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def prometheus_text(self):
+        lines = [
+            "# TYPE p2p_chunks_total counter",
+            "# TYPE p2p_chunk_failures_total counter",
+            "# TYPE p2p_bytes_total counter",
+            "# TYPE p2p_wire_bytes_total counter",
+            "# TYPE p2p_throughput_bytes_per_second gauge",
+            "# TYPE p2p_chunk_phase_seconds histogram",
+        ]
+        with self.lock:
+            totals = dict(self.totals)
+
+        for peer, t in totals.items():
+            label = f'peer="{peer}"'
+            lines.append(f"p2p_chunks_total{{{label}}} {t.chunks}")
+            lines.append(f"p2p_chunk_failures_total{{{label}}} {t.failures}")
+            lines.append(f"p2p_bytes_total{{{label}}} {t.bytes}")
+            lines.append(f"p2p_wire_bytes_total{{{label}}} {t.wire_bytes}")
+            lines.append(f"p2p_throughput_bytes_per_second{{{label}}} {self.throughput(peer):.1f}")
+            for phase in PHASES:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), t.histograms[phase]):
+                    cumulative += count
+                    lines.append(f'p2p_chunk_phase_seconds_bucket{{{label},phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'p2p_chunk_phase_seconds_sum{{{label},phase="{phase}"}} {t.sums[phase]:.6f}')
+                lines.append(f'p2p_chunk_phase_seconds_count{{{label},phase="{phase}"}} {t.counts[phase]}')
+
+        lines.append(f"p2p_throughput_bytes_per_second {self.throughput():.1f}")
+        if self.disk:
+            for name, value in self.disk.stats().items():
+                if value is not None:
+                    lines.append(f"p2p_disk_{name} {value}")
+        if self.chunk_cache:
+            for name, value in self.chunk_cache.stats().items():
+                lines.append(f"p2p_chunk_cache_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose /metrics (Prometheus text) and /snapshot.json on a local port"""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = telemetry.prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/snapshot.json":
+                    body = json.dumps(telemetry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.http_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.http_server
+
+    def stop(self):
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server = None
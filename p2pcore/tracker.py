@@ -0,0 +1,226 @@
+import time
+import random
+import socket
+import threading
+
+DEFAULT_TRACKER_PORT = 6969
+ANNOUNCE_INTERVAL = 60
+PEER_TTL = 2 * ANNOUNCE_INTERVAL + 30
+SWEEP_INTERVAL = 30
+DEFAULT_NUMWANT = 50
+MAX_NUMWANT = 200
+MAX_SCRAPE = 150
+MAX_PACKET = 8192
+SEPARATOR = "<SEPARATOR>"
+
+
+class Swarm:
+    """Peers of one file. The list + index pair gives O(1) add/remove and
+    lets random.sample() pick a subset without copying the whole swarm."""
+
+    __slots__ = ("peers", "index", "expires", "seeders", "completed")
+
+    def __init__(self):
+        self.peers = []
+        self.index = {}
+        self.expires = {}
+        self.seeders = set()
+        self.completed = 0
+
+    def add(self, peer, expires, seeder):
+        if peer not in self.index:
+            self.index[peer] = len(self.peers)
+            self.peers.append(peer)
+        self.expires[peer] = expires
+        if seeder:
+            self.seeders.add(peer)
+        else:
+            self.seeders.discard(peer)
+
+    def remove(self, peer):
+        position = self.index.pop(peer, None)
+        if position is None:
+            return
+        last = self.peers.pop()
+        if last != peer:
+            self.peers[position] = last
+            self.index[last] = position
+        del self.expires[peer]
+        self.seeders.discard(peer)
+
+    def sample(self, count, exclude=None):
+        if count >= len(self.peers):
+            return [peer for peer in self.peers if peer != exclude]
+        picked = random.sample(self.peers, count + 1 if exclude in self.index else count)
+        return [peer for peer in picked if peer != exclude][:count]
+
+    def sweep(self, now):
+        for peer in [peer for peer, expires in self.expires.items() if expires < now]:
+            self.remove(peer)
+
+
+class Tracker:
+    """In-memory tracker answering announce and scrape queries over UDP.
+
+    ANNOUNCE<SEP>file hash<SEP>peer<SEP>event<SEP>bytes left<SEP>numwant
+        -> PEERS<SEP>interval<SEP>peer,peer,...
+    SCRAPE<SEP>hash,hash,...
+        -> SCRAPE<SEP>hash:seeders:leechers:completed,...
+
+    event is started, completed, stopped or empty for a periodic announce.
+    An empty peer only asks for peers without joining the swarm. The host
+    part of a peer is always replaced by the packet's source address.
+    Everything runs on one thread, so there is no locking on the hot path.
+    """
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_TRACKER_PORT, signals=None):
+        self.host = host
+        self.port = port
+        self.signals = signals
+        self.swarms = {}
+        self.sock = None
+        self.running = False
+        self.thread = None
+        self.announces = 0
+        self.scrapes = 0
+        self.last_sweep = time.time()
+
+    def log(self, message):
+        if self.signals:
+            self.signals.update_log.emit(message)
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(1.0)
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        self.log(f"Tracker listening on {self.host}:{self.port} (UDP)")
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(MAX_PACKET)
+            except socket.timeout:
+                data = None
+            except OSError:
+                break
+
+            now = time.time()
+            if data:
+                reply = self.handle(data.decode(errors="replace"), addr[0], now)
+                if reply:
+                    try:
+                        self.sock.sendto(reply.encode(), addr)
+                    except OSError:
+                        pass
+
+            if now - self.last_sweep > SWEEP_INTERVAL:
+                self.sweep(now)
+
+    def handle(self, message, source_ip, now):
+        fields = message.split(SEPARATOR)
+        try:
+            if fields[0] == "ANNOUNCE":
+                return self.announce(fields, source_ip, now)
+            if fields[0] == "SCRAPE":
+                return self.scrape(fields[1].split(",") if len(fields) > 1 and fields[1] else [])
+        except (IndexError, ValueError):
+            pass
+        return f"ERROR{SEPARATOR}Bad request"
+
+    def announce(self, fields, source_ip, now):
+        _, file_hash, peer, event, left, numwant = fields
+        numwant = min(int(numwant or DEFAULT_NUMWANT), MAX_NUMWANT)
+        self.announces += 1
+
+        swarm = self.swarms.get(file_hash)
+        if peer:
+            _, _, port = peer.partition(":")
+            peer = f"{source_ip}:{port}" if port else source_ip
+            if swarm is None:
+                swarm = self.swarms[file_hash] = Swarm()
+            if event == "stopped":
+                swarm.remove(peer)
+            else:
+                if event == "completed" and peer not in swarm.seeders:
+                    swarm.completed += 1
+                swarm.add(peer, now + PEER_TTL, int(left) == 0)
+
+        peers = swarm.sample(numwant, peer) if swarm and numwant else []
+        return f"PEERS{SEPARATOR}{ANNOUNCE_INTERVAL}{SEPARATOR}{','.join(peers)}"
+
+    def scrape(self, hashes):
+        self.scrapes += 1
+        hashes = hashes[:MAX_SCRAPE] if hashes else list(self.swarms)[:MAX_SCRAPE]
+        entries = []
+        for file_hash in hashes:
+            swarm = self.swarms.get(file_hash)
+            if swarm:
+                seeders = len(swarm.seeders)
+                entries.append(f"{file_hash}:{seeders}:{len(swarm.peers) - seeders}:{swarm.completed}")
+            else:
+                entries.append(f"{file_hash}:0:0:0")
+        return f"SCRAPE{SEPARATOR}{','.join(entries)}"
+
+    def sweep(self, now):
+        for file_hash in list(self.swarms):
+            swarm = self.swarms[file_hash]
+            swarm.sweep(now)
+            if not swarm.peers:
+                del self.swarms[file_hash]
+        self.last_sweep = now
+
+
+class TrackerClient:
+    """Announce/scrape client; every call is one UDP round trip with a retry"""
+
+    def __init__(self, address, bind_ip=None, timeout=1.0, retries=2):
+        host, _, port = address.partition(":")
+        self.address = address
+        self.addr = (host, int(port) if port else DEFAULT_TRACKER_PORT)
+        self.bind_ip = bind_ip
+        self.timeout = timeout
+        self.retries = retries
+
+    def request(self, message):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self.bind_ip:
+                s.bind((self.bind_ip, 0))
+            s.settimeout(self.timeout)
+            for _ in range(self.retries):
+                try:
+                    s.sendto(message.encode(), self.addr)
+                    return s.recv(MAX_PACKET).decode().split(SEPARATOR)
+                except socket.timeout:
+                    continue
+        except OSError:
+            pass
+        finally:
+            s.close()
+        return None
+
+    def announce(self, file_hash, peer="", event="", left=0, numwant=DEFAULT_NUMWANT):
+        """Returns the peer subset, or None when the tracker did not answer"""
+        reply = self.request(SEPARATOR.join(["ANNOUNCE", file_hash, peer or "", event, str(left), str(numwant)]))
+        if not reply or reply[0] != "PEERS":
+            return None
+        return [peer for peer in reply[2].split(",") if peer]
+
+    def scrape(self, hashes=()):
+        reply = self.request(f"SCRAPE{SEPARATOR}{','.join(hashes)}")
+        if not reply or reply[0] != "SCRAPE":
+            return None
+        stats = {}
+        for entry in filter(None, reply[1].split(",")):
+            file_hash, seeders, leechers, completed = entry.split(":")
+            stats[file_hash] = {"seeders": int(seeders), "leechers": int(leechers), "completed": int(completed)}
+        return stats
@@ -0,0 +1,7 @@
+# p2pd.py - headless seeder/downloader; see `python p2pd.py --help`
+import sys
+
+from p2pcore.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
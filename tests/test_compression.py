@@ -0,0 +1,19 @@
+import pytest
+
+from p2pcore import compression
+
+
+def test_negative_entries_are_bounded():
+    cache = compression.CompressedChunkCache(max_bytes=compression.ENTRY_COST * 10)
+    for i in range(100):
+        cache.put(("chunk", i, "zlib"), compression.RAW, b"")
+    assert len(cache.entries) == 10
+    assert cache.size == compression.ENTRY_COST * 10
+
+
+def test_decompress_stops_at_max_length():
+    data = b"lecture " * 100000
+    payload = compression.compress("zlib", data)
+    assert compression.decompress("zlib", payload, len(data)) == data
+    with pytest.raises(ValueError):
+        compression.decompress("zlib", payload, len(data) - 1)
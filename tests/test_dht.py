@@ -0,0 +1,36 @@
+from p2pcore.dht import DHTNode
+
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+def make_node(port, address=None):
+    node = DHTNode("127.0.0.1", port, address or f"127.0.0.1:{port}")
+    node.start()
+    return node
+
+
+def test_publish_counts_only_accepted_stores():
+    storer = make_node(19561)
+    publisher = make_node(19562)
+    try:
+        publisher.bootstrap(["127.0.0.1:19561"], broadcast=False)
+        publisher.publish(KEY)
+        assert publisher.replicas[KEY] == 1
+        assert storer.local_values(KEY) == ["127.0.0.1:19562"]
+    finally:
+        publisher.stop()
+        storer.stop()
+
+
+def test_rejected_store_is_not_a_replica():
+    rejecting = make_node(19563)
+    # announces a server on another host, which every node refuses to store
+    publisher = make_node(19564, "10.255.0.1:19564")
+    try:
+        publisher.bootstrap(["127.0.0.1:19563"], broadcast=False)
+        publisher.publish(KEY)
+        assert rejecting.local_values(KEY) == []
+        assert publisher.replicas[KEY] == 0
+    finally:
+        publisher.stop()
+        rejecting.stop()
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from p2pcore.diskio import DiskIO
+
+
+def test_whole_file_writes_count_towards_fsync_every_n_mb(tmp_path):
+    disk = DiskIO(fsync="1")
+    for index in range(5):
+        disk.write(str(tmp_path / f"{index}_chunk"), os.urandom(2 * 1024 * 1024)).wait()
+    assert disk.stats()["fsyncs"] >= 5
+    assert sorted(os.listdir(tmp_path)) == [f"{index}_chunk" for index in range(5)]
+
+
+def test_failed_open_fails_only_its_request(tmp_path):
+    disk = DiskIO(fsync="chunk")
+    path = str(tmp_path / "file")
+    with open(path, "wb") as f:
+        f.write(bytes(16))
+    requests = [disk.write(path, b"a", 1),
+                disk.write(str(tmp_path / "missing"), b"b", 0),
+                disk.write(path, b"c", 2)]
+    requests[0].wait(5)
+    with pytest.raises(FileNotFoundError):
+        requests[1].wait(5)
+    requests[2].wait(5)
+    disk.write(path, b"d", 3).wait(5)
+    with open(path, "rb") as f:
+        assert f.read(4) == b"\0acd"
@@ -0,0 +1,49 @@
+import os
+import hashlib
+
+from p2pcore import erasure
+
+SYMBOL_SIZE = 256
+
+
+def make_file(chunk_dir, chunk_count):
+    """Chunk files and a manifest with repair pieces, like chunk_stream writes"""
+    encoder = erasure.RepairEncoder(erasure.repair_count_for(chunk_count), SYMBOL_SIZE, chunk_dir, first_seed=7)
+    chunks = []
+    for index in range(chunk_count):
+        # the last chunk is short, as it usually is
+        data = os.urandom(SYMBOL_SIZE if index < chunk_count - 1 else SYMBOL_SIZE // 3)
+        chunk_hash = hashlib.md5(data).hexdigest()
+        with open(os.path.join(chunk_dir, f"{index}_{chunk_hash}"), "wb") as f:
+            f.write(data)
+        encoder.add(data)
+        chunks.append({"index": index, "hash": chunk_hash, "size": len(data)})
+    return {"chunks": chunks, "chunk_count": chunk_count, "erasure": encoder.write()}
+
+
+def every_chunk_rebuilds(metadata, chunk_dir):
+    for chunk in metadata['chunks']:
+        path = os.path.join(chunk_dir, f"{chunk['index']}_{chunk['hash']}")
+        os.remove(path)
+        if erasure.reconstruct_chunks(metadata, chunk_dir) != [chunk['index']]:
+            return chunk['index']
+        with open(path, "rb") as f:
+            assert hashlib.md5(f.read()).hexdigest() == chunk['hash']
+    return None
+
+
+def test_each_lost_chunk_is_rebuilt(tmp_path):
+    for chunk_count in (1, 7, 100, 320):
+        chunk_dir = tmp_path / str(chunk_count)
+        chunk_dir.mkdir()
+        metadata = make_file(str(chunk_dir), chunk_count)
+        assert every_chunk_rebuilds(metadata, str(chunk_dir)) is None, chunk_count
+
+
+def test_every_chunk_is_in_two_pieces():
+    k = 2048
+    count = erasure.repair_count_for(k)
+    density = erasure.density_for(count)
+    rows = [erasure.repair_row(seed, k, density, index, erasure.REPAIR_COVERAGE, count)
+            for index, seed in enumerate(range(count))]
+    assert min(sum(1 for row in rows if row[j]) for j in range(k)) >= 2
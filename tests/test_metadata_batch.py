@@ -0,0 +1,48 @@
+import json
+import os
+import socket
+
+from p2pcore.client import FileClientManager
+from p2pcore.server import FileServerManager, MAX_BATCH, MAX_BATCH_ENTRY
+
+SEPARATOR = "<SEPARATOR>"
+
+
+def make_server(tmp_path, port):
+    server = FileServerManager(host="127.0.0.1", port=port, base_dir=str(tmp_path / "server"), my_ip="127.0.0.1")
+    source = tmp_path / "notes.txt"
+    source.write_text("lecture notes " * 1000)
+    server.create_chunks(str(source))
+    server.start_server()
+    server.listening.wait(5)
+    return server
+
+
+def test_oversized_batch_is_rejected(tmp_path):
+    server = make_server(tmp_path, 19811)
+    try:
+        s = socket.create_connection(("127.0.0.1", 19811), timeout=5)
+        s.send(f"GET_METADATA_BATCH{SEPARATOR}{SEPARATOR}{MAX_BATCH * MAX_BATCH_ENTRY + 1}".encode())
+        assert s.recv(1024).startswith(b"ERROR")
+        s.close()
+    finally:
+        server.stop_server()
+
+
+def test_existing_manifest_only_gains_peers(tmp_path):
+    server = make_server(tmp_path, 19812)
+    client = FileClientManager(base_dir=str(tmp_path / "client"))
+    try:
+        os.makedirs(client.metadata_dir, exist_ok=True)
+        path = os.path.join(client.metadata_dir, f"{client.get_file_hash('notes.txt')}.json")
+        with open(path, "w") as f:
+            json.dump({"filename": "notes.txt", "chunks": [], "peers": ["10.0.0.1:8080"]}, f)
+        
+        assert client.fetch_metadata_batch("127.0.0.1:19812", ["notes.txt"]) == ["notes.txt"]
+        with open(path) as f:
+            local = json.load(f)
+        assert local["chunks"] == []
+        assert local["peers"][0] == "10.0.0.1:8080"
+        assert "127.0.0.1:19812" in local["peers"]
+    finally:
+        server.stop_server()
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from p2pcore.multicast import MulticastManager
+from p2pcore.server import FileServerManager
+
+DROP_EVERY = 12
+
+
+class LossyMulticastManager(MulticastManager):
+    """Drops every DROP_EVERY-th packet, fewer than the repair symbols of a group"""
+
+    def build_packets(self, file_id, chunk_index, data):
+        for i, packet in enumerate(super().build_packets(file_id, chunk_index, data)):
+            if i % DROP_EVERY != DROP_EVERY - 1:
+                yield packet
+
+
+def make_manager(cls, base_dir):
+    manager = cls(base_dir=base_dir)
+    manager.set_group("239.255.42.99", 19831, "127.0.0.1")
+    manager.START_DELAY = 0.5
+    manager.IDLE_TIMEOUT = 2.0
+    return manager
+
+
+def test_loopback_transfer_survives_dropped_packets(tmp_path):
+    server = FileServerManager(host="127.0.0.1", port=19832, base_dir=str(tmp_path / "sender"), my_ip="127.0.0.1")
+    source = tmp_path / "lecture.bin"
+    source.write_bytes(os.urandom(2 * 1024 * 1024 + 4321))
+    server.create_chunks(str(source))
+    
+    receiver_dir = tmp_path / "receiver"
+    shutil.copytree(server.metadata_dir, receiver_dir / "metadata")
+    sender = make_manager(LossyMulticastManager, str(tmp_path / "sender"))
+    receiver = make_manager(MulticastManager, str(receiver_dir))
+    completed = threading.Event()
+    receiver.signals.transfer_complete.connect(lambda filename: completed.set())
+    
+    receiving = receiver.receive_file("lecture.bin", [], None)
+    sender.run_sender("lecture.bin")
+    receiving.join(30)
+    
+    assert completed.is_set()
+    metadata = receiver.load_metadata("lecture.bin")
+    chunk_dir = os.path.join(receiver.chunk_dir, receiver.get_file_hash("lecture.bin"))
+    for chunk in metadata['chunks']:
+        with open(os.path.join(chunk_dir, f"{chunk['index']}_{chunk['hash']}"), "rb") as f:
+            assert hashlib.md5(f.read()).hexdigest() == chunk['hash']
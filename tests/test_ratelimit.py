@@ -0,0 +1,55 @@
+import time
+import threading
+
+from p2pcore.ratelimit import UploadScheduler, BURST_SIZE
+from p2pcore.choking import UploadSlotManager, CONTRIBUTOR_WEIGHT
+
+
+def limited_scheduler(rate):
+    scheduler = UploadScheduler(global_rate=rate)
+    # no saved-up burst, so whichever sender starts first gets no head start
+    scheduler.global_bucket.set_rate(rate, BURST_SIZE)
+    return scheduler
+
+
+def share_of(scheduler, peers, seconds):
+    """Bytes each peer gets through the global bucket when all of them
+    keep asking for bursts at once"""
+    sent = {peer: 0 for peer in peers}
+    stop = time.monotonic() + seconds
+
+    def sender(peer):
+        while time.monotonic() < stop:
+            scheduler.acquire(peer, BURST_SIZE)
+            sent[peer] += BURST_SIZE
+
+    threads = [threading.Thread(target=sender, args=(peer,)) for peer in peers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sent
+
+
+def test_weighted_share():
+    scheduler = limited_scheduler(2 * 1024 * 1024)
+    scheduler.set_weight("fast", 3.0)
+    sent = share_of(scheduler, ["fast", "slow"], 1.5)
+    assert 2.0 < sent["fast"] / sent["slow"] < 4.5
+
+
+def test_equal_weights_share_equally():
+    scheduler = limited_scheduler(2 * 1024 * 1024)
+    sent = share_of(scheduler, ["a", "b"], 1.0)
+    assert 0.7 < sent["a"] / sent["b"] < 1.4
+
+
+def test_rechoke_weights_contributors():
+    scheduler = UploadScheduler()
+    slots = UploadSlotManager(slots=4)
+    slots.on_rechoke.append(scheduler.set_weights)
+    for peer in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        slots.request_slot(peer)
+    slots.record_received("10.0.0.2", 1024 * 1024)
+    slots.set_slots(4)
+    assert scheduler.weights == {"10.0.0.2": CONTRIBUTOR_WEIGHT}
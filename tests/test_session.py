@@ -0,0 +1,129 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from p2pcore.session import Session, FRAME_HEADER, STREAM_WINDOW, IOV_MAX, CONTROL, BULK, DATA
+
+
+def session_pair(on_stream=None):
+    a, b = socket.socketpair()
+    client = Session(a, "a", initiator=True)
+    server = Session(b, "b", initiator=False, on_stream=on_stream)
+    client.start()
+    server.start()
+    return client, server
+
+
+def accepting():
+    streams = []
+    arrived = threading.Condition()
+    
+    def on_stream(stream):
+        with arrived:
+            streams.append(stream)
+            arrived.notify_all()
+    
+    def next_stream():
+        with arrived:
+            assert arrived.wait_for(lambda: streams, 5)
+            return streams.pop(0)
+    
+    return on_stream, next_stream
+
+
+def recv_all(stream, n):
+    data = bytearray()
+    while len(data) < n:
+        part = stream.recv(n - len(data))
+        if not part:
+            break
+        data += part
+    return bytes(data)
+
+
+def test_sender_stops_at_the_window():
+    on_stream, next_stream = accepting()
+    client, server = session_pair(on_stream)
+    try:
+        stream = client.open_stream()
+        stream.settimeout(5)
+        data = bytes(range(256)) * (STREAM_WINDOW // 128)
+        sender = threading.Thread(target=stream.sendall, args=(data,))
+        sender.start()
+        remote = next_stream()
+        remote.settimeout(5)
+        
+        time.sleep(0.3)
+        assert sender.is_alive()
+        assert stream.send_window == 0
+        assert sum(len(piece) for piece in remote.pieces) == STREAM_WINDOW
+        
+        assert recv_all(remote, len(data)) == data
+        sender.join(5)
+        assert not sender.is_alive()
+    finally:
+        client.close()
+        server.close()
+
+
+def test_control_frames_go_before_bulk_frames():
+    client, server = session_pair()
+    try:
+        bulk = client.open_stream(BULK)
+        control = client.open_stream(CONTROL)
+        with client.lock:
+            for _ in range(3):
+                client.enqueue(bulk, DATA, b"b" * 100)
+            client.enqueue(control, DATA, b"c" * 100)
+            batch = client.next_batch()
+        ids = [FRAME_HEADER.unpack(header)[0] for header in batch[::2]
+               if FRAME_HEADER.unpack(header)[1] == DATA]
+        assert ids == [control.id, bulk.id, bulk.id, bulk.id]
+    finally:
+        client.close()
+        server.close()
+
+
+def test_close_ends_the_stream_on_both_sides():
+    on_stream, next_stream = accepting()
+    client, server = session_pair(on_stream)
+    try:
+        stream = client.open_stream()
+        stream.settimeout(5)
+        stream.sendall(b"request")
+        stream.close()
+        with pytest.raises(OSError):
+            stream.sendall(b"more")
+        
+        remote = next_stream()
+        remote.settimeout(5)
+        assert recv_all(remote, 100) == b"request"
+        assert remote.recv(100) == b""
+        remote.close()
+        
+        deadline = time.time() + 5
+        while (client.streams or server.streams) and time.time() < deadline:
+            time.sleep(0.01)
+        assert not client.streams and not server.streams
+    finally:
+        client.close()
+        server.close()
+
+
+def test_send_batch_splits_long_buffer_lists():
+    a, b = socket.socketpair()
+    session = Session(a, "a", initiator=True)
+    try:
+        batch = [bytes([i % 256]) * 3 for i in range(IOV_MAX * 3 + 5)]
+        expected = b"".join(batch)
+        session.send_batch(list(batch))
+        b.settimeout(5)
+        received = bytearray()
+        while len(received) < len(expected):
+            received += b.recv(65536)
+        assert bytes(received) == expected
+    finally:
+        session.close()
+        b.close()
@@ -0,0 +1,35 @@
+import os
+import socket
+
+from p2pcore.server import FileServerManager
+
+SEPARATOR = "<SEPARATOR>"
+
+
+def request_chunk(port, filename, chunk_index):
+    s = socket.create_connection(("127.0.0.1", port), timeout=5)
+    try:
+        s.send(f"GET_CHUNK{SEPARATOR}{filename}{SEPARATOR}{chunk_index}".encode())
+        return s.recv(1024).decode().split(SEPARATOR)[0]
+    finally:
+        s.close()
+
+
+def test_damaged_chunk_is_not_sent(tmp_path):
+    server = FileServerManager(host="127.0.0.1", port=19821, base_dir=str(tmp_path), my_ip="127.0.0.1")
+    source = tmp_path / "notes.txt"
+    source.write_bytes(os.urandom(300 * 1024))
+    server.create_chunks(str(source))
+    server.zero_copy = True
+    server.start_server()
+    server.listening.wait(5)
+    try:
+        assert request_chunk(19821, "notes.txt", 0) == "CHUNK"
+        
+        path = server.find_chunk(server.get_file_hash("notes.txt"), 0)
+        size = os.path.getsize(path)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        assert request_chunk(19821, "notes.txt", 0) == "ERROR"
+    finally:
+        server.stop_server()
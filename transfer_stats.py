@@ -0,0 +1,72 @@
+import time
+from array import array
+
+
+class DownloadStats:
+    """Fixed-size ring buffer of (time, speed, peers) samples.
+
+    Download threads call record() without locking: there is a single
+    writer per download and the sample is stored before `count` is bumped,
+    so readers on the GUI thread only ever see complete samples.
+
+    The buffers are plain arrays so recording does not pull in numpy; it is
+    only imported by snapshot(), i.e. once the graph is actually shown.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.speeds = array('d', bytes(8 * capacity))
+        self.peers = array('d', bytes(8 * capacity))
+        self.count = 0
+        self.start_time = time.time()
+
+    def record(self, speed, peer_count):
+        i = self.count % self.capacity
+        self.times[i] = time.time() - self.start_time
+        self.speeds[i] = speed
+        self.peers[i] = peer_count
+        self.count += 1
+
+    def last_speed(self):
+        if self.count == 0:
+            return 0.0
+        return float(self.speeds[(self.count - 1) % self.capacity])
+
+    def reset(self):
+        self.count = 0
+        self.start_time = time.time()
+
+    def snapshot(self, max_points=None):
+        """Return time-ordered copies, bucketed down to max_points if needed"""
+        import numpy as np
+
+        count = self.count
+        n = min(count, self.capacity)
+        if count <= self.capacity:
+            arrays = [np.array(a[:n]) for a in (self.times, self.speeds, self.peers)]
+        else:
+            start = count % self.capacity
+            arrays = [np.array(a[start:] + a[:start]) for a in (self.times, self.speeds, self.peers)]
+
+        if max_points and n > max_points:
+            arrays = downsample(arrays, max_points)
+        return arrays
+
+
+def downsample(arrays, max_points):
+    """Keep the last time and the peak speed/peer count of each bucket"""
+    import numpy as np
+
+    times, speeds, peers = arrays
+    bucket = -(-len(times) // max_points)
+    usable = len(times) // bucket * bucket
+    head = [a[:usable].reshape(-1, bucket) for a in (times, speeds, peers)]
+    times_out = head[0][:, -1]
+    speeds_out = head[1].max(axis=1)
+    peers_out = head[2].max(axis=1)
+    if usable < len(times):
+        times_out = np.append(times_out, times[-1])
+        speeds_out = np.append(speeds_out, speeds[usable:].max())
+        peers_out = np.append(peers_out, peers[usable:].max())
+    return [times_out, speeds_out, peers_out]